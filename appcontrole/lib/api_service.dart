@@ -1,9 +1,31 @@
 import 'dart:io';
+import 'dart:math' as math;
 import 'dart:typed_data';
 import 'package:http/http.dart' as http;
 import 'package:http_parser/http_parser.dart';
+import 'package:image/image.dart' as img;
 import 'dart:convert';
 
+/// Error response the caller must not retry with a full image upload
+/// (429/503 when the server is overloaded, 5xx errors)
+class ApiException implements Exception {
+  final int statusCode;
+  final String body;
+  final int? retryAfter;
+
+  ApiException(this.statusCode, this.body, {this.retryAfter});
+
+  bool get isOverloaded => statusCode == 429 || statusCode == 503;
+
+  /// Message shown to the user
+  String get userMessage => isOverloaded
+      ? 'Server busy, try again in ${retryAfter ?? 1} s.'
+      : 'Server error ($statusCode).';
+
+  @override
+  String toString() => 'ApiException($statusCode): $body';
+}
+
 class ApiService {
   /// API Service for connecting to the lab_pneumonia FastAPI deployment backend
   /// 
@@ -20,7 +42,234 @@ class ApiService {
   /// - GET  /health - Health check
   /// - POST /predict - Pneumonia classification
   /// - POST /fruits/predict - Fruits classification
+  /// - GET  /models/{name}/spec - Input spec for pre-resized tensor uploads
   static const String baseUrl = 'http://10.0.2.2:8000'; // Android emulator default
+
+  /// Model input specs, fetched once per model
+  static final Map<String, Map<String, dynamic>> _modelSpecs = {};
+
+  /// Get the input spec of a model (shape, dtype, normalization)
+  static Future<Map<String, dynamic>?> fetchModelSpec(String name) async {
+    final cached = _modelSpecs[name];
+    if (cached != null) return cached;
+    try {
+      final response = await http.get(Uri.parse('$baseUrl/models/$name/spec'));
+      if (response.statusCode == 200) {
+        final spec = json.decode(response.body) as Map<String, dynamic>;
+        _modelSpecs[name] = spec;
+        return spec;
+      }
+      print('API Error: ${response.statusCode} - ${response.body}');
+    } catch (e) {
+      print('Error fetching model spec: $e');
+    }
+    return null;
+  }
+
+  /// Precision of the fixed-point resampling weights (as in Pillow: 32 - 8 - 2)
+  static const int _precisionBits = 22;
+
+  static double _sinc(double x) {
+    if (x == 0.0) return 1.0;
+    x *= math.pi;
+    return math.sin(x) / x;
+  }
+
+  static double _lanczos(double x) => (-3.0 <= x && x < 3.0) ? _sinc(x) * _sinc(x / 3) : 0.0;
+
+  static double _toFloat32(double value) => (Float32List(1)..[0] = value)[0];
+
+  static int _clip8(int value) {
+    final shifted = value >> _precisionBits;
+    return shifted < 0 ? 0 : (shifted > 255 ? 255 : shifted);
+  }
+
+  /// Fixed-point Lanczos weights of each output pixel along one axis, for the
+  /// source span [in0, in1) (Pillow's precompute_coeffs + normalize_coeffs_8bpc)
+  static List<({int first, Int32List weights})> _lanczosCoeffs(
+    int inSize,
+    double in0,
+    double in1,
+    int outSize,
+  ) {
+    // Pillow passes the crop box as C floats
+    in0 = _toFloat32(in0);
+    in1 = _toFloat32(in1);
+    final scale = _toFloat32(in1 - in0) / outSize;
+    final filterScale = math.max(scale, 1.0);
+    final support = 3.0 * filterScale;
+    final ss = 1.0 / filterScale;
+    return List.generate(outSize, (xx) {
+      final center = in0 + (xx + 0.5) * scale;
+      final first = math.max((center - support + 0.5).toInt(), 0);
+      final count = math.min((center + support + 0.5).toInt(), inSize) - first;
+      final weights = List<double>.generate(
+        count,
+        (x) => _lanczos((x + first - center + 0.5) * ss),
+      );
+      var total = 0.0;
+      for (final w in weights) {
+        total += w;
+      }
+      final fixed = Int32List(count);
+      for (var x = 0; x < count; x++) {
+        final w = (total != 0.0 ? weights[x] / total : weights[x]) * (1 << _precisionBits);
+        fixed[x] = (w < 0 ? w - 0.5 : w + 0.5).toInt();
+      }
+      return (first: first, weights: fixed);
+    });
+  }
+
+  /// Center crop to the target aspect ratio, then Lanczos resize: the same
+  /// pixels as PIL's ImageOps.fit(image, size, Image.LANCZOS) on the server
+  /// (two separable fixed-point passes, horizontal first).
+  ///
+  /// [rgb] is the source image as packed RGB bytes.
+  static Uint8List _fitLanczos(Uint8List rgb, int inWidth, int inHeight, int width, int height) {
+    final inRatio = inWidth / inHeight;
+    final outRatio = width / height;
+    var cropWidth = inWidth.toDouble();
+    var cropHeight = inHeight.toDouble();
+    if (inRatio > outRatio) {
+      cropWidth = outRatio * inHeight;
+    } else if (inRatio < outRatio) {
+      cropHeight = inWidth / outRatio;
+    }
+    final left = (inWidth - cropWidth) * 0.5;
+    final top = (inHeight - cropHeight) * 0.5;
+
+    final horizontal = _lanczosCoeffs(inWidth, left, left + cropWidth, width);
+    final vertical = _lanczosCoeffs(inHeight, top, top + cropHeight, height);
+    final needHorizontal =
+        width != inWidth || _toFloat32(left) != 0 || _toFloat32(left + cropWidth) != width;
+    final needVertical =
+        height != inHeight || _toFloat32(top) != 0 || _toFloat32(top + cropHeight) != height;
+    const half = 1 << (_precisionBits - 1);
+
+    var source = rgb;
+    var sourceWidth = inWidth;
+    var rowOffset = 0;
+    if (needHorizontal) {
+      // Only the rows used by the vertical pass
+      rowOffset = vertical.first.first;
+      final rows = vertical.last.first + vertical.last.weights.length - rowOffset;
+      final out = Uint8List(rows * width * 3);
+      for (var y = 0; y < rows; y++) {
+        final inRow = (y + rowOffset) * sourceWidth * 3;
+        for (var x = 0; x < width; x++) {
+          final coeffs = horizontal[x];
+          var r = half, g = half, b = half;
+          for (var i = 0; i < coeffs.weights.length; i++) {
+            final p = inRow + (coeffs.first + i) * 3;
+            final w = coeffs.weights[i];
+            r += source[p] * w;
+            g += source[p + 1] * w;
+            b += source[p + 2] * w;
+          }
+          final o = (y * width + x) * 3;
+          out[o] = _clip8(r);
+          out[o + 1] = _clip8(g);
+          out[o + 2] = _clip8(b);
+        }
+      }
+      source = out;
+      sourceWidth = width;
+    }
+    if (needVertical) {
+      final out = Uint8List(height * sourceWidth * 3);
+      for (var y = 0; y < height; y++) {
+        final coeffs = vertical[y];
+        for (var x = 0; x < sourceWidth; x++) {
+          var r = half, g = half, b = half;
+          for (var i = 0; i < coeffs.weights.length; i++) {
+            final p = ((coeffs.first - rowOffset + i) * sourceWidth + x) * 3;
+            final w = coeffs.weights[i];
+            r += source[p] * w;
+            g += source[p + 1] * w;
+            b += source[p + 2] * w;
+          }
+          final o = (y * sourceWidth + x) * 3;
+          out[o] = _clip8(r);
+          out[o + 1] = _clip8(g);
+          out[o + 2] = _clip8(b);
+        }
+      }
+      source = out;
+    }
+    return source;
+  }
+
+  /// Resize the image on the device and upload the uint8 HxWx3 tensor.
+  /// The server skips image decoding and resizing; the upload is much
+  /// smaller than a full-size JPEG for small model inputs.
+  ///
+  /// Returns null when the caller should upload the full image instead (no
+  /// spec, resampling filter not supported here, tensor rejected with
+  /// 400/415). Throws [ApiException] on other error statuses, such as
+  /// 429/503 from an overloaded server, so they are not retried with a
+  /// larger upload.
+  static Future<Map<String, dynamic>?> _predictTensor(
+    String endpoint,
+    String modelName,
+    Uint8List imageBytes,
+  ) async {
+    final http.Response response;
+    try {
+      final spec = await fetchModelSpec(modelName);
+      if (spec == null) return null;
+      // The tensor must match the server's own preprocessing exactly
+      if (spec['resample'] != 'lanczos') return null;
+      final shape = List<int>.from(spec['input_shape'] as List);
+      final height = shape[0];
+      final width = shape[1];
+
+      final image = img.decodeImage(imageBytes);
+      if (image == null) {
+        throw Exception('Could not decode image');
+      }
+      final rgb = image
+          .convert(format: img.Format.uint8, numChannels: 3)
+          .getBytes(order: img.ChannelOrder.rgb);
+      final tensor = _fitLanczos(rgb, image.width, image.height, width, height);
+
+      response = await http.post(
+        Uri.parse('$baseUrl$endpoint'),
+        headers: {'Content-Type': 'application/octet-stream'},
+        body: tensor,
+      );
+    } catch (e) {
+      print('Error calling $endpoint with tensor: $e');
+      return null;
+    }
+
+    if (response.statusCode == 200) {
+      final jsonData = json.decode(response.body);
+      return {
+        'label': jsonData['prediction'],
+        'confidence': jsonData['confidence'] as double,
+        'confidence_percentage': jsonData['confidence_percentage'] as double,
+      };
+    }
+    print('API Error: ${response.statusCode} - ${response.body}');
+    if (response.statusCode == 400 || response.statusCode == 415) {
+      return null;
+    }
+    throw ApiException(
+      response.statusCode,
+      response.body,
+      retryAfter: int.tryParse(response.headers['retry-after'] ?? ''),
+    );
+  }
+
+  /// Predict pneumonia from image bytes resized on the device
+  static Future<Map<String, dynamic>?> predictPneumoniaFromTensor(Uint8List imageBytes) {
+    return _predictTensor('/predict', 'pneumonia', imageBytes);
+  }
+
+  /// Predict fruits from image bytes resized on the device
+  static Future<Map<String, dynamic>?> predictFruitsFromTensor(Uint8List imageBytes) {
+    return _predictTensor('/fruits/predict', 'fruits', imageBytes);
+  }
   
   /// Predict pneumonia from chest X-ray image
   static Future<Map<String, dynamic>?> predictPneumonia(File imageFile) async {
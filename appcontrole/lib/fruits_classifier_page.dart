@@ -125,12 +125,21 @@ class _FruitsClassifierPageState extends State<FruitsClassifierPage> {
       _errorMessage = null;
     });
     
-    final prediction = await ApiService.predictFruits(imageFile);
+    // Upload the tensor resized on the device; full image if the server does not support it
+    Map<String, dynamic>? prediction;
+    String? error;
+    try {
+      prediction = await ApiService.predictFruitsFromTensor(await imageFile.readAsBytes()) ??
+          await ApiService.predictFruits(imageFile);
+    } on ApiException catch (e) {
+      // Overloaded or failing server: no second, larger upload
+      error = e.userMessage;
+    }
     setState(() {
       _prediction = prediction;
       _isLoading = false;
       if (prediction == null) {
-        _errorMessage = 'Failed to classify image. Check if API server is running.';
+        _errorMessage = error ?? 'Failed to classify image. Check if API server is running.';
       }
     });
   }
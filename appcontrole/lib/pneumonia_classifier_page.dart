@@ -125,12 +125,21 @@ class _PneumoniaClassifierPageState extends State<PneumoniaClassifierPage> {
       _errorMessage = null;
     });
     
-    final prediction = await ApiService.predictPneumonia(imageFile);
+    // Upload the tensor resized on the device; full image if the server does not support it
+    Map<String, dynamic>? prediction;
+    String? error;
+    try {
+      prediction = await ApiService.predictPneumoniaFromTensor(await imageFile.readAsBytes()) ??
+          await ApiService.predictPneumonia(imageFile);
+    } on ApiException catch (e) {
+      // Overloaded or failing server: no second, larger upload
+      error = e.userMessage;
+    }
     setState(() {
       _prediction = prediction;
       _isLoading = false;
       if (prediction == null) {
-        _errorMessage = 'Failed to classify image. Check if API server is running.';
+        _errorMessage = error ?? 'Failed to classify image. Check if API server is running.';
       }
     });
   }
@@ -26,14 +26,94 @@ class MCPClient {
     }
   }
 
+  /// Validateurs ETag et réponses décodées déjà reçues (requêtes conditionnelles)
+  static final Map<String, ({String etag, dynamic body})> _validators = {};
+
+  static Map<String, String> _conditionalHeaders(String key) {
+    final cached = _validators[key];
+    return {
+      'Content-Type': 'application/json',
+      if (cached != null) 'If-None-Match': cached.etag,
+    };
+  }
+
+  /// Envoie une requête conditionnelle et renvoie le corps décodé : celui en
+  /// cache si le serveur répond 304 pour le validateur envoyé. Un 304 sans
+  /// réponse correspondante en cache (entrée remplacée entre-temps) est
+  /// redemandé sans If-None-Match.
+  static Future<dynamic> _conditionalRequest(
+    String key,
+    Future<http.Response> Function(Map<String, String> headers) send,
+    String errorLabel,
+  ) async {
+    final headers = _conditionalHeaders(key);
+    var response = await send(headers);
+    if (response.statusCode == 304) {
+      final cached = _validators[key];
+      if (cached != null && cached.etag == headers['If-None-Match']) {
+        return cached.body;
+      }
+      response = await send({'Content-Type': 'application/json'});
+    }
+    if (response.statusCode != 200) {
+      throw Exception('$errorLabel: ${response.statusCode} - ${response.body}');
+    }
+    final body = json.decode(response.body);
+    final etag = response.headers['etag'];
+    if (etag != null) {
+      _validators[key] = (etag: etag, body: body);
+    }
+    return body;
+  }
+
+  /// Session de conversation côté serveur (l'historique est conservé par le serveur)
+  static String? _sessionId;
+
+  /// Vrai après le premier chat abouti : le serveur a alors tout l'historique
+  static bool _sessionEstablished = false;
+
+  /// Oublie la session courante (nouvelle conversation)
+  static void resetSession() {
+    _sessionId = null;
+    _sessionEstablished = false;
+  }
+
+  /// Crée une session de conversation sur le serveur MCP
+  static Future<String> _createSession() async {
+    final response = await http.post(
+      Uri.parse('$baseUrl/mcp/sessions'),
+      headers: {'Content-Type': 'application/json'},
+    );
+    if (response.statusCode != 200) {
+      throw Exception('MCP Session Error: ${response.statusCode} - ${response.body}');
+    }
+    return json.decode(response.body)['session_id'] as String;
+  }
+
   /// Envoie une requête de chat au serveur MCP
+  ///
+  /// Le premier appel crée une session et envoie tout l'historique ; une fois
+  /// un chat abouti, les appels suivants n'envoient que le nouveau message, le
+  /// serveur ayant conservé le reste. Tant qu'aucun chat n'a abouti, chaque
+  /// appel repart d'une nouvelle session avec tout l'historique.
   static Future<String> chat({
     required List<ChatMessage> messages,
     required LLMConfig config,
   }) async {
     try {
+      final bool resumingSession = _sessionId != null && _sessionEstablished;
+      if (!resumingSession) {
+        // Une session dont le premier chat a échoué peut déjà contenir une
+        // partie des messages : on ne la réutilise pas
+        _sessionId = await _createSession();
+      }
+
+      final List<ChatMessage> newMessages = resumingSession && messages.isNotEmpty
+          ? [messages.last]
+          : messages;
+
       // Préparer les messages pour l'API MCP
-      final List<Map<String, dynamic>> apiMessages = messages.map((msg) {
+      final List<Map<String, dynamic>> apiMessages = newMessages.map((msg) {
         return {
           'role': msg.isUser ? 'user' : 'assistant',
           'content': msg.content,
@@ -43,6 +123,7 @@ class MCPClient {
 
       final requestBody = {
         'messages': apiMessages,
+        'session_id': _sessionId,
         'model': config.model,
         'temperature': config.temperature,
         'max_tokens': config.maxTokens,
@@ -60,7 +141,12 @@ class MCPClient {
 
       if (response.statusCode == 200) {
         final jsonResponse = json.decode(response.body);
+        _sessionEstablished = true;
         return jsonResponse['response'] as String;
+      } else if (response.statusCode == 404 && resumingSession) {
+        // Session expirée côté serveur : nouvelle session avec tout l'historique
+        resetSession();
+        return await chat(messages: messages, config: config);
       } else {
         throw Exception('MCP Server Error: ${response.statusCode} - ${response.body}');
       }
@@ -78,23 +164,21 @@ class MCPClient {
         'max_results': maxResults,
       };
 
-      final response = await http.post(
-        Uri.parse('$baseUrl/mcp/rag'),
-        headers: {'Content-Type': 'application/json'},
-        body: json.encode(requestBody),
+      final jsonResponse = await _conditionalRequest(
+        'rag:$maxResults:$query',
+        (headers) => http.post(
+          Uri.parse('$baseUrl/mcp/rag'),
+          headers: headers,
+          body: json.encode(requestBody),
+        ),
+        'MCP RAG Error',
       );
-
-      if (response.statusCode == 200) {
-        final jsonResponse = json.decode(response.body);
-        final results = jsonResponse['results'] as List;
-        return results.map((r) => {
-          'title': r['title'] as String,
-          'content': r['content'] as String,
-          'category': r['category'] as String,
-        }).toList();
-      } else {
-        throw Exception('MCP RAG Error: ${response.statusCode} - ${response.body}');
-      }
+      final results = jsonResponse['results'] as List;
+      return results.map((r) => {
+        'title': r['title'] as String,
+        'content': r['content'] as String,
+        'category': r['category'] as String,
+      }).toList();
     } catch (e) {
       print('Error calling MCP RAG: $e');
       return [];
@@ -171,17 +255,12 @@ class MCPClient {
   /// Liste tous les outils disponibles
   static Future<List<Map<String, dynamic>>> listTools() async {
     try {
-      final response = await http.get(
-        Uri.parse('$baseUrl/mcp/tools/list'),
-        headers: {'Content-Type': 'application/json'},
+      final jsonResponse = await _conditionalRequest(
+        'tools:list',
+        (headers) => http.get(Uri.parse('$baseUrl/mcp/tools/list'), headers: headers),
+        'MCP Tools List Error',
       );
-
-      if (response.statusCode == 200) {
-        final jsonResponse = json.decode(response.body);
-        return List<Map<String, dynamic>>.from(jsonResponse['tools']);
-      } else {
-        throw Exception('MCP Tools List Error: ${response.statusCode}');
-      }
+      return List<Map<String, dynamic>>.from(jsonResponse['tools']);
     } catch (e) {
       print('Error listing MCP tools: $e');
       return [];
@@ -0,0 +1,233 @@
+"""
+Exécution vectorisée des outils d'analyse sur une cohorte entière.
+
+Les entrées sont en colonnes (une liste par paramètre, une entrée par
+étudiant ou par classe) et les calculs sont faits avec NumPy sur toute la
+cohorte en une fois. Les règles sont strictement celles de
+analyze_concentration / predict_success dans main.py : une ligne invalide
+produit une erreur pour cette ligne sans faire échouer le lot.
+"""
+
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+
+def _numeric_column(columns: Dict[str, Sequence[Any]], name: str, n: int,
+                    default: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Convertit une colonne en tableau float64.
+    Retourne (valeurs, masque des lignes invalides).
+    """
+    values = columns.get(name)
+    if values is None:
+        return np.full(n, default, dtype=np.float64), np.zeros(n, dtype=bool)
+    try:
+        array = np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        # Chemin lent : conversion élément par élément pour isoler les lignes invalides
+        array = np.empty(n, dtype=np.float64)
+        for i, value in enumerate(values):
+            try:
+                array[i] = float(value)
+            except (TypeError, ValueError):
+                array[i] = np.nan
+    return array, ~np.isfinite(array)
+
+
+def _check_lengths(columns: Dict[str, Sequence[Any]]) -> int:
+    lengths = {name: len(values) for name, values in columns.items() if values is not None}
+    if not lengths:
+        raise ValueError("Aucune colonne fournie")
+    if len(set(lengths.values())) > 1:
+        raise ValueError(f"Toutes les colonnes doivent avoir la même longueur: {lengths}")
+    return next(iter(lengths.values()))
+
+
+def _scalar(value: Any) -> Any:
+    """Convertit un scalaire NumPy en type Python"""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def analyze_concentration_batch(columns: Dict[str, Sequence[Any]]) -> List[Dict[str, Any]]:
+    """Version vectorisée de analyze_concentration sur plusieurs classes"""
+    n = _check_lengths(columns)
+    total, bad_total = _numeric_column(columns, "total_students", n, 0)
+    present, bad_present = _numeric_column(columns, "present_students", n, 0)
+    active, bad_active = _numeric_column(columns, "active_participants", n, 0)
+    quiz, bad_quiz = _numeric_column(columns, "average_quiz_score", n, 0.0)
+    attention, bad_attention = _numeric_column(columns, "attention_duration", n, 0)
+
+    invalid = bad_total | bad_present | bad_active | bad_quiz | bad_attention
+    zero_total = ~invalid & (total == 0)
+    valid = ~(invalid | zero_total)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        attendance_rate = np.where(valid, present / np.where(total == 0, 1, total) * 100, 0.0)
+        participation_rate = np.where(
+            present > 0, active / np.where(present > 0, present, 1) * 100, 0.0
+        )
+
+    concentration_score = (
+        (attendance_rate * 0.3) +
+        (participation_rate * 0.3) +
+        (quiz * 0.3) +
+        ((attention / 90) * 100 * 0.1)
+    )
+    np.clip(concentration_score, 0, 100, out=concentration_score)
+
+    interpretation = np.select(
+        [concentration_score >= 80, concentration_score >= 60, concentration_score >= 40],
+        [
+            "Excellent taux de concentration. La classe est très engagée.",
+            "Bon taux de concentration. Quelques améliorations possibles.",
+            "Taux de concentration modéré. Des actions correctives sont recommandées.",
+        ],
+        default="Taux de concentration faible. Intervention nécessaire.",
+    )
+
+    names = ("total_students", "present_students", "active_participants",
+             "average_quiz_score", "attention_duration")
+    defaults = (0, 0, 0, 0.0, 0)
+    raw = [columns.get(name) or [default] * n for name, default in zip(names, defaults)]
+
+    results = []
+    for i in range(n):
+        if invalid[i]:
+            results.append({"index": i, "error": "Paramètres numériques invalides"})
+            continue
+        if zero_total[i]:
+            results.append({"index": i, "error": "total_students doit être supérieur à 0"})
+            continue
+        results.append({
+            "index": i,
+            "concentration_score": round(float(concentration_score[i]), 2),
+            "attendance_rate": round(float(attendance_rate[i]), 2),
+            "participation_rate": round(float(participation_rate[i]), 2),
+            "interpretation": str(interpretation[i]),
+            "metrics": {name: _scalar(column[i]) for name, column in zip(names, raw)},
+        })
+    return results
+
+
+def _grade_aggregates(grades_column: Sequence[Any], n: int):
+    """
+    Aplatit les listes de notes (de longueurs variables) et calcule, par ligne,
+    le nombre de notes, la somme des 3 plus récentes et la somme des autres
+    (sommées dans le même ordre que la version scalaire).
+    """
+    lengths = np.zeros(n, dtype=np.int64)
+    invalid = np.zeros(n, dtype=bool)
+    rows = []
+    for i, grades in enumerate(grades_column):
+        if grades is None:
+            grades = []
+        if not isinstance(grades, (list, tuple)):
+            invalid[i] = True
+            grades = []
+        rows.append(grades)
+        lengths[i] = len(grades)
+
+    total = int(lengths.sum())
+    try:
+        flat = np.fromiter((g for grades in rows for g in grades), dtype=np.float64, count=total)
+    except (TypeError, ValueError):
+        flat = np.empty(total, dtype=np.float64)
+        k = 0
+        for i, grades in enumerate(rows):
+            for g in grades:
+                try:
+                    flat[k] = float(g)
+                except (TypeError, ValueError):
+                    flat[k] = np.nan
+                k += 1
+
+    row_ids = np.repeat(np.arange(n), lengths)
+    offsets = np.cumsum(lengths) - lengths
+    positions = np.arange(total) - np.repeat(offsets, lengths)
+    non_finite = ~np.isfinite(flat)
+    if non_finite.any():
+        invalid[np.unique(row_ids[non_finite])] = True
+        flat = np.where(non_finite, 0.0, flat)
+
+    is_recent = positions < 3
+    recent_sum = np.bincount(row_ids, weights=np.where(is_recent, flat, 0.0), minlength=n)
+    older_sum = np.bincount(row_ids, weights=np.where(is_recent, 0.0, flat), minlength=n)
+    return rows, lengths, recent_sum, older_sum, invalid
+
+
+def predict_success_batch(columns: Dict[str, Sequence[Any]]) -> List[Dict[str, Any]]:
+    """Version vectorisée de predict_success sur toute une promotion"""
+    n = _check_lengths(columns)
+    absences, bad_absences = _numeric_column(columns, "absences", n, 0)
+    sessions, bad_sessions = _numeric_column(columns, "total_sessions", n, 0)
+    average, bad_average = _numeric_column(columns, "current_average", n, 0.0)
+    grades, lengths, recent_sum, older_sum, bad_grades = _grade_aggregates(
+        columns.get("grades") or [None] * n, n
+    )
+
+    invalid = bad_absences | bad_sessions | bad_average | bad_grades
+    zero_sessions = ~invalid & (sessions == 0)
+    missing_grades = ~invalid & ~zero_sessions & (lengths == 0) & ~(average > 0)
+    valid = ~(invalid | zero_sessions | missing_grades)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        absence_rate = np.where(valid, absences / np.where(sessions == 0, 1, sessions) * 100, 0.0)
+        recent = recent_sum / np.minimum(3, np.maximum(lengths, 1))
+        older = np.where(lengths > 3, older_sum / np.maximum(lengths - 3, 1), recent)
+    # Sans notes, la moyenne courante sert de note unique : pas de tendance
+    trend = np.where(lengths >= 2, recent - older, 0.0)
+
+    success_score = 50.0 + np.select(
+        [absence_rate > 30, absence_rate > 20, absence_rate < 10], [-30.0, -15.0, 10.0], default=0.0
+    )
+    success_score += np.select(
+        [average >= 16, average >= 14, average >= 12, average < 10], [25.0, 15.0, 5.0, -20.0],
+        default=0.0,
+    )
+    success_score += np.select([trend > 2, trend < -2], [10.0, -10.0], default=0.0)
+    np.clip(success_score, 0, 100, out=success_score)
+
+    probability = np.select(
+        [success_score >= 80, success_score >= 60, success_score >= 40],
+        ["Très élevée", "Élevée", "Modérée"],
+        default="Faible",
+    )
+    direction = np.select([trend > 0, trend < 0], ["positive", "negative"], default="stable")
+
+    raw_absences = columns.get("absences") or [0] * n
+    raw_sessions = columns.get("total_sessions") or [0] * n
+    raw_average = columns.get("current_average") or [0.0] * n
+
+    results = []
+    for i in range(n):
+        if invalid[i]:
+            results.append({"index": i, "error": "Paramètres numériques invalides"})
+            continue
+        if zero_sessions[i]:
+            results.append({"index": i, "error": "total_sessions doit être supérieur à 0"})
+            continue
+        if missing_grades[i]:
+            results.append({"index": i, "error": "grades ou current_average requis"})
+            continue
+        results.append({
+            "index": i,
+            "success_score": round(float(success_score[i]), 2),
+            "probability": str(probability[i]),
+            "absence_rate": round(float(absence_rate[i]), 2),
+            "current_average": _scalar(raw_average[i]),
+            "trend": round(float(trend[i]), 2),
+            "analysis": {
+                "absences": _scalar(raw_absences[i]),
+                "total_sessions": _scalar(raw_sessions[i]),
+                "grades": list(grades[i]) if lengths[i] else [_scalar(raw_average[i])],
+                "trend_direction": str(direction[i]),
+            },
+        })
+    return results
+
+
+BATCH_TOOLS = {
+    "analyze_concentration": analyze_concentration_batch,
+    "predict_success": predict_success_batch,
+}
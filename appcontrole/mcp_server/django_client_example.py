@@ -3,42 +3,179 @@ Exemple de client Django pour consommer le serveur MCP
 À intégrer dans votre application Django
 """
 
+import asyncio
+import json
 import requests
-from typing import List, Dict, Any, Optional
+import httpx
+from collections import OrderedDict
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import List, Dict, Any, Optional, Tuple, Union
+
+# (connexion, lecture) en secondes
+DEFAULT_TIMEOUT: Tuple[float, float] = (3.05, 30.0)
+RETRY_STATUSES = (502, 503, 504)
+# Erreurs où la requête n'a pas pu partir : on peut la renvoyer même si elle n'est pas idempotente
+CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+class ValidatorCache:
+    """
+    Cache local des validateurs (ETag) et des réponses associées
+    
+    Les requêtes conditionnelles envoient If-None-Match ; sur un 304 la réponse
+    déjà connue est réutilisée sans retélécharger ni redécoder le corps.
+    """
+    
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, Tuple[str, Any]]" = OrderedDict()
+    
+    @staticmethod
+    def key(method: str, path: str, payload: Optional[Dict[str, Any]]) -> tuple:
+        return (method, path, json.dumps(payload, sort_keys=True))
+    
+    def headers(self, key: tuple) -> Dict[str, str]:
+        entry = self._entries.get(key)
+        return {"If-None-Match": entry[0]} if entry else {}
+    
+    def cached(self, key: tuple, etag: Optional[str]) -> Tuple[bool, Any]:
+        """
+        Réponse associée au validateur envoyé : (False, None) si l'entrée a
+        été évincée ou remplacée entre l'envoi de la requête et le 304
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != etag:
+            return False, None
+        self._entries.move_to_end(key)
+        return True, entry[1]
+    
+    def store(self, key: tuple, etag: Optional[str], data: Any):
+        if not etag:
+            return
+        self._entries[key] = (etag, data)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
 
 class MCPClient:
-    """Client pour communiquer avec le serveur MCP"""
+    """
+    Client pour communiquer avec le serveur MCP
     
-    def __init__(self, base_url: str = "http://localhost:8000"):
-        self.base_url = base_url
+    Les connexions sont réutilisées (keep-alive) via des requests.Session
+    partagées ; chaque requête a un timeout. Les erreurs de connexion sont
+    toujours retentées avec un backoff exponentiel ; les erreurs de lecture et
+    les réponses 502/503/504 ne le sont que pour les appels idempotents (GET,
+    RAG, outils). Un POST /mcp/chat ou /mcp/sessions renvoyé après une
+    réponse perdue ajouterait deux fois le message à la session ou créerait
+    une session orpheline.
+    """
+    
+    def __init__(self, base_url: str = "http://localhost:8000",
+                 timeout: Union[float, Tuple[float, float]] = DEFAULT_TIMEOUT,
+                 max_retries: int = 3,
+                 backoff_factor: float = 0.3,
+                 pool_maxsize: int = 10):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        # Appels idempotents : erreurs de connexion, de lecture et 502/503/504
+        self.session = self._make_session(Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset({"GET", "POST"}),
+            raise_on_status=False,
+        ), pool_maxsize)
+        # Appels non idempotents : uniquement quand la requête n'a pas pu partir
+        self.write_session = self._make_session(Retry(
+            total=max_retries, connect=max_retries, read=0, status=0, other=0,
+            backoff_factor=backoff_factor,
+        ), pool_maxsize)
+        self.validators = ValidatorCache()
+    
+    @staticmethod
+    def _make_session(retry: Retry, pool_maxsize: int) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=retry)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+    
+    def close(self):
+        """Ferme les connexions des pools"""
+        self.session.close()
+        self.write_session.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def _request(self, method: str, path: str, payload: Optional[Dict[str, Any]] = None,
+                 conditional: bool = False, idempotent: Optional[bool] = None) -> Dict[str, Any]:
+        if idempotent is None:
+            idempotent = method == "GET"
+        session = self.session if idempotent else self.write_session
+        key = ValidatorCache.key(method, path, payload) if conditional else None
+        headers = self.validators.headers(key) if conditional else {}
+        response = session.request(
+            method, f"{self.base_url}{path}", json=payload, timeout=self.timeout, headers=headers
+        )
+        if conditional and response.status_code == 304:
+            found, data = self.validators.cached(key, headers.get("If-None-Match"))
+            if found:
+                return data
+            # Réponse plus en cache : on redemande le corps complet
+            response = session.request(method, f"{self.base_url}{path}", json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        if conditional:
+            self.validators.store(key, response.headers.get("ETag"), data)
+        return data
+    
+    def server_info(self) -> Dict[str, Any]:
+        """Informations du serveur (GET /, requête conditionnelle)"""
+        return self._request("GET", "/", conditional=True)
+    
+    def list_tools(self) -> List[Dict[str, Any]]:
+        """Liste des outils disponibles (requête conditionnelle)"""
+        return self._request("GET", "/mcp/tools/list", conditional=True)["tools"]
     
     def chat(self, messages: List[Dict[str, str]], 
              model: str = "mistral-small",
              temperature: float = 0.7,
-             max_tokens: int = 1000) -> Dict[str, Any]:
+             max_tokens: int = 1000,
+             session_id: Optional[str] = None) -> Dict[str, Any]:
         """
         Envoie une requête de chat au serveur MCP
         
         Args:
             messages: Liste de messages [{"role": "user", "content": "..."}]
+                      (avec session_id : uniquement les nouveaux messages)
             model: Modèle à utiliser
             temperature: Température pour la génération
             max_tokens: Nombre maximum de tokens
+            session_id: Session serveur qui conserve l'historique
         
         Returns:
             Réponse du serveur MCP
         """
-        response = requests.post(
-            f"{self.base_url}/mcp/chat",
-            json={
-                "messages": messages,
-                "model": model,
-                "temperature": temperature,
-                "max_tokens": max_tokens
-            }
-        )
-        response.raise_for_status()
-        return response.json()
+        return self._request("POST", "/mcp/chat", {
+            "messages": messages,
+            "model": model,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "session_id": session_id
+        })
+    
+    def create_session(self) -> str:
+        """
+        Crée une session de conversation côté serveur
+        
+        Returns:
+            Identifiant de la session
+        """
+        return self._request("POST", "/mcp/sessions")["session_id"]
     
     def rag_search(self, query: str, max_results: int = 3) -> List[Dict[str, str]]:
         """
@@ -51,15 +188,34 @@ class MCPClient:
         Returns:
             Liste de documents pertinents
         """
-        response = requests.post(
-            f"{self.base_url}/mcp/rag",
-            json={
-                "query": query,
-                "max_results": max_results
-            }
-        )
-        response.raise_for_status()
-        return response.json()["results"]
+        return self._request("POST", "/mcp/rag", {
+            "query": query,
+            "max_results": max_results
+        }, conditional=True, idempotent=True)["results"]
+    
+    def execute_tool(self, tool_name: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Exécute un outil d'analyse
+        
+        Returns:
+            Résultat de l'outil
+        """
+        return self._request("POST", "/mcp/tools", {
+            "tool_name": tool_name,
+            "parameters": parameters
+        }, idempotent=True)["result"]
+    
+    def batch(self, calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Exécute plusieurs appels d'outils en un seul aller-retour
+        
+        Args:
+            calls: [{"tool_name": "...", "parameters": {...}}, ...]
+        
+        Returns:
+            Une entrée par appel, dans le même ordre : {"result": ...} ou {"error": ...}
+        """
+        return self._request("POST", "/mcp/tools/pipeline", {"calls": calls}, idempotent=True)["results"]
     
     def analyze_concentration(self, total_students: int,
                              present_students: int,
@@ -72,21 +228,13 @@ class MCPClient:
         Returns:
             Résultats de l'analyse
         """
-        response = requests.post(
-            f"{self.base_url}/mcp/tools",
-            json={
-                "tool_name": "analyze_concentration",
-                "parameters": {
-                    "total_students": total_students,
-                    "present_students": present_students,
-                    "active_participants": active_participants,
-                    "average_quiz_score": average_quiz_score,
-                    "attention_duration": attention_duration
-                }
-            }
-        )
-        response.raise_for_status()
-        return response.json()["result"]
+        return self.execute_tool("analyze_concentration", {
+            "total_students": total_students,
+            "present_students": present_students,
+            "active_participants": active_participants,
+            "average_quiz_score": average_quiz_score,
+            "attention_duration": attention_duration
+        })
     
     def predict_success(self, absences: int,
                        total_sessions: int,
@@ -98,20 +246,124 @@ class MCPClient:
         Returns:
             Résultats de la prédiction
         """
-        response = requests.post(
-            f"{self.base_url}/mcp/tools",
-            json={
-                "tool_name": "predict_success",
-                "parameters": {
-                    "absences": absences,
-                    "total_sessions": total_sessions,
-                    "grades": grades,
-                    "current_average": current_average
-                }
-            }
+        return self.execute_tool("predict_success", {
+            "absences": absences,
+            "total_sessions": total_sessions,
+            "grades": grades,
+            "current_average": current_average
+        })
+
+
+class AsyncMCPClient:
+    """
+    Variante asyncio de MCPClient pour les vues Django asynchrones
+    
+    Un seul httpx.AsyncClient (pool de connexions keep-alive) est partagé :
+    plusieurs appels chat, RAG et outils peuvent être lancés en parallèle
+    avec asyncio.gather. Mêmes règles de retry que MCPClient.
+    
+    Le pool est lié à la boucle asyncio qui l'utilise : créer le client dans
+    cette boucle (async with dans la vue, ou au démarrage d'une application
+    ASGI), jamais à l'import du module.
+    """
+    
+    def __init__(self, base_url: str = "http://localhost:8000",
+                 timeout: float = DEFAULT_TIMEOUT[1],
+                 connect_timeout: float = DEFAULT_TIMEOUT[0],
+                 max_retries: int = 3,
+                 backoff_factor: float = 0.3,
+                 max_connections: int = 20):
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections),
         )
-        response.raise_for_status()
-        return response.json()["result"]
+        self.validators = ValidatorCache()
+    
+    async def aclose(self):
+        await self.client.aclose()
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+    
+    async def _request(self, method: str, path: str, payload: Optional[Dict[str, Any]] = None,
+                       conditional: bool = False, idempotent: Optional[bool] = None) -> Dict[str, Any]:
+        if idempotent is None:
+            idempotent = method == "GET"
+        retryable_errors = httpx.TransportError if idempotent else CONNECT_ERRORS
+        key = ValidatorCache.key(method, path, payload) if conditional else None
+        headers = self.validators.headers(key) if conditional else {}
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self.client.request(method, path, json=payload, headers=headers)
+            except retryable_errors:
+                if attempt == self.max_retries:
+                    raise
+            else:
+                if conditional and response.status_code == 304:
+                    found, data = self.validators.cached(key, headers.get("If-None-Match"))
+                    if found:
+                        return data
+                    # Réponse plus en cache : on redemande le corps complet
+                    response = await self.client.request(method, path, json=payload)
+                if (not idempotent or response.status_code not in RETRY_STATUSES
+                        or attempt == self.max_retries):
+                    response.raise_for_status()
+                    data = response.json()
+                    if conditional:
+                        self.validators.store(key, response.headers.get("ETag"), data)
+                    return data
+            await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+    
+    async def server_info(self) -> Dict[str, Any]:
+        """Voir MCPClient.server_info"""
+        return await self._request("GET", "/", conditional=True)
+    
+    async def list_tools(self) -> List[Dict[str, Any]]:
+        """Voir MCPClient.list_tools"""
+        return (await self._request("GET", "/mcp/tools/list", conditional=True))["tools"]
+    
+    async def chat(self, messages: List[Dict[str, str]],
+                   model: str = "mistral-small",
+                   temperature: float = 0.7,
+                   max_tokens: int = 1000,
+                   session_id: Optional[str] = None) -> Dict[str, Any]:
+        """Voir MCPClient.chat"""
+        return await self._request("POST", "/mcp/chat", {
+            "messages": messages,
+            "model": model,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "session_id": session_id
+        })
+    
+    async def create_session(self) -> str:
+        """Voir MCPClient.create_session"""
+        return (await self._request("POST", "/mcp/sessions"))["session_id"]
+    
+    async def rag_search(self, query: str, max_results: int = 3) -> List[Dict[str, str]]:
+        """Voir MCPClient.rag_search"""
+        return (await self._request("POST", "/mcp/rag", {
+            "query": query,
+            "max_results": max_results
+        }, conditional=True, idempotent=True))["results"]
+    
+    async def execute_tool(self, tool_name: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """Voir MCPClient.execute_tool"""
+        return (await self._request("POST", "/mcp/tools", {
+            "tool_name": tool_name,
+            "parameters": parameters
+        }, idempotent=True))["result"]
+    
+    async def batch(self, calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Voir MCPClient.batch"""
+        return (await self._request("POST", "/mcp/tools/pipeline", {"calls": calls}, idempotent=True))["results"]
 
 
 # ==================== EXEMPLE D'UTILISATION DANS DJANGO ====================
@@ -160,30 +412,159 @@ def analyze_concentration_view(request):
     
     return JsonResponse({'error': 'Method not allowed'}, status=405)
 
+async def student_dashboard_view(request):
+    """Vue Django asynchrone : RAG, outils et chat exécutés en parallèle"""
+    question = request.GET.get('q', "Quelle est la politique d'absences ?")
+    try:
+        # Client créé dans la boucle de la requête : sous WSGI, async_to_sync
+        # exécute chaque requête dans une boucle différente
+        async with AsyncMCPClient(base_url="http://localhost:8000") as async_mcp_client:
+            documents, tools, answer = await asyncio.gather(
+                async_mcp_client.rag_search(question),
+                async_mcp_client.batch([
+                    {"tool_name": "predict_success",
+                     "parameters": {"absences": 3, "total_sessions": 40, "grades": [14, 12, 15], "current_average": 13.5}},
+                    {"tool_name": "analyze_concentration",
+                     "parameters": {"total_students": 30, "present_students": 25, "active_participants": 20}},
+                ]),
+                async_mcp_client.chat(messages=[{"role": "user", "content": question}]),
+            )
+        return JsonResponse({'documents': documents, 'tools': tools, 'answer': answer['response']})
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
 # ==================== EXEMPLE DANS UN MODÈLE DJANGO ====================
 
 # models.py
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+
+RECENT_MESSAGES_LIMIT = 50
 
 class ChatSession(models.Model):
     user_id = models.IntegerField()
-    messages = models.JSONField(default=list)
+    # Ancien stockage (liste JSON réécrite à chaque message) : lu uniquement par
+    # migrate_json_sessions, vidé une fois la session migrée
+    messages = models.JSONField(default=list, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    message_count = models.PositiveIntegerField(default=0)
+    # Session côté serveur MCP : seuls les messages non synchronisés sont envoyés
+    mcp_session_id = models.CharField(max_length=64, blank=True, default="")
+    mcp_synced_count = models.IntegerField(default=0)
     
-    def add_message(self, role: str, content: str):
-        """Ajoute un message à la session"""
-        self.messages.append({
-            "role": role,
-            "content": content
-        })
-        self.save()
+    def add_message(self, role: str, content: str, **session_updates) -> "ChatMessage":
+        """
+        Ajoute un message à la session
+        
+        Une seule ligne est insérée (l'historique n'est ni relu ni réécrit) et
+        le compteur de la session est incrémenté dans le même UPDATE que les
+        éventuels autres champs de session_updates.
+        """
+        for attempt in range(2):
+            try:
+                with transaction.atomic():
+                    message = ChatMessage.objects.create(
+                        session=self, seq=self.message_count, role=role, content=content
+                    )
+                    ChatSession.objects.filter(pk=self.pk).update(
+                        message_count=F("message_count") + 1, **session_updates
+                    )
+                break
+            except IntegrityError:
+                # Un autre processus a ajouté un message entre-temps
+                if attempt:
+                    raise
+                self.refresh_from_db(fields=["message_count"])
+        self.message_count += 1
+        for field, value in session_updates.items():
+            setattr(self, field, value)
+        return message
+    
+    def recent_messages(self, limit: int = RECENT_MESSAGES_LIMIT) -> List[Dict[str, str]]:
+        """Derniers messages (requête bornée sur l'index (session, seq))"""
+        rows = self.chat_messages.order_by("-seq").values("role", "content")[:limit]
+        return list(rows)[::-1]
+    
+    def messages_since(self, seq: int) -> List[Dict[str, str]]:
+        """Messages à partir du numéro de séquence seq"""
+        return list(self.chat_messages.filter(seq__gte=seq).order_by("seq").values("role", "content"))
     
     def get_mcp_response(self):
         """Obtient une réponse du serveur MCP"""
         try:
-            response = mcp_client.chat(messages=self.messages)
-            self.add_message("assistant", response["response"])
+            try:
+                response = self._send_new_messages()
+            except requests.HTTPError as e:
+                if e.response is None or e.response.status_code != 404:
+                    raise
+                # Session expirée côté serveur : on la recrée avec tout l'historique
+                self.mcp_session_id = ""
+                response = self._send_new_messages()
+            # Le serveur a déjà ajouté sa réponse à l'historique de la session :
+            # une seule écriture de session par tour
+            self.add_message(
+                "assistant", response["response"],
+                mcp_session_id=self.mcp_session_id,
+                mcp_synced_count=self.message_count + 1
+            )
             return response["response"]
         except Exception as e:
             return f"Erreur: {str(e)}"
+    
+    def _send_new_messages(self):
+        """Envoie uniquement les messages pas encore connus du serveur MCP"""
+        if not self.mcp_session_id:
+            self.mcp_session_id = mcp_client.create_session()
+            self.mcp_synced_count = 0
+        return mcp_client.chat(
+            messages=self.messages_since(self.mcp_synced_count),
+            session_id=self.mcp_session_id
+        )
+
+
+class ChatMessage(models.Model):
+    """Un message par ligne : les ajouts sont des insertions simples"""
+    session = models.ForeignKey(ChatSession, on_delete=models.CASCADE, related_name="chat_messages")
+    seq = models.PositiveIntegerField()
+    role = models.CharField(max_length=16)
+    content = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ["seq"]
+        constraints = [
+            # Sert aussi d'index pour les lectures bornées par session
+            models.UniqueConstraint(fields=["session", "seq"], name="chat_message_session_seq"),
+        ]
 
+
+def migrate_json_sessions(session_model=ChatSession, message_model=ChatMessage,
+                          batch_size: int = 1000) -> int:
+    """
+    Migre les sessions existantes (liste JSON) vers la table des messages
+    
+    Idempotent : seules les sessions encore non migrées (message_count = 0 et
+    liste JSON non vide) sont traitées. Utilisable dans une migration de données
+    avec les modèles historiques :
+    
+        def forwards(apps, schema_editor):
+            migrate_json_sessions(apps.get_model("chat", "ChatSession"),
+                                  apps.get_model("chat", "ChatMessage"))
+        
+        operations = [migrations.RunPython(forwards, migrations.RunPython.noop)]
+    
+    Returns:
+        Nombre de sessions migrées
+    """
+    migrated = 0
+    pending = session_model.objects.filter(message_count=0).exclude(messages=[]).only("id", "messages")
+    for session in pending.iterator(chunk_size=100):
+        rows = [
+            message_model(session_id=session.pk, seq=seq, role=msg["role"], content=msg["content"])
+            for seq, msg in enumerate(session.messages)
+        ]
+        with transaction.atomic():
+            message_model.objects.bulk_create(rows, batch_size=batch_size)
+            session_model.objects.filter(pk=session.pk).update(message_count=len(rows), messages=[])
+        migrated += 1
+    return migrated
@@ -0,0 +1,150 @@
+"""
+Modèles Deep Learning servis par /dl/predict.
+
+Les modèles pneumonie et fruits sont chargés dans le processus du serveur MCP
+en réutilisant le code de lab_pneumonia (shared_utils et fruits_endpoint).
+Le chargement et l'inférence s'exécutent dans un pool de threads dédié pour
+ne pas bloquer les endpoints chat et RAG sur le même worker.
+"""
+
+import asyncio
+import io
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+LAB_PNEUMONIA_DIR = os.environ.get(
+    "LAB_PNEUMONIA_DIR", os.path.join(_BASE_DIR, "..", "..", "lab_pneumonia")
+)
+FRUITS_MODEL_PATH = os.environ.get(
+    "FRUITS_MODEL_PATH", os.path.join(_BASE_DIR, "..", "assets", "model", "fruits_classifier.tflite")
+)
+DL_INFERENCE_WORKERS = int(os.environ.get("DL_INFERENCE_WORKERS", "1"))
+# Après un échec de chargement, nouvel essai au plus tôt après ce délai (doublé à chaque échec)
+DL_LOAD_RETRY_SECONDS = float(os.environ.get("DL_LOAD_RETRY_SECONDS", "30"))
+DL_LOAD_RETRY_MAX_SECONDS = float(os.environ.get("DL_LOAD_RETRY_MAX_SECONDS", "600"))
+
+for _path in (LAB_PNEUMONIA_DIR, os.path.join(LAB_PNEUMONIA_DIR, "fastapi_deployment")):
+    if _path not in sys.path:
+        sys.path.append(_path)
+
+# Threads TF/BLAS par processus (INFERENCE_THREADS, CPU_PINNING, ...), avant tout import de numpy ou TensorFlow
+try:
+    import runtime_config
+    runtime_config.apply()
+except ImportError:
+    runtime_config = None
+
+
+class ModelUnavailableError(RuntimeError):
+    """Le modèle demandé ne peut pas être chargé (dépendances ou fichier manquants)"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def open_image(body: bytes):
+    """Décode une image (JPEG, PNG, ...) depuis le corps de la requête"""
+    from PIL import Image
+
+    # BytesIO partage le buffer d'un objet bytes tant qu'il n'est pas modifié : pas de copie
+    image = Image.open(io.BytesIO(body))
+    image.load()
+    return image
+
+
+def _load_pneumonia() -> Callable:
+    from shared_utils import classify_image, load_class_names, load_pneumonia_model
+
+    model = load_pneumonia_model()
+    class_names = load_class_names()
+    return lambda image: classify_image(image, model, class_names)
+
+
+def _load_fruits() -> Callable:
+    import fruits_endpoint
+
+    if fruits_endpoint.load_fruits_model(FRUITS_MODEL_PATH) is None:
+        raise ModelUnavailableError(f"Modèle fruits introuvable ou invalide: {FRUITS_MODEL_PATH}")
+    return fruits_endpoint.classify_fruits_image
+
+
+MODEL_LOADERS: Dict[str, Callable[[], Callable]] = {
+    "pneumonia": _load_pneumonia,
+    "fruits": _load_fruits,
+}
+
+
+class DLModelServer:
+    """Chargement paresseux des modèles et inférence dans un pool dédié"""
+
+    def __init__(self, workers: int = DL_INFERENCE_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dl-inference")
+        self._classifiers: Dict[str, Callable] = {}
+        # Dernier échec de chargement par modèle : (message, nombre d'échecs, prochain essai)
+        self._failures: Dict[str, Tuple[str, int, float]] = {}
+        self._lock = threading.Lock()
+
+    def _classifier(self, model_type: str) -> Callable:
+        # Exécuté dans le pool : le premier appel charge le modèle
+        with self._lock:
+            classifier = self._classifiers.get(model_type)
+            if classifier is not None:
+                return classifier
+            failure = self._failures.get(model_type)
+            if failure is not None:
+                message, _, retry_at = failure
+                wait = retry_at - time.monotonic()
+                if wait > 0:
+                    # Échec récent : pas de nouveau chargement (coûteux) à chaque requête
+                    raise ModelUnavailableError(message, retry_after=wait)
+            try:
+                classifier = MODEL_LOADERS[model_type]()
+            except Exception as e:
+                message = str(e) if isinstance(e, ModelUnavailableError) else f"Modèle '{model_type}' indisponible: {e}"
+                failures = failure[1] + 1 if failure else 1
+                delay = min(DL_LOAD_RETRY_SECONDS * 2 ** (failures - 1), DL_LOAD_RETRY_MAX_SECONDS)
+                self._failures[model_type] = (message, failures, time.monotonic() + delay)
+                raise ModelUnavailableError(message, retry_after=delay) from e
+            self._classifiers[model_type] = classifier
+            self._failures.pop(model_type, None)
+            return classifier
+
+    def _predict(self, model_type: str, body: bytes) -> Tuple[str, float]:
+        classifier = self._classifier(model_type)
+        image = open_image(body)
+        return classifier(image)
+
+    @staticmethod
+    def has_model(model_type: str) -> bool:
+        return model_type in MODEL_LOADERS
+
+    async def predict(self, model_type: str, body: bytes) -> Tuple[str, float]:
+        """Décodage + inférence hors de la boucle d'événements (model_type vérifié par has_model)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._predict, model_type, body)
+
+    async def preload(self, model_type: str):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._classifier, model_type)
+
+    def status(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        status = {}
+        for model_type in MODEL_LOADERS:
+            message, _, retry_at = self._failures.get(model_type, (None, 0, now))
+            status[model_type] = {
+                "loaded": model_type in self._classifiers,
+                "error": message,
+                "retry_in_seconds": round(max(retry_at - now, 0.0), 1) if message else None,
+            }
+        return status
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -3,18 +3,50 @@ Serveur MCP (Model Context Protocol) pour EMSI ChatBot
 Supporte les clients Flutter (Web/Mobile) et Django
 """
 
-from fastapi import FastAPI, HTTPException, Body
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 import uvicorn
 from datetime import datetime
+from functools import lru_cache
+import asyncio
+import hashlib
 import json
+import logging
+import math
+
+# En premier : dl_models fixe les threads BLAS (runtime_config) avant que cohort n'importe numpy
+from dl_models import DLModelServer, ModelUnavailableError
+from sessions import SessionStore, SESSION_CONTEXT_TOKENS
+from response_cache import ResponseCache, chat_cache_key
+from cohort import BATCH_TOOLS
+from tool_registry import ToolRegistry, ToolTimeoutError, UnknownToolError
+from student_store import StudentState, StudentStore
+
+logger = logging.getLogger("mcp_server")
+
+# Sérialiseur JSON rapide partagé (lab_pneumonia/fast_json.py, ajouté au path par dl_models).
+# Les endpoints chauds renvoient FastJSONResponse explicitement : en classe par défaut
+# seule, FastAPI repasse d'abord le résultat dans jsonable_encoder.
+try:
+    from fast_json import FastJSONResponse
+except ImportError as e:
+    logger.warning("fast_json indisponible (%s) : sérialisation JSON standard", e)
+    from fastapi.responses import JSONResponse as FastJSONResponse
+
+# Compression négociée (lab_pneumonia/compression.py), désactivée si le module est absent
+try:
+    from compression import CompressionMiddleware
+except ImportError as e:
+    logger.warning("compression indisponible (%s) : réponses envoyées sans compression", e)
+    CompressionMiddleware = None
 
 app = FastAPI(
     title="EMSI MCP Server",
     description="Model Context Protocol Server for EMSI ChatBot",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
 
 # CORS pour permettre les requêtes depuis Flutter Web et Mobile
@@ -26,6 +58,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Résultats de cohorte et RAG compressés pour les clients mobiles ; le chat reste
+# non compressé (réponses courtes, latence prioritaire)
+if CompressionMiddleware is not None:
+    app.add_middleware(
+        CompressionMiddleware,
+        route_levels={
+            "/mcp/tools/batch": {"gzip": 6, "br": 5, "zstd": 6},
+            "/mcp/chat": {},
+        },
+    )
+
 # ==================== MODÈLES DE DONNÉES ====================
 
 class Message(BaseModel):
@@ -34,7 +77,10 @@ class Message(BaseModel):
     timestamp: Optional[str] = None
 
 class ChatRequest(BaseModel):
-    messages: List[Message]
+    messages: List[Message]  # Avec session_id : uniquement les nouveaux messages
+    session_id: Optional[str] = None
+    max_context_tokens: Optional[int] = None
+    use_cache: Optional[bool] = True  # Permet de contourner le cache pour une requête
     model: Optional[str] = "mistral-small"
     temperature: Optional[float] = 0.7
     max_tokens: Optional[int] = 1000
@@ -46,6 +92,14 @@ class ChatResponse(BaseModel):
     model: str
     usage: Optional[Dict[str, int]] = None
     timestamp: str
+    session_id: Optional[str] = None
+    cached: bool = False
+
+class SessionResponse(BaseModel):
+    session_id: str
+    message_count: int
+    created_at: float
+    last_access: float
 
 class ToolRequest(BaseModel):
     tool_name: str
@@ -56,6 +110,52 @@ class ToolResponse(BaseModel):
     tool_name: str
     timestamp: str
 
+class PipelineRequest(BaseModel):
+    calls: List[ToolRequest]
+
+class PipelineResponse(BaseModel):
+    results: List[Dict[str, Any]]
+    timestamp: str
+
+class BatchToolRequest(BaseModel):
+    tool_name: str
+    columns: Dict[str, List[Any]]  # Une liste par paramètre, une entrée par ligne
+
+class BatchToolResponse(BaseModel):
+    results: List[Dict[str, Any]]
+    tool_name: str
+    count: int
+    error_count: int
+    timestamp: str
+
+class ConcentrationParams(BaseModel):
+    total_students: int
+    present_students: int
+    active_participants: int = 0
+    average_quiz_score: float = 0.0
+    attention_duration: int = Field(0, description="minutes")
+
+class SuccessPredictionParams(BaseModel):
+    absences: int
+    total_sessions: int
+    grades: List[float] = []
+    current_average: float = 0.0
+
+class StudentPredictionParams(BaseModel):
+    student_id: str
+
+class StudentEvent(BaseModel):
+    grades: List[float] = []  # Nouvelles notes, dans l'ordre chronologique
+    absences: int = 0
+    sessions: int = 0
+    current_average: Optional[float] = None
+
+class StudentBulkEvent(StudentEvent):
+    student_id: str
+
+class StudentBulkRequest(BaseModel):
+    events: List[StudentBulkEvent]
+
 class RAGRequest(BaseModel):
     query: str
     max_results: Optional[int] = 3
@@ -65,6 +165,40 @@ class RAGResponse(BaseModel):
     query: str
     timestamp: str
 
+# ==================== SESSIONS DE CONVERSATION ====================
+
+session_store = SessionStore()
+
+async def _evict_idle_sessions_periodically(interval: float = 60.0):
+    """Tâche de fond : éviction des sessions inactives"""
+    while True:
+        await asyncio.sleep(interval)
+        session_store.evict_idle()
+
+@app.on_event("startup")
+async def start_session_eviction():
+    asyncio.create_task(_evict_idle_sessions_periodically())
+
+# ==================== CACHE DES RÉPONSES ====================
+
+response_cache = ResponseCache()
+upstream_llm_calls = 0
+
+def generate_llm_response(system_prompt: str, messages: List[Dict[str, Any]],
+                          request: ChatRequest) -> tuple:
+    """Appel au LLM amont, retourne (texte, usage)"""
+    global upstream_llm_calls
+    upstream_llm_calls += 1
+
+    # Ici, vous intégreriez votre appel à MistralAI
+    # Pour l'instant, on simule une réponse
+    # TODO: Intégrer l'API MistralAI réelle
+    conversation = "\n".join([f"{msg['role']}: {msg['content']}" for msg in messages])
+    
+    # Simulation de réponse (remplacer par appel réel à MistralAI)
+    response_text = f"Réponse simulée pour: {messages[-1]['content']}"
+    return response_text, {"prompt_tokens": 100, "completion_tokens": 50}
+
 # ==================== BASE DE CONNAISSANCES (RAG) ====================
 
 KNOWLEDGE_BASE = [
@@ -100,6 +234,19 @@ KNOWLEDGE_BASE = [
     }
 ]
 
+# ==================== OUTILS ====================
+
+tool_registry = ToolRegistry()
+
+@app.on_event("shutdown")
+async def shutdown_tool_executors():
+    tool_registry.shutdown()
+
+@tool_registry.tool(
+    name="analyze_concentration",
+    description="Analyse le taux de concentration en classe",
+    parameters=ConcentrationParams,
+)
 def analyze_concentration(data: Dict[str, Any]) -> Dict[str, Any]:
     """Analyse le taux de concentration en classe"""
     total_students = data.get("total_students", 0)
@@ -146,32 +293,8 @@ def analyze_concentration(data: Dict[str, Any]) -> Dict[str, Any]:
         }
     }
 
-def predict_success(data: Dict[str, Any]) -> Dict[str, Any]:
-    """Prédit la réussite académique"""
-    absences = data.get("absences", 0)
-    total_sessions = data.get("total_sessions", 0)
-    grades = data.get("grades", [])
-    current_average = data.get("current_average", 0.0)
-    
-    if total_sessions == 0:
-        raise ValueError("total_sessions doit être supérieur à 0")
-    
-    if not grades:
-        if current_average > 0:
-            grades = [current_average]
-        else:
-            raise ValueError("grades ou current_average requis")
-    
-    absence_rate = (absences / total_sessions) * 100
-    
-    # Calcul de la tendance
-    trend = 0.0
-    if len(grades) >= 2:
-        recent = sum(grades[:3]) / min(3, len(grades))
-        older = sum(grades[3:]) / (len(grades) - 3) if len(grades) > 3 else recent
-        trend = recent - older
-    
-    # Score de prédiction
+def score_success(absence_rate: float, current_average: float, trend: float) -> tuple:
+    """Score de prédiction de réussite et probabilité associée"""
     success_score = 50.0
     
     if absence_rate > 30:
@@ -206,6 +329,40 @@ def predict_success(data: Dict[str, Any]) -> Dict[str, Any]:
     else:
         probability = "Faible"
     
+    return success_score, probability
+
+@tool_registry.tool(
+    name="predict_success",
+    description="Prédit la réussite académique",
+    parameters=SuccessPredictionParams,
+)
+def predict_success(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Prédit la réussite académique"""
+    absences = data.get("absences", 0)
+    total_sessions = data.get("total_sessions", 0)
+    grades = data.get("grades", [])
+    current_average = data.get("current_average", 0.0)
+    
+    if total_sessions == 0:
+        raise ValueError("total_sessions doit être supérieur à 0")
+    
+    if not grades:
+        if current_average > 0:
+            grades = [current_average]
+        else:
+            raise ValueError("grades ou current_average requis")
+    
+    absence_rate = (absences / total_sessions) * 100
+    
+    # Calcul de la tendance
+    trend = 0.0
+    if len(grades) >= 2:
+        recent = sum(grades[:3]) / min(3, len(grades))
+        older = sum(grades[3:]) / (len(grades) - 3) if len(grades) > 3 else recent
+        trend = recent - older
+    
+    success_score, probability = score_success(absence_rate, current_average, trend)
+    
     return {
         "success_score": round(success_score, 2),
         "probability": probability,
@@ -220,23 +377,103 @@ def predict_success(data: Dict[str, Any]) -> Dict[str, Any]:
         }
     }
 
-# ==================== ENDPOINTS MCP ====================
+# ==================== ÉTAT ANALYTIQUE PAR ÉTUDIANT ====================
 
-@app.get("/")
-async def root():
-    """Endpoint de santé"""
+student_store = StudentStore()
+
+def predict_from_state(state: StudentState) -> Dict[str, Any]:
+    """Prédiction de réussite à partir des agrégats stockés (sans historique complet)"""
+    if state.total_sessions == 0:
+        raise ValueError("total_sessions doit être supérieur à 0")
+    if state.grade_count == 0 and not state.average > 0:
+        raise ValueError("grades ou current_average requis")
+    
+    absence_rate = (state.absences / state.total_sessions) * 100
+    trend = state.trend
+    success_score, probability = score_success(absence_rate, state.average, trend)
+    
     return {
-        "status": "online",
-        "service": "EMSI MCP Server",
-        "version": "1.0.0",
-        "endpoints": {
-            "chat": "/mcp/chat",
-            "tools": "/mcp/tools",
-            "rag": "/mcp/rag",
-            "health": "/health"
+        "student_id": state.student_id,
+        "success_score": round(success_score, 2),
+        "probability": probability,
+        "absence_rate": round(absence_rate, 2),
+        "current_average": round(state.average, 2),
+        "trend": round(trend, 2),
+        "analysis": {
+            "absences": state.absences,
+            "total_sessions": state.total_sessions,
+            "grade_count": state.grade_count,
+            "recent_grades": list(state.recent),
+            "trend_direction": "positive" if trend > 0 else "negative" if trend < 0 else "stable"
         }
     }
 
+@tool_registry.tool(
+    name="predict_student_success",
+    description="Prédit la réussite d'un étudiant à partir de son état enregistré",
+    parameters=StudentPredictionParams,
+    executor="thread",
+)
+def predict_student_success(data: Dict[str, Any]) -> Dict[str, Any]:
+    state = student_store.get(data["student_id"])
+    if state is None:
+        raise ValueError(f"Étudiant '{data['student_id']}' inconnu")
+    return predict_from_state(state)
+
+# ==================== ENDPOINTS MCP ====================
+
+# ==================== REQUÊTES CONDITIONNELLES (ETAG) ====================
+
+def make_etag(*parts: Any, weak: bool = False) -> str:
+    """
+    ETag dérivé d'un contenu ou d'une version
+
+    Fort par défaut (corps identique octet par octet) ; weak=True quand le
+    corps contient des champs variables (horodatage) pour un même contenu.
+    """
+    digest = hashlib.sha256(
+        json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    ).hexdigest()
+    return f'{"W/" if weak else ""}"{digest[:32]}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    # Comparaison faible (RFC 9110) : la compression transforme l'ETag en W/"..."
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+def conditional_response(request: Request, etag: str, build_content) -> Response:
+    """304 si le client a déjà cette version, sinon la réponse avec son ETag"""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return FastJSONResponse(build_content(), headers=headers)
+
+# Version de la base de connaissances : change dès que son contenu change
+KNOWLEDGE_BASE_VERSION = make_etag(KNOWLEDGE_BASE).strip('"')
+
+ROOT_INFO = {
+    "status": "online",
+    "service": "EMSI MCP Server",
+    "version": "1.0.0",
+    "endpoints": {
+        "chat": "/mcp/chat",
+        "tools": "/mcp/tools",
+        "tools_batch": "/mcp/tools/batch",
+        "rag": "/mcp/rag",
+        "sessions": "/mcp/sessions",
+        "health": "/health"
+    }
+}
+ROOT_ETAG = make_etag(ROOT_INFO)
+
+@app.get("/")
+async def root(request: Request):
+    """Endpoint de santé"""
+    return conditional_response(request, ROOT_ETAG, lambda: ROOT_INFO)
+
 @app.get("/health")
 async def health():
     """Vérification de santé du serveur"""
@@ -249,26 +486,93 @@ async def chat(request: ChatRequest):
     Compatible avec le protocole MCP
     """
     try:
-        # Ici, vous intégreriez votre appel à MistralAI
-        # Pour l'instant, on simule une réponse
-        # TODO: Intégrer l'API MistralAI réelle
-        
+        session = None
+        if request.session_id:
+            session = session_store.get(request.session_id)
+            if session is None:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Session '{request.session_id}' inconnue ou expirée"
+                )
+            # Le client n'envoie que les nouveaux messages : on les ajoute à l'historique
+            for msg in request.messages:
+                session.append(msg.role, msg.content, msg.timestamp)
+            messages = session.context(request.max_context_tokens or SESSION_CONTEXT_TOKENS)
+        else:
+            messages = [msg.model_dump() for msg in request.messages]
+
+        if not messages:
+            raise HTTPException(status_code=400, detail="Aucun message à traiter")
+
         # Construire le prompt
         system_prompt = request.system_role or "You are a helpful assistant."
-        conversation = "\n".join([f"{msg.role}: {msg.content}" for msg in request.messages])
-        
-        # Simulation de réponse (remplacer par appel réel à MistralAI)
-        response_text = f"Réponse simulée pour: {request.messages[-1].content}"
+
+        cache_key = None
+        cached = None
+        if request.use_cache and response_cache.is_cacheable(request.temperature):
+            cache_key = chat_cache_key(messages, {
+                "model": request.model,
+                "system_role": system_prompt,
+                "temperature": request.temperature,
+                "max_tokens": request.max_tokens,
+                "top_p": request.top_p,
+            })
+            cached = response_cache.get(cache_key)
+
+        if cached is not None:
+            response_text, usage = cached
+        else:
+            response_text, usage = generate_llm_response(system_prompt, messages, request)
+            if cache_key is not None:
+                response_cache.put(cache_key, (response_text, usage))
+        timestamp = datetime.now().isoformat()
+
+        if session is not None:
+            session.append("assistant", response_text, timestamp)
         
-        return ChatResponse(
-            response=response_text,
-            model=request.model,
-            usage={"prompt_tokens": 100, "completion_tokens": 50},
-            timestamp=datetime.now().isoformat()
-        )
+        return FastJSONResponse({
+            "response": response_text,
+            "model": request.model,
+            "usage": usage,
+            "timestamp": timestamp,
+            "session_id": session.session_id if session is not None else None,
+            "cached": cached is not None
+        })
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/mcp/sessions", response_model=SessionResponse)
+async def create_session():
+    """Crée une session de conversation dont l'historique est conservé par le serveur"""
+    return SessionResponse(**session_store.create().to_dict())
+
+@app.get("/mcp/sessions/{session_id}", response_model=SessionResponse)
+async def get_session(session_id: str):
+    """Informations sur une session"""
+    session = session_store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Session '{session_id}' inconnue ou expirée")
+    return SessionResponse(**session.to_dict())
+
+@app.delete("/mcp/sessions/{session_id}")
+async def delete_session(session_id: str):
+    """Supprime une session et son historique"""
+    if not session_store.delete(session_id):
+        raise HTTPException(status_code=404, detail=f"Session '{session_id}' inconnue ou expirée")
+    return {"deleted": True, "session_id": session_id}
+
+@app.get("/mcp/sessions")
+async def sessions_stats():
+    """Statistiques du stockage des sessions"""
+    return session_store.stats()
+
+@app.get("/mcp/cache/stats")
+async def cache_stats():
+    """Statistiques du cache de réponses (appels LLM amont évités)"""
+    return {**response_cache.stats(), "upstream_llm_calls": upstream_llm_calls}
+
 @app.post("/mcp/tools", response_model=ToolResponse)
 async def execute_tool(request: ToolRequest):
     """
@@ -276,33 +580,123 @@ async def execute_tool(request: ToolRequest):
     """
     try:
         tool_name = request.tool_name
-        parameters = request.parameters
+        result = await tool_registry.execute(tool_name, request.parameters)
         
-        if tool_name == "analyze_concentration":
-            result = analyze_concentration(parameters)
-        elif tool_name == "predict_success":
-            result = predict_success(parameters)
-        else:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Outil '{tool_name}' non reconnu. Outils disponibles: analyze_concentration, predict_success"
-            )
-        
-        return ToolResponse(
-            result=result,
-            tool_name=tool_name,
-            timestamp=datetime.now().isoformat()
+        return FastJSONResponse({
+            "result": result,
+            "tool_name": tool_name,
+            "timestamp": datetime.now().isoformat()
+        })
+    except UnknownToolError as e:
+        raise HTTPException(status_code=400, detail=e.args[0])
+    except ToolTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def _execute_pipelined_call(call: ToolRequest) -> Dict[str, Any]:
+    try:
+        result = await tool_registry.execute(call.tool_name, call.parameters)
+        return {"tool_name": call.tool_name, "result": result}
+    except UnknownToolError as e:
+        return {"tool_name": call.tool_name, "error": e.args[0], "status_code": 400}
+    except ToolTimeoutError as e:
+        return {"tool_name": call.tool_name, "error": str(e), "status_code": 504}
+    except ValueError as e:
+        return {"tool_name": call.tool_name, "error": str(e), "status_code": 400}
+    except Exception as e:
+        return {"tool_name": call.tool_name, "error": str(e), "status_code": 500}
+
+@app.post("/mcp/tools/pipeline", response_model=PipelineResponse)
+async def execute_tool_pipeline(request: PipelineRequest):
+    """
+    Exécute plusieurs appels d'outils (éventuellement différents) en un seul aller-retour.
+    Les appels s'exécutent en parallèle ; les résultats sont dans le même ordre.
+    """
+    results = await asyncio.gather(*(_execute_pipelined_call(call) for call in request.calls))
+    return FastJSONResponse({"results": list(results), "timestamp": datetime.now().isoformat()})
+
+@app.post("/mcp/tools/batch", response_model=BatchToolResponse)
+def execute_tool_batch(request: BatchToolRequest):
+    """
+    Exécute un outil sur toute une cohorte en une seule requête.
+    Les paramètres sont fournis en colonnes ; les résultats sont dans le même ordre
+    et une ligne invalide contient un champ "error" sans faire échouer le lot.
+    Endpoint synchrone : NumPy et la validation ligne par ligne tournent dans le
+    pool de threads de FastAPI, pas sur la boucle d'événements.
+    """
+    batch_tool = BATCH_TOOLS.get(request.tool_name)
+    if batch_tool is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Outil '{request.tool_name}' non disponible en lot. Outils disponibles: {', '.join(BATCH_TOOLS)}"
         )
+    try:
+        results = batch_tool(request.columns)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    return FastJSONResponse({
+        "results": results,
+        "tool_name": request.tool_name,
+        "count": len(results),
+        "error_count": sum(1 for r in results if "error" in r),
+        "timestamp": datetime.now().isoformat()
+    })
+
+# Endpoints synchrones (def) : FastAPI les exécute dans son pool de threads,
+# les commits SQLite ne bloquent pas la boucle d'événements
+
+@app.post("/mcp/students/{student_id}/events")
+def record_student_event(student_id: str, event: StudentEvent):
+    """Enregistre de nouvelles notes / absences / séances pour un étudiant"""
+    state = student_store.record(
+        student_id, event.grades, event.absences, event.sessions, event.current_average
+    )
+    return state.to_dict()
+
+@app.post("/mcp/students/events/bulk")
+def record_student_events_bulk(request: StudentBulkRequest):
+    """Ingestion en masse d'événements (une seule transaction)"""
+    summary = student_store.record_bulk(event.model_dump() for event in request.events)
+    return {**summary, "timestamp": datetime.now().isoformat()}
+
+def _student_prediction(student_id: str) -> Dict[str, Any]:
+    state = student_store.get(student_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail=f"Étudiant '{student_id}' inconnu")
+    try:
+        return predict_from_state(state)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/mcp/students/{student_id}/prediction")
+def student_prediction(student_id: str):
+    """Prédiction de réussite servie par identifiant, sans renvoyer l'historique (lecture seule)"""
+    return {"result": _student_prediction(student_id), "timestamp": datetime.now().isoformat()}
+
+@app.post("/mcp/students/{student_id}/prediction")
+def record_student_prediction(student_id: str):
+    """Calcule la prédiction et l'enregistre comme dernier score de l'étudiant"""
+    result = _student_prediction(student_id)
+    student_store.save_score(student_id, result["success_score"])
+    return {"result": result, "timestamp": datetime.now().isoformat()}
+
 @app.post("/mcp/rag", response_model=RAGResponse)
-async def rag_search(request: RAGRequest):
+async def rag_search(request: RAGRequest, http_request: Request):
     """
     Recherche dans la base de connaissances (RAG)
+    L'ETag dépend de la version de la base et de la requête : un client qui a
+    déjà le résultat reçoit 304 sans que la recherche soit refaite. Il est
+    faible : les résultats sont identiques mais le timestamp du corps change.
     """
+    etag = make_etag(KNOWLEDGE_BASE_VERSION, request.query, request.max_results, weak=True)
+    if etag_matches(http_request, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
     try:
         query = request.query.lower()
         max_results = request.max_results or 3
@@ -335,60 +729,79 @@ async def rag_search(request: RAGRequest):
         for result in results:
             result.pop("relevance_score", None)
         
-        return RAGResponse(
-            results=results,
-            query=request.query,
-            timestamp=datetime.now().isoformat()
+        return FastJSONResponse(
+            {"results": results, "query": request.query, "timestamp": datetime.now().isoformat()},
+            headers={"ETag": etag, "Cache-Control": "no-cache"}
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/mcp/tools/list")
-async def list_tools():
-    """Liste tous les outils disponibles"""
-    return {
-        "tools": [
-            {
-                "name": "analyze_concentration",
-                "description": "Analyse le taux de concentration en classe",
-                "parameters": {
-                    "total_students": "int (requis)",
-                    "present_students": "int (requis)",
-                    "active_participants": "int",
-                    "average_quiz_score": "float",
-                    "attention_duration": "int (minutes)"
-                }
-            },
-            {
-                "name": "predict_success",
-                "description": "Prédit la réussite académique",
-                "parameters": {
-                    "absences": "int (requis)",
-                    "total_sessions": "int (requis)",
-                    "grades": "list[float]",
-                    "current_average": "float"
-                }
-            }
-        ]
-    }
+async def list_tools(request: Request):
+    """Liste tous les outils disponibles (générée depuis le registre)"""
+    tools, etag = _tools_listing()
+    return conditional_response(request, etag, lambda: tools)
+
+@lru_cache(maxsize=1)
+def _tools_listing() -> tuple:
+    # Le registre est figé après l'import : la liste et son ETag sont calculés une fois
+    tools = {"tools": tool_registry.describe()}
+    return tools, make_etag(tools)
 
 # ==================== DEEP LEARNING ENDPOINTS ====================
 
+dl_server = DLModelServer()
+
+@app.on_event("shutdown")
+async def shutdown_dl_server():
+    dl_server.shutdown()
+
 @app.post("/dl/predict")
-async def deep_learning_predict(file: bytes = Body(...), model_type: str = "pneumonia"):
+async def deep_learning_predict(request: Request, model_type: str = "pneumonia"):
     """
     Endpoint pour les prédictions Deep Learning (images)
     Supporte: pneumonia, fruits
+    Corps : image brute (image/jpeg, image/png, ...) ou multipart avec un champ "file"
     """
-    # TODO: Intégrer vos modèles de deep learning
-    # Exemple avec TensorFlow/PyTorch
+    if not dl_server.has_model(model_type):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Modèle '{model_type}' non reconnu. Modèles disponibles: pneumonia, fruits"
+        )
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Champ 'file' manquant")
+        body = await upload.read()
+    else:
+        body = await request.body()
+    if not body:
+        raise HTTPException(status_code=400, detail="Image manquante")
+
+    try:
+        prediction, confidence = await dl_server.predict(model_type, body)
+    except ModelUnavailableError as e:
+        headers = {"Retry-After": str(math.ceil(e.retry_after))} if e.retry_after else None
+        raise HTTPException(status_code=503, detail=str(e), headers=headers)
+    except (OSError, SyntaxError) as e:
+        # PIL lève OSError / UnidentifiedImageError pour une image illisible
+        raise HTTPException(status_code=400, detail=f"Image invalide: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
     
-    return {
-        "prediction": "normal",  # ou "pneumonia", "apple", etc.
-        "confidence": 0.95,
+    return FastJSONResponse({
+        "prediction": prediction,
+        "confidence": round(confidence, 4),
         "model_type": model_type,
         "timestamp": datetime.now().isoformat()
-    }
+    })
+
+@app.get("/dl/status")
+async def deep_learning_status():
+    """État de chargement des modèles Deep Learning"""
+    return dl_server.status()
 
 # ==================== LANCEMENT DU SERVEUR ====================
 
@@ -0,0 +1,109 @@
+"""
+Cache de réponses pour les requêtes /mcp/chat déterministes.
+
+Les questions de type FAQ reviennent souvent avec le même modèle, le même
+rôle système, la même température et le même contenu : la réponse du LLM
+est alors réutilisée au lieu de refaire un appel amont. Le cache est
+optionnel (MCP_CHAT_CACHE=1) et ne concerne que les températures basses.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+# ==================== CONFIGURATION ====================
+
+CHAT_CACHE_ENABLED = os.environ.get("MCP_CHAT_CACHE", "0").lower() in ("1", "true", "yes")
+CHAT_CACHE_MAX_ENTRIES = int(os.environ.get("MCP_CHAT_CACHE_MAX_ENTRIES", "1024"))
+CHAT_CACHE_TTL = float(os.environ.get("MCP_CHAT_CACHE_TTL", "3600"))  # secondes
+CHAT_CACHE_MAX_TEMPERATURE = float(os.environ.get("MCP_CHAT_CACHE_MAX_TEMPERATURE", "0.2"))
+
+
+def chat_cache_key(messages: List[Dict[str, Any]], params: Dict[str, Any]) -> str:
+    """
+    Hash canonique d'une requête de chat.
+
+    Seuls le rôle et le contenu des messages sont pris en compte (pas les
+    horodatages), avec les paramètres de génération.
+    """
+    canonical = json.dumps(
+        {
+            "messages": [[m["role"], m["content"]] for m in messages],
+            "params": params,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Cache LRU borné en taille avec expiration (TTL)"""
+
+    def __init__(self, max_entries: int = CHAT_CACHE_MAX_ENTRIES, ttl: float = CHAT_CACHE_TTL,
+                 enabled: bool = CHAT_CACHE_ENABLED,
+                 max_temperature: float = CHAT_CACHE_MAX_TEMPERATURE):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = enabled
+        self.max_temperature = max_temperature
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def is_cacheable(self, temperature: Optional[float]) -> bool:
+        """Seules les requêtes (quasi) déterministes sont mises en cache"""
+        return self.enabled and temperature is not None and temperature <= self.max_temperature
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < now:
+                del self._entries[key]
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: Any):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "max_temperature": self.max_temperature,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                # Chaque hit correspond à un appel LLM amont évité
+                "saved_upstream_calls": self.hits,
+            }
@@ -0,0 +1,216 @@
+"""
+Sessions de conversation côté serveur pour le serveur MCP.
+
+Le serveur conserve l'historique de chaque session : les clients n'envoient
+plus que les nouveaux messages à chaque tour. Les sessions inactives sont
+évincées d'un stockage mémoire borné (LRU + TTL), avec un niveau SQLite
+optionnel pour conserver les sessions évincées par manque de place.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+# ==================== CONFIGURATION ====================
+
+SESSION_MAX_SESSIONS = int(os.environ.get("MCP_SESSION_MAX_SESSIONS", "1000"))
+SESSION_IDLE_TTL = float(os.environ.get("MCP_SESSION_IDLE_TTL", "1800"))  # secondes
+SESSION_MAX_MESSAGES = int(os.environ.get("MCP_SESSION_MAX_MESSAGES", "200"))
+SESSION_CONTEXT_TOKENS = int(os.environ.get("MCP_SESSION_CONTEXT_TOKENS", "4000"))
+SESSION_DB_PATH = os.environ.get("MCP_SESSION_DB")  # ex: "sessions.sqlite3"
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimation grossière du nombre de tokens (~4 caractères par token)"""
+    return len(text) // 4 + 4
+
+
+def truncate_to_token_budget(messages: List[Dict[str, Any]], max_tokens: int) -> List[Dict[str, Any]]:
+    """
+    Garde les messages les plus récents qui tiennent dans le budget de tokens.
+    Le dernier message est toujours conservé.
+    """
+    kept = []
+    total = 0
+    for msg in reversed(messages):
+        cost = msg.get("tokens") or estimate_tokens(msg["content"])
+        if kept and total + cost > max_tokens:
+            break
+        kept.append(msg)
+        total += cost
+    kept.reverse()
+    return kept
+
+
+class ChatSessionState:
+    """Historique d'une session de conversation"""
+
+    __slots__ = ("session_id", "messages", "created_at", "last_access")
+
+    def __init__(self, session_id: str, messages: Optional[List[Dict[str, Any]]] = None,
+                 created_at: Optional[float] = None, last_access: Optional[float] = None):
+        now = time.time()
+        self.session_id = session_id
+        self.messages = messages or []
+        self.created_at = created_at or now
+        self.last_access = last_access or now
+
+    def append(self, role: str, content: str, timestamp: Optional[str] = None):
+        """Ajoute un message en bornant la taille de l'historique"""
+        self.messages.append({
+            "role": role,
+            "content": content,
+            "timestamp": timestamp,
+            "tokens": estimate_tokens(content),
+        })
+        overflow = len(self.messages) - SESSION_MAX_MESSAGES
+        if overflow > 0:
+            del self.messages[:overflow]
+
+    def context(self, max_tokens: int = SESSION_CONTEXT_TOKENS) -> List[Dict[str, Any]]:
+        """Retourne le contexte tronqué au budget de tokens"""
+        return truncate_to_token_budget(self.messages, max_tokens)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "message_count": len(self.messages),
+            "created_at": self.created_at,
+            "last_access": self.last_access,
+        }
+
+
+class _SQLiteSessionTier:
+    """Niveau persistant optionnel pour les sessions évincées de la mémoire"""
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chat_sessions ("
+            "session_id TEXT PRIMARY KEY, messages TEXT NOT NULL, "
+            "created_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def put(self, state: ChatSessionState):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO chat_sessions VALUES (?, ?, ?, ?)",
+            (state.session_id, json.dumps(state.messages), state.created_at, state.last_access),
+        )
+        self._conn.commit()
+
+    def pop(self, session_id: str) -> Optional[ChatSessionState]:
+        row = self._conn.execute(
+            "SELECT messages, created_at, last_access FROM chat_sessions WHERE session_id = ?",
+            (session_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        self.delete(session_id)
+        return ChatSessionState(session_id, json.loads(row[0]), row[1], row[2])
+
+    def delete(self, session_id: str) -> bool:
+        cursor = self._conn.execute("DELETE FROM chat_sessions WHERE session_id = ?", (session_id,))
+        self._conn.commit()
+        return cursor.rowcount > 0
+
+    def evict_idle(self, cutoff: float) -> int:
+        cursor = self._conn.execute("DELETE FROM chat_sessions WHERE last_access < ?", (cutoff,))
+        self._conn.commit()
+        return cursor.rowcount
+
+    def count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM chat_sessions").fetchone()[0]
+
+
+class SessionStore:
+    """
+    Stockage borné des sessions (LRU en mémoire + TTL d'inactivité).
+
+    Les sessions qui dépassent la capacité mémoire sont déplacées vers SQLite
+    si un chemin de base est configuré, sinon elles sont supprimées.
+    """
+
+    def __init__(self, max_sessions: int = SESSION_MAX_SESSIONS,
+                 idle_ttl: float = SESSION_IDLE_TTL,
+                 db_path: Optional[str] = SESSION_DB_PATH):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._sessions: "OrderedDict[str, ChatSessionState]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = _SQLiteSessionTier(db_path) if db_path else None
+        self.evicted = 0
+
+    def create(self) -> ChatSessionState:
+        """Crée une nouvelle session vide"""
+        state = ChatSessionState(uuid.uuid4().hex)
+        with self._lock:
+            self._sessions[state.session_id] = state
+            self._enforce_capacity()
+        return state
+
+    def get(self, session_id: str) -> Optional[ChatSessionState]:
+        """Retourne la session (et la marque comme récemment utilisée) ou None"""
+        now = time.time()
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None and self._disk is not None:
+                state = self._disk.pop(session_id)
+                if state is not None:
+                    self._sessions[session_id] = state
+            if state is None:
+                return None
+            if now - state.last_access > self.idle_ttl:
+                del self._sessions[session_id]
+                self.evicted += 1
+                return None
+            state.last_access = now
+            self._sessions.move_to_end(session_id)
+            self._enforce_capacity()
+            return state
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            removed = self._sessions.pop(session_id, None) is not None
+            # Une session déchargée n'existe plus que sur disque
+            if self._disk is not None and self._disk.delete(session_id):
+                removed = True
+            return removed
+
+    def evict_idle(self) -> int:
+        """Supprime les sessions inactives depuis plus de idle_ttl secondes"""
+        cutoff = time.time() - self.idle_ttl
+        with self._lock:
+            expired = [sid for sid, s in self._sessions.items() if s.last_access < cutoff]
+            for sid in expired:
+                del self._sessions[sid]
+            count = len(expired)
+            if self._disk is not None:
+                count += self._disk.evict_idle(cutoff)
+            self.evicted += count
+            return count
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "in_memory": len(self._sessions),
+                "on_disk": self._disk.count() if self._disk is not None else 0,
+                "max_sessions": self.max_sessions,
+                "idle_ttl": self.idle_ttl,
+                "evicted": self.evicted,
+            }
+
+    def _enforce_capacity(self):
+        # Appelé avec self._lock acquis
+        while len(self._sessions) > self.max_sessions:
+            _, oldest = self._sessions.popitem(last=False)
+            if self._disk is not None:
+                self._disk.put(oldest)
+            else:
+                self.evicted += 1
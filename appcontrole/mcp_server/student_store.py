@@ -0,0 +1,239 @@
+"""
+Stockage incrémental de l'état analytique par étudiant.
+
+Au lieu de renvoyer tout l'historique des notes à chaque prédiction, le
+serveur conserve des agrégats glissants (fenêtre des 3 notes les plus
+récentes, somme et nombre des notes plus anciennes, compteurs d'absences et
+de séances, dernier score) mis à jour en O(1) à chaque nouvel événement.
+Les états sont persistés dans SQLite (mode WAL) avec un cache mémoire chaud.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+STUDENT_DB_PATH = os.environ.get(
+    "MCP_STUDENT_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "students.sqlite3"),
+)
+STUDENT_CACHE_SIZE = int(os.environ.get("MCP_STUDENT_CACHE_SIZE", "10000"))
+
+# Taille de la fenêtre "récente" utilisée pour la tendance (cf. predict_success)
+RECENT_WINDOW = 3
+
+
+class StudentState:
+    """Agrégats glissants d'un étudiant"""
+
+    __slots__ = ("student_id", "recent", "older_sum", "older_count", "grade_sum",
+                 "grade_count", "absences", "total_sessions", "current_average",
+                 "last_score", "updated_at")
+
+    def __init__(self, student_id: str, recent: Optional[List[float]] = None,
+                 older_sum: float = 0.0, older_count: int = 0,
+                 grade_sum: float = 0.0, grade_count: int = 0,
+                 absences: int = 0, total_sessions: int = 0,
+                 current_average: Optional[float] = None,
+                 last_score: Optional[float] = None,
+                 updated_at: Optional[float] = None):
+        self.student_id = student_id
+        self.recent = recent or []  # notes les plus récentes en premier
+        self.older_sum = older_sum
+        self.older_count = older_count
+        self.grade_sum = grade_sum
+        self.grade_count = grade_count
+        self.absences = absences
+        self.total_sessions = total_sessions
+        self.current_average = current_average  # moyenne imposée (ex: pondérée ECTS)
+        self.last_score = last_score
+        self.updated_at = updated_at or time.time()
+
+    def copy(self) -> "StudentState":
+        return StudentState(self.student_id, list(self.recent), self.older_sum, self.older_count,
+                            self.grade_sum, self.grade_count, self.absences, self.total_sessions,
+                            self.current_average, self.last_score, self.updated_at)
+
+    def add_grade(self, grade: float):
+        self.recent.insert(0, grade)
+        if len(self.recent) > RECENT_WINDOW:
+            self.older_sum += self.recent.pop()
+            self.older_count += 1
+        self.grade_sum += grade
+        self.grade_count += 1
+
+    def apply(self, grades: Iterable[float] = (), absences: int = 0, sessions: int = 0,
+              current_average: Optional[float] = None):
+        """Applique un événement (notes dans l'ordre chronologique, absences, séances)"""
+        for grade in grades:
+            self.add_grade(float(grade))
+        self.absences += absences
+        self.total_sessions += sessions
+        if current_average is not None:
+            self.current_average = current_average
+        self.updated_at = time.time()
+
+    @property
+    def average(self) -> float:
+        if self.current_average is not None:
+            return self.current_average
+        return self.grade_sum / self.grade_count if self.grade_count else 0.0
+
+    @property
+    def trend(self) -> float:
+        """Même calcul que predict_success sur la liste [plus récente, ..., plus ancienne]"""
+        if self.grade_count < 2:
+            return 0.0
+        recent = sum(self.recent) / len(self.recent)
+        older = self.older_sum / self.older_count if self.older_count else recent
+        return recent - older
+
+    def to_row(self) -> tuple:
+        return (self.student_id, json.dumps(self.recent), self.older_sum, self.older_count,
+                self.grade_sum, self.grade_count, self.absences, self.total_sessions,
+                self.current_average, self.last_score, self.updated_at)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "student_id": self.student_id,
+            "recent_grades": list(self.recent),
+            "grade_count": self.grade_count,
+            "current_average": round(self.average, 2),
+            "absences": self.absences,
+            "total_sessions": self.total_sessions,
+            "last_score": self.last_score,
+            "updated_at": self.updated_at,
+        }
+
+
+_COLUMNS = ("student_id, recent, older_sum, older_count, grade_sum, grade_count, "
+            "absences, total_sessions, current_average, last_score, updated_at")
+
+
+class StudentStore:
+    """
+    États des étudiants : SQLite (WAL) + cache LRU en mémoire, écriture immédiate
+
+    Les états en cache ne sont jamais modifiés sur place : une mise à jour
+    travaille sur une copie, qui ne remplace l'état en cache qu'une fois la
+    transaction validée. Un échec d'écriture laisse mémoire et disque
+    identiques, et un état renvoyé par get() reste cohérent.
+    """
+
+    def __init__(self, db_path: str = STUDENT_DB_PATH, cache_size: int = STUDENT_CACHE_SIZE):
+        self.db_path = db_path
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, StudentState]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        # Ouverture à la première utilisation
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS student_state ("
+                "student_id TEXT PRIMARY KEY, recent TEXT NOT NULL, "
+                "older_sum REAL NOT NULL, older_count INTEGER NOT NULL, "
+                "grade_sum REAL NOT NULL, grade_count INTEGER NOT NULL, "
+                "absences INTEGER NOT NULL, total_sessions INTEGER NOT NULL, "
+                "current_average REAL, last_score REAL, updated_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _load(self, student_id: str) -> Optional[StudentState]:
+        state = self._cache.get(student_id)
+        if state is not None:
+            self._cache.move_to_end(student_id)
+            return state
+        row = self._db().execute(
+            f"SELECT {_COLUMNS} FROM student_state WHERE student_id = ?", (student_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        state = StudentState(row[0], json.loads(row[1]), *row[2:])
+        self._remember(state)
+        return state
+
+    def _remember(self, state: StudentState):
+        self._cache[state.student_id] = state
+        self._cache.move_to_end(state.student_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _upsert(self, states: List[StudentState]):
+        conn = self._db()
+        with conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO student_state ({_COLUMNS}) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [state.to_row() for state in states],
+            )
+
+    def get(self, student_id: str) -> Optional[StudentState]:
+        with self._lock:
+            return self._load(student_id)
+
+    def record(self, student_id: str, grades: Iterable[float] = (), absences: int = 0,
+               sessions: int = 0, current_average: Optional[float] = None) -> StudentState:
+        """Applique un événement à un étudiant (créé au besoin)"""
+        with self._lock:
+            current = self._load(student_id)
+            state = current.copy() if current else StudentState(student_id)
+            state.apply(grades, absences, sessions, current_average)
+            self._upsert([state])
+            self._remember(state)
+            return state
+
+    def record_bulk(self, events: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Ingestion en masse (ex: un semestre d'événements) : tous les événements
+        sont appliqués en mémoire puis écrits en une seule transaction.
+        """
+        with self._lock:
+            touched: Dict[str, StudentState] = {}
+            count = 0
+            for event in events:
+                student_id = event["student_id"]
+                state = touched.get(student_id)
+                if state is None:
+                    current = self._load(student_id)
+                    state = current.copy() if current else StudentState(student_id)
+                state.apply(
+                    event.get("grades") or (),
+                    event.get("absences") or 0,
+                    event.get("sessions") or 0,
+                    event.get("current_average"),
+                )
+                touched[student_id] = state
+                count += 1
+            self._upsert(list(touched.values()))
+            for state in touched.values():
+                self._remember(state)
+            return {"events": count, "students": len(touched)}
+
+    def save_score(self, student_id: str, score: float) -> Optional[StudentState]:
+        """Enregistre le dernier score d'un étudiant (None si inconnu)"""
+        with self._lock:
+            current = self._load(student_id)
+            if current is None:
+                return None
+            state = current.copy()
+            state.last_score = score
+            self._upsert([state])
+            self._remember(state)
+            return state
+
+    def delete(self, student_id: str) -> bool:
+        with self._lock:
+            self._cache.pop(student_id, None)
+            conn = self._db()
+            with conn:
+                cursor = conn.execute("DELETE FROM student_state WHERE student_id = ?", (student_id,))
+            return cursor.rowcount > 0
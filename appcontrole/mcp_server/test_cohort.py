@@ -0,0 +1,110 @@
+"""
+Tests de cohort.py : les outils vectorisés doivent donner exactement les
+résultats des outils scalaires de main.py, ligne par ligne.
+
+Lancement : python -m pytest test_cohort.py
+"""
+
+import os
+import random
+import sys
+import tempfile
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+# Base étudiants jetable : main.py l'ouvre à l'import
+os.environ.setdefault("MCP_STUDENT_DB", os.path.join(tempfile.mkdtemp(), "students.sqlite3"))
+
+from fastapi.testclient import TestClient
+
+import cohort
+import main
+
+
+def scalar_results(tool, rows):
+    """Résultats attendus : l'outil scalaire appelé ligne par ligne"""
+    results = []
+    for index, row in enumerate(rows):
+        try:
+            results.append({"index": index, **tool(dict(row))})
+        except ValueError as e:
+            results.append({"index": index, "error": str(e)})
+    return results
+
+
+def to_columns(rows, names):
+    return {name: [row[name] for row in rows] for name in names}
+
+
+CONCENTRATION_PARAMS = ("total_students", "present_students", "active_participants",
+                        "average_quiz_score", "attention_duration")
+SUCCESS_PARAMS = ("absences", "total_sessions", "grades", "current_average")
+
+
+def test_analyze_concentration_matches_scalar_tool():
+    rng = random.Random(0)
+    rows = []
+    for _ in range(500):
+        total = rng.choice([0, rng.randint(1, 60)])
+        present = rng.randint(0, total) if total else 0
+        rows.append({
+            "total_students": total,
+            "present_students": present,
+            "active_participants": rng.randint(0, present) if present else 0,
+            "average_quiz_score": round(rng.uniform(0, 100), 1),
+            "attention_duration": rng.randint(0, 120),
+        })
+    columns = to_columns(rows, CONCENTRATION_PARAMS)
+    assert cohort.analyze_concentration_batch(columns) == scalar_results(main.analyze_concentration, rows)
+
+
+def test_predict_success_matches_scalar_tool():
+    rng = random.Random(1)
+    rows = []
+    for _ in range(500):
+        grades = [round(rng.uniform(0, 20), rng.choice([0, 2])) for _ in range(rng.choice([0, 1, 2, 3, 4, 7]))]
+        rows.append({
+            "absences": rng.randint(0, 20),
+            "total_sessions": rng.choice([0, rng.randint(1, 40)]),
+            "grades": grades,
+            "current_average": rng.choice([0.0, round(rng.uniform(0, 20), 2)]),
+        })
+    columns = to_columns(rows, SUCCESS_PARAMS)
+    assert cohort.predict_success_batch(columns) == scalar_results(main.predict_success, rows)
+
+
+def test_invalid_rows_do_not_fail_the_batch():
+    results = cohort.predict_success_batch({
+        "absences": [1, "x", 2, 3],
+        "total_sessions": [10, 10, 10, 10],
+        "grades": [[12, 14], [12], [12, "bad"], "not a list"],
+    })
+    assert "error" not in results[0]
+    assert [result.get("error") for result in results[1:]] == ["Paramètres numériques invalides"] * 3
+
+
+def test_columns_of_different_lengths_are_rejected():
+    with pytest.raises(ValueError):
+        cohort.analyze_concentration_batch({"total_students": [10, 20], "present_students": [5]})
+
+
+def test_batch_endpoint():
+    client = TestClient(main.app)
+    response = client.post("/mcp/tools/batch", json={
+        "tool_name": "analyze_concentration",
+        "columns": {"total_students": [30, 0], "present_students": [25, 0]},
+    })
+    assert response.status_code == 200
+    body = response.json()
+    assert body["count"] == 2 and body["error_count"] == 1
+
+    response = client.post("/mcp/tools/batch", json={"tool_name": "unknown", "columns": {"a": [1]}})
+    assert response.status_code == 400
+
+
+def test_batch_endpoint_runs_off_the_event_loop():
+    # Les endpoints synchrones (def) sont exécutés par FastAPI dans son pool de threads
+    import inspect
+    endpoint = next(route.endpoint for route in main.app.routes if getattr(route, "path", None) == "/mcp/tools/batch")
+    assert not inspect.iscoroutinefunction(endpoint)
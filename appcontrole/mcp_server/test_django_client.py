@@ -0,0 +1,296 @@
+"""
+Tests de django_client_example.py : clients MCP (pool de connexions,
+requêtes conditionnelles, règles de retry) contre un vrai serveur uvicorn,
+et stockage des messages de ChatSession en lignes ajoutées.
+
+Le module définit des modèles Django : il est importé comme application
+installée (mcp_server) avec une base SQLite en mémoire.
+
+Lancement : python -m pytest test_django_client.py
+"""
+
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import pytest
+
+_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(_DIR)
+sys.path.append(os.path.dirname(_DIR))
+# Base étudiants jetable : main.py l'ouvre à l'import
+os.environ.setdefault("MCP_STUDENT_DB", os.path.join(tempfile.mkdtemp(), "students.sqlite3"))
+
+django = pytest.importorskip("django")
+from django.conf import settings
+
+if not settings.configured:
+    settings.configure(
+        INSTALLED_APPS=["mcp_server"],
+        DATABASES={"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}},
+        DEFAULT_AUTO_FIELD="django.db.models.AutoField",
+        USE_TZ=True,
+    )
+    django.setup()
+
+import httpx
+import requests
+import uvicorn
+from fastapi import FastAPI, Response
+
+from django.db import connection
+
+import main
+from mcp_server import django_client_example as client_module
+from mcp_server.django_client_example import (
+    AsyncMCPClient, ChatMessage, ChatSession, MCPClient, ValidatorCache, migrate_json_sessions
+)
+
+
+@contextmanager
+def serve(app):
+    """Lance l'application ASGI dans un thread uvicorn et renvoie son URL"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="error"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("uvicorn n'a pas démarré")
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join(10)
+
+
+@pytest.fixture(scope="module")
+def mcp_url():
+    with serve(main.app) as url:
+        yield url
+
+
+@pytest.fixture
+def flaky_server():
+    """Serveur qui répond toujours 503 et compte les requêtes reçues par chemin"""
+    app = FastAPI()
+    hits = {}
+
+    @app.api_route("/{path:path}", methods=["GET", "POST"])
+    def unavailable(path: str):
+        hits[path] = hits.get(path, 0) + 1
+        return Response(status_code=503)
+
+    with serve(app) as url:
+        yield url, hits
+
+
+def record_statuses(client):
+    statuses = []
+    for session in (client.session, client.write_session):
+        session.hooks["response"].append(lambda response, *args, **kwargs: statuses.append(response.status_code))
+    return statuses
+
+
+# ==================== CACHE DES VALIDATEURS ====================
+
+def test_validator_cache():
+    cache = ValidatorCache(max_entries=2)
+    first = ValidatorCache.key("POST", "/mcp/rag", {"query": "a", "max_results": 3})
+    assert first == ValidatorCache.key("POST", "/mcp/rag", {"max_results": 3, "query": "a"})
+    assert cache.headers(first) == {}
+
+    cache.store(first, '"v1"', {"results": []})
+    assert cache.headers(first) == {"If-None-Match": '"v1"'}
+    assert cache.cached(first, '"v1"') == (True, {"results": []})
+    # Remplacée entre l'envoi et le 304 : pas de réponse à réutiliser
+    cache.store(first, '"v2"', {"results": [1]})
+    assert cache.cached(first, '"v1"') == (False, None)
+
+    cache.store(("GET", "/b", "null"), '"b"', 2)
+    cache.store(("GET", "/c", "null"), '"c"', 3)
+    assert cache.headers(first) == {}  # la plus ancienne est évincée
+    cache.store(("GET", "/d", "null"), None, 4)  # sans ETag : rien n'est gardé
+    assert cache.headers(("GET", "/d", "null")) == {}
+
+
+# ==================== MCPClient ====================
+
+def test_conditional_requests_reuse_the_cached_body(mcp_url):
+    with MCPClient(mcp_url) as client:
+        statuses = record_statuses(client)
+        tools = client.list_tools()
+        assert client.list_tools() == tools
+        documents = client.rag_search("absences")
+        assert client.rag_search("absences") == documents
+    assert statuses == [200, 304, 200, 304]
+    assert {tool["name"] for tool in tools} >= {"analyze_concentration", "predict_success"}
+
+
+def test_session_chat_and_pipeline(mcp_url):
+    with MCPClient(mcp_url) as client:
+        session_id = client.create_session()
+        first = client.chat([{"role": "user", "content": "Bonjour"}], session_id=session_id)
+        second = client.chat([{"role": "user", "content": "Encore"}], session_id=session_id)
+        assert first["session_id"] == second["session_id"] == session_id
+        results = client.batch([
+            {"tool_name": "analyze_concentration", "parameters": {"total_students": 30, "present_students": 25}},
+            {"tool_name": "inconnu", "parameters": {}},
+        ])
+    assert "result" in results[0]
+    assert results[1]["status_code"] == 400
+
+
+def test_non_idempotent_calls_are_not_resent(flaky_server):
+    url, hits = flaky_server
+    with MCPClient(url, max_retries=2, backoff_factor=0) as client:
+        with pytest.raises(requests.HTTPError):
+            client.chat([{"role": "user", "content": "Bonjour"}], session_id="s")
+        with pytest.raises(requests.HTTPError):
+            client.execute_tool("analyze_concentration", {})
+    assert hits["mcp/chat"] == 1
+    assert hits["mcp/tools"] == 3  # idempotent : 1 + max_retries
+
+
+def test_connection_errors_are_raised_after_the_retries():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    with MCPClient(f"http://127.0.0.1:{port}", max_retries=1, backoff_factor=0) as client:
+        with pytest.raises(requests.ConnectionError):
+            client.create_session()
+
+
+# ==================== AsyncMCPClient ====================
+
+def test_async_client_runs_calls_concurrently(mcp_url):
+    async def scenario():
+        async with AsyncMCPClient(mcp_url) as client:
+            tools, documents, answer = await asyncio.gather(
+                client.list_tools(),
+                client.rag_search("absences"),
+                client.chat([{"role": "user", "content": "Bonjour"}]),
+            )
+            # Deuxième lecture : 304, même contenu
+            assert await client.list_tools() == tools
+            return tools, documents, answer
+
+    tools, documents, answer = asyncio.run(scenario())
+    assert tools and documents and answer["response"]
+
+
+def test_async_client_retry_rules(flaky_server):
+    url, hits = flaky_server
+
+    async def scenario():
+        async with AsyncMCPClient(url, max_retries=2, backoff_factor=0) as client:
+            with pytest.raises(httpx.HTTPStatusError):
+                await client.create_session()
+            with pytest.raises(httpx.HTTPStatusError):
+                await client.rag_search("absences")
+
+    asyncio.run(scenario())
+    assert hits["mcp/sessions"] == 1
+    assert hits["mcp/rag"] == 3
+
+
+# ==================== STOCKAGE DES MESSAGES (ChatSession) ====================
+
+@pytest.fixture(scope="module")
+def tables():
+    with connection.schema_editor() as editor:
+        editor.create_model(ChatSession)
+        editor.create_model(ChatMessage)
+    yield
+    with connection.schema_editor() as editor:
+        editor.delete_model(ChatMessage)
+        editor.delete_model(ChatSession)
+
+
+@pytest.fixture
+def chat_session(tables):
+    session = ChatSession.objects.create(user_id=1)
+    yield session
+    session.delete()
+
+
+def conversation(count):
+    return [{"role": "user" if index % 2 == 0 else "assistant", "content": f"message {index}"}
+            for index in range(count)]
+
+
+def test_add_message_appends_one_row(chat_session):
+    for message in conversation(5):
+        chat_session.add_message(message["role"], message["content"])
+    assert chat_session.message_count == 5
+    assert ChatSession.objects.get(pk=chat_session.pk).message_count == 5
+    assert list(chat_session.chat_messages.values_list("seq", flat=True)) == [0, 1, 2, 3, 4]
+    assert chat_session.recent_messages() == conversation(5)
+    assert chat_session.recent_messages(limit=2) == conversation(5)[3:]
+    assert chat_session.messages_since(3) == conversation(5)[3:]
+
+
+def test_add_message_with_a_stale_count_retries(chat_session):
+    stale = ChatSession.objects.get(pk=chat_session.pk)
+    chat_session.add_message("user", "premier")
+    # stale croit encore que la session est vide : le seq 0 est pris, nouvel essai
+    stale.add_message("user", "second")
+    assert stale.message_count == 2
+    assert chat_session.messages_since(0) == [
+        {"role": "user", "content": "premier"}, {"role": "user", "content": "second"},
+    ]
+
+
+def test_add_message_updates_session_fields_in_the_same_write(chat_session):
+    chat_session.add_message("user", "Bonjour", mcp_session_id="abc", mcp_synced_count=1)
+    stored = ChatSession.objects.get(pk=chat_session.pk)
+    assert (stored.mcp_session_id, stored.mcp_synced_count, stored.message_count) == ("abc", 1, 1)
+
+
+def test_migrate_json_sessions_is_idempotent(tables):
+    legacy = ChatSession.objects.create(user_id=2, messages=conversation(3))
+    empty = ChatSession.objects.create(user_id=3)
+    try:
+        assert migrate_json_sessions() == 1
+        assert migrate_json_sessions() == 0
+        legacy.refresh_from_db()
+        assert legacy.messages == [] and legacy.message_count == 3
+        assert legacy.recent_messages() == conversation(3)
+        assert empty.chat_messages.count() == 0
+    finally:
+        legacy.delete()
+        empty.delete()
+
+
+def test_get_mcp_response_sends_only_new_messages(chat_session, mcp_url, monkeypatch):
+    client = MCPClient(mcp_url)
+    monkeypatch.setattr(client_module, "mcp_client", client)
+    try:
+        chat_session.add_message("user", "Bonjour")
+        assert not chat_session.get_mcp_response().startswith("Erreur")
+        chat_session.add_message("user", "Encore")
+        assert not chat_session.get_mcp_response().startswith("Erreur")
+
+        # Le serveur a reçu chaque message une seule fois, réponses comprises
+        server_session = main.session_store.get(chat_session.mcp_session_id)
+        assert server_session.to_dict()["message_count"] == chat_session.message_count == 4
+        assert chat_session.mcp_synced_count == 4
+
+        # Session expirée côté serveur : recréée avec tout l'historique
+        main.session_store.delete(chat_session.mcp_session_id)
+        chat_session.add_message("user", "Toujours là ?")
+        assert not chat_session.get_mcp_response().startswith("Erreur")
+        assert main.session_store.get(chat_session.mcp_session_id).to_dict()["message_count"] == 6
+        stored = ChatSession.objects.get(pk=chat_session.pk)
+        assert (stored.message_count, stored.mcp_synced_count) == (6, 6)
+    finally:
+        client.close()
@@ -0,0 +1,70 @@
+"""
+Tests des requêtes conditionnelles (ETag / If-None-Match) du serveur MCP.
+
+Lancement : python -m pytest test_etag.py
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+# Base étudiants jetable : main.py l'ouvre à l'import
+os.environ.setdefault("MCP_STUDENT_DB", os.path.join(tempfile.mkdtemp(), "students.sqlite3"))
+
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+@pytest.mark.parametrize("path", ["/", "/mcp/tools/list"])
+def test_get_revalidation(client, path):
+    response = client.get(path)
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == "no-cache"
+
+    response = client.get(path, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+    assert client.get(path, headers={"If-None-Match": '"autre"'}).status_code == 200
+    assert client.get(path, headers={"If-None-Match": "*"}).status_code == 304
+
+
+def test_weak_form_of_the_etag_matches(client):
+    # Une réponse compressée porte W/"..." : le client renvoie cette forme et doit obtenir 304
+    etag = client.get("/mcp/tools/list").headers["etag"]
+    response = client.get("/mcp/tools/list", headers={"If-None-Match": f'"autre", W/{etag}'})
+    assert response.status_code == 304
+
+
+def test_rag_etag_depends_on_the_query(client):
+    first = client.post("/mcp/rag", json={"query": "absences"})
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert etag.startswith("W/")  # le timestamp du corps change, pas les résultats
+
+    again = client.post("/mcp/rag", json={"query": "absences"}, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+
+    other = client.post("/mcp/rag", json={"query": "examens"}, headers={"If-None-Match": etag})
+    assert other.status_code == 200
+    assert other.headers["etag"] != etag
+
+    fewer = client.post("/mcp/rag", json={"query": "absences", "max_results": 1}, headers={"If-None-Match": etag})
+    assert fewer.status_code == 200
+
+
+def test_make_etag_is_stable_and_content_based():
+    assert main.make_etag({"a": 1, "b": [1, 2]}) == main.make_etag({"b": [1, 2], "a": 1})
+    assert main.make_etag({"a": 1}) != main.make_etag({"a": 2})
+    assert main.make_etag("x", weak=True) == "W/" + main.make_etag("x")
@@ -0,0 +1,78 @@
+"""
+Tests de tool_registry.py : délai et limite de concurrence des outils.
+
+Lancement : python -m pytest test_tool_registry.py
+"""
+
+import asyncio
+import os
+import sys
+import threading
+from typing import Any, Dict
+
+import pytest
+from pydantic import BaseModel
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from tool_registry import ToolRegistry, ToolTimeoutError
+
+
+class NoParams(BaseModel):
+    pass
+
+
+def test_timed_out_tool_keeps_its_slot_until_it_finishes():
+    registry = ToolRegistry(thread_workers=4)
+    release = threading.Event()
+    running = []
+
+    @registry.tool(name="slow", description="", parameters=NoParams,
+                   executor="thread", max_concurrency=1, timeout=0.05)
+    def slow(data: Dict[str, Any]) -> str:
+        running.append(1)
+        release.wait(5)
+        return "done"
+
+    async def scenario():
+        with pytest.raises(ToolTimeoutError):
+            await registry.execute("slow", {})
+        # The first call still runs: the second one must not start alongside it
+        with pytest.raises(ToolTimeoutError):
+            await registry.execute("slow", {})
+        assert len(running) == 1
+
+        release.set()
+        await asyncio.sleep(0.1)  # the first call ends and gives its slot back
+        release.clear()
+        with pytest.raises(ToolTimeoutError):
+            await registry.execute("slow", {})
+        assert len(running) == 2
+        release.set()
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+        registry.shutdown()
+
+
+def test_thread_tool_result():
+    registry = ToolRegistry()
+
+    @registry.tool(name="double", description="", parameters=NoParams, executor="thread")
+    def double(data: Dict[str, Any]) -> int:
+        return 21 * 2
+
+    try:
+        assert asyncio.run(registry.execute("double", {})) == 42
+        assert registry.get("double").timeout == 10.0
+    finally:
+        registry.shutdown()
+
+
+def test_inline_tools_reject_limits():
+    registry = ToolRegistry()
+    with pytest.raises(ValueError):
+        registry.tool(name="fast", description="", parameters=NoParams, timeout=1.0)
+    with pytest.raises(ValueError):
+        registry.tool(name="fast", description="", parameters=NoParams, max_concurrency=2)
@@ -0,0 +1,210 @@
+"""
+Registre des outils MCP.
+
+Chaque outil déclare un schéma de paramètres pydantic (compilé une seule fois
+à la définition de la classe), le mode d'exécution (inline sur la boucle
+d'événements, pool de threads ou pool de processus), sa limite de
+concurrence et son délai maximal. /mcp/tools/list est généré à partir du
+registre.
+
+Les outils inline s'exécutent directement sur la boucle d'événements : ils
+n'ont ni limite de concurrence ni délai (refusés à l'enregistrement) et sont
+réservés aux calculs très courts.
+"""
+
+import asyncio
+import os
+import typing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Type
+
+from pydantic import BaseModel
+
+TOOL_THREAD_WORKERS = int(os.environ.get("MCP_TOOL_THREAD_WORKERS", "4"))
+TOOL_PROCESS_WORKERS = int(os.environ.get("MCP_TOOL_PROCESS_WORKERS", "2"))
+TOOL_DEFAULT_MAX_CONCURRENCY = 8
+TOOL_DEFAULT_TIMEOUT = 10.0
+
+EXECUTOR_INLINE = "inline"
+EXECUTOR_THREAD = "thread"
+EXECUTOR_PROCESS = "process"
+EXECUTORS = (EXECUTOR_INLINE, EXECUTOR_THREAD, EXECUTOR_PROCESS)
+
+
+class UnknownToolError(KeyError):
+    """L'outil demandé n'est pas enregistré"""
+
+
+class ToolTimeoutError(TimeoutError):
+    """L'outil a dépassé son délai maximal"""
+
+
+@dataclass
+class ToolSpec:
+    name: str
+    description: str
+    func: Callable[[Dict[str, Any]], Any]
+    parameters: Type[BaseModel]
+    executor: str = EXECUTOR_INLINE
+    max_concurrency: Optional[int] = None  # None : outil inline, sans limite
+    timeout: Optional[float] = None  # None : outil inline, sans délai
+    _semaphore: Optional[asyncio.Semaphore] = field(default=None, repr=False)
+
+    def semaphore(self) -> asyncio.Semaphore:
+        # Créé à la première utilisation, dans la boucle d'événements du serveur
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "description": self.description,
+            "parameters": {
+                name: _describe_field(info)
+                for name, info in self.parameters.model_fields.items()
+            },
+            "executor": self.executor,
+            "max_concurrency": self.max_concurrency,
+            "timeout": self.timeout,
+        }
+
+
+def _type_label(annotation: Any) -> str:
+    origin = typing.get_origin(annotation)
+    if origin is None:
+        return getattr(annotation, "__name__", str(annotation))
+    args = ", ".join(_type_label(arg) for arg in typing.get_args(annotation))
+    return f"{getattr(origin, '__name__', str(origin))}[{args}]"
+
+
+def _describe_field(info) -> str:
+    """Description lisible d'un paramètre, ex: "int (requis)" ou "int (minutes)" """
+    label = _type_label(info.annotation)
+    notes = [note for note in ("requis" if info.is_required() else None, info.description) if note]
+    return f"{label} ({', '.join(notes)})" if notes else label
+
+
+def _release_from_any_thread(loop: asyncio.AbstractEventLoop, semaphore: asyncio.Semaphore):
+    """Rend un créneau depuis le thread qui termine le future (le sémaphore appartient à la boucle)"""
+    try:
+        loop.call_soon_threadsafe(semaphore.release)
+    except RuntimeError:
+        pass  # boucle fermée (arrêt du serveur)
+
+
+class ToolRegistry:
+    """Registre des outils et de leurs exécuteurs"""
+
+    def __init__(self, thread_workers: int = TOOL_THREAD_WORKERS,
+                 process_workers: int = TOOL_PROCESS_WORKERS):
+        self._tools: Dict[str, ToolSpec] = {}
+        self._thread_workers = thread_workers
+        self._process_workers = process_workers
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+
+    def tool(self, name: str, description: str, parameters: Type[BaseModel],
+             executor: str = EXECUTOR_INLINE, max_concurrency: Optional[int] = None,
+             timeout: Optional[float] = None):
+        """
+        Décorateur d'enregistrement d'un outil.
+        La fonction reçoit les paramètres validés sous forme de dict ; elle doit
+        être définie au niveau module pour pouvoir s'exécuter dans un processus.
+        max_concurrency et timeout (par défaut 8 et 10 s) ne s'appliquent qu'aux
+        exécuteurs thread et process.
+        """
+        if executor not in EXECUTORS:
+            raise ValueError(f"Exécuteur '{executor}' invalide. Valeurs possibles: {', '.join(EXECUTORS)}")
+        if executor == EXECUTOR_INLINE:
+            if max_concurrency is not None or timeout is not None:
+                raise ValueError(
+                    f"Outil '{name}' : max_concurrency et timeout ne s'appliquent pas aux outils inline "
+                    "(exécutés sur la boucle d'événements), utiliser executor='thread'"
+                )
+        else:
+            max_concurrency = max_concurrency or TOOL_DEFAULT_MAX_CONCURRENCY
+            timeout = TOOL_DEFAULT_TIMEOUT if timeout is None else timeout
+
+        def decorator(func):
+            if name in self._tools:
+                raise ValueError(f"Outil '{name}' déjà enregistré")
+            self._tools[name] = ToolSpec(
+                name=name,
+                description=description,
+                func=func,
+                parameters=parameters,
+                executor=executor,
+                max_concurrency=max_concurrency,
+                timeout=timeout,
+            )
+            return func
+        return decorator
+
+    def get(self, name: str) -> ToolSpec:
+        spec = self._tools.get(name)
+        if spec is None:
+            raise UnknownToolError(
+                f"Outil '{name}' non reconnu. Outils disponibles: {', '.join(self._tools)}"
+            )
+        return spec
+
+    def names(self) -> List[str]:
+        return list(self._tools)
+
+    def describe(self) -> List[Dict[str, Any]]:
+        return [spec.describe() for spec in self._tools.values()]
+
+    async def execute(self, name: str, parameters: Dict[str, Any]) -> Any:
+        """
+        Valide les paramètres puis exécute l'outil avec son exécuteur.
+        Lève UnknownToolError, ValueError (paramètres invalides) ou ToolTimeoutError.
+        """
+        spec = self.get(name)
+        # pydantic.ValidationError hérite de ValueError
+        params = spec.parameters.model_validate(parameters).model_dump()
+
+        if spec.executor == EXECUTOR_INLINE:
+            # Exécuté directement sur la boucle : réservé aux outils très rapides
+            return spec.func(params)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + spec.timeout
+        semaphore = spec.semaphore()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=spec.timeout)
+        except asyncio.TimeoutError:
+            raise ToolTimeoutError(f"Outil '{name}' interrompu après {spec.timeout}s")
+        try:
+            future = self._executor_for(spec).submit(spec.func, params)
+        except BaseException:
+            semaphore.release()
+            raise
+        # Le créneau n'est rendu qu'à la fin réelle de l'exécution : un outil
+        # interrompu par le délai continue de tourner dans son thread / processus
+        future.add_done_callback(lambda _: _release_from_any_thread(loop, semaphore))
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=max(deadline - loop.time(), 0))
+        except asyncio.TimeoutError:
+            raise ToolTimeoutError(f"Outil '{name}' interrompu après {spec.timeout}s")
+
+    def _executor_for(self, spec: ToolSpec) -> Executor:
+        if spec.executor == EXECUTOR_PROCESS:
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(max_workers=self._process_workers)
+            return self._process_pool
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(
+                max_workers=self._thread_workers, thread_name_prefix="mcp-tool"
+            )
+        return self._thread_pool
+
+    def shutdown(self):
+        if self._thread_pool is not None:
+            self._thread_pool.shutdown(wait=False)
+            self._thread_pool = None
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False)
+            self._process_pool = None
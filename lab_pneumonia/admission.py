@@ -0,0 +1,191 @@
+"""
+Admission control for the inference routes.
+
+Each model gets an AdmissionController with a bounded number of in-flight
+inferences and a bounded FIFO queue. Requests beyond the queue are rejected
+immediately with 429; requests that wait longer than max_wait are dropped
+before inference with 503. Both carry a Retry-After computed from the
+backlog and the measured service time, so latency stays bounded under
+overload instead of growing with the queue.
+
+Usage:
+    admission = AdmissionController.from_env("PNEUMONIA")
+
+    try:
+        async with admission.admit() as queue_wait_ms:
+            result = await run_in_threadpool(infer, data)
+    except AdmissionRejected as e:
+        raise HTTPException(e.status_code, detail=str(e), headers=e.headers)
+"""
+
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+# Weight of the latest inference in the service time moving average
+EWMA_ALPHA = 0.2
+
+
+class AdmissionRejected(Exception):
+    """Request refused by admission control (queue full or waited too long)."""
+
+    def __init__(self, message, status_code, retry_after):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @property
+    def headers(self):
+        return {"Retry-After": str(self.retry_after)}
+
+
+class AdmissionController:
+    """
+    Bounded in-flight limit and waiting queue for one model.
+
+    Parameters:
+        name (str): Model name used in error messages
+        max_in_flight (int): Concurrent inferences allowed
+        max_queue (int): Requests allowed to wait for a slot
+        max_wait (float): Seconds a request may wait before being dropped
+        service_time (float): Initial estimate of one inference, in seconds
+    """
+
+    def __init__(self, name, max_in_flight=1, max_queue=8, max_wait=2.0, service_time=0.2):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.service_time = service_time
+        self._in_flight = 0
+        self._waiters = deque()
+        self._backlog_units = 0  # Inferences held or awaited by admitted and queued requests
+        self._admitted = 0
+        self._rejected = 0
+        self._expired = 0
+        self._total_wait = 0.0
+
+    @classmethod
+    def from_env(cls, prefix, **defaults):
+        """Read <PREFIX>_MAX_IN_FLIGHT, <PREFIX>_MAX_QUEUE and <PREFIX>_MAX_WAIT."""
+        def setting(key, cast):
+            value = os.environ.get(f"{prefix}_{key.upper()}")
+            return cast(value) if value is not None else defaults.get(key)
+
+        kwargs = {
+            "max_in_flight": setting("max_in_flight", int),
+            "max_queue": setting("max_queue", int),
+            "max_wait": setting("max_wait", float),
+        }
+        return cls(prefix.lower(), **{k: v for k, v in kwargs.items() if v is not None})
+
+    def retry_after(self):
+        """Seconds until the current backlog should have drained."""
+        # Counted in inferences, not requests: a queued batch of 32 takes 32 service times
+        return max(1, math.ceil(self._backlog_units / self.max_in_flight * self.service_time))
+
+    async def acquire(self, units=1):
+        """
+        Wait for an inference slot.
+
+        Parameters:
+            units (int): Inferences the request will run while holding the slot
+
+        Returns:
+            float: Time spent in the queue, in milliseconds
+
+        Raises:
+            AdmissionRejected: 429 if the queue is full, 503 if max_wait expired
+        """
+        if self._in_flight < self.max_in_flight and not self._waiters:
+            self._in_flight += 1
+            self._backlog_units += units
+            self._admitted += 1
+            return 0.0
+
+        if len(self._waiters) >= self.max_queue:
+            self._rejected += 1
+            raise AdmissionRejected(
+                f"{self.name} model overloaded: {len(self._waiters)} requests queued",
+                429, self.retry_after(),
+            )
+
+        start = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._backlog_units += units
+        try:
+            await asyncio.wait_for(waiter, self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            self._backlog_units -= units
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the wait ended: pass it on
+                self._release()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._expired += 1
+            raise AdmissionRejected(
+                f"{self.name} model busy: request waited more than {self.max_wait:g}s",
+                503, self.retry_after(),
+            )
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+        wait = time.monotonic() - start
+        self._admitted += 1
+        self._total_wait += wait
+        return wait * 1000
+
+    def _release(self):
+        # Hand the slot to the oldest waiter still waiting (expired ones are skipped)
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self._in_flight -= 1
+
+    def _observe(self, duration):
+        self.service_time += EWMA_ALPHA * (duration - self.service_time)
+
+    @asynccontextmanager
+    async def admit(self, units=1):
+        """
+        Hold an inference slot for the duration of the block (yields queue wait in ms).
+
+        units is the number of inferences done in the block (batch size). The
+        block still holds a single slot, but the service time is measured per
+        inference and Retry-After counts the batch as units inferences.
+        """
+        units = max(units, 1)
+        queue_wait_ms = await self.acquire(units)
+        start = time.monotonic()
+        completed = False
+        try:
+            yield queue_wait_ms
+            completed = True
+        finally:
+            # Failed requests (bad input) do not count towards the service time
+            if completed:
+                self._observe((time.monotonic() - start) / units)
+            self._backlog_units -= units
+            self._release()
+
+    def stats(self):
+        return {
+            "in_flight": self._in_flight,
+            "queued": len(self._waiters),
+            "backlog_units": self._backlog_units,
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "max_wait_s": self.max_wait,
+            "admitted": self._admitted,
+            "rejected": self._rejected,
+            "expired": self._expired,
+            "avg_queue_wait_ms": round(self._total_wait / self._admitted * 1000, 2) if self._admitted else 0.0,
+            "service_time_ms": round(self.service_time * 1000, 2),
+        }
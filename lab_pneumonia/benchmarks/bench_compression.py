@@ -0,0 +1,80 @@
+"""
+Benchmark of response compression: CPU cost against bytes saved.
+
+For each endpoint payload (same shapes as bench_json.py) and each available
+encoding/level, reports the compressed size, the compression time and the
+transfer time saved on a slow mobile link. Compression pays off when the
+transfer time saved is larger than the CPU time spent.
+
+Usage:
+    python benchmarks/bench_compression.py [--repeat 20] [--link-kbps 1000]
+"""
+
+import argparse
+import base64
+import io
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import fast_json
+from compression import AVAILABLE_ENCODINGS, compress
+from bench_json import build_payloads
+
+LEVELS = {
+    "gzip": (1, 6, 9),
+    "br": (1, 4, 8),
+    "zstd": (1, 3, 9),
+}
+
+
+def _xray_like_png(size=512):
+    """Smooth grayscale image saved as PNG, closer to a real X-ray than random bytes."""
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:size, 0:size]
+    pixels = 128 + 60 * np.sin(x / 40.0) * np.cos(y / 55.0) + rng.normal(0, 12, (size, size))
+    image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20, help="compressions per measurement")
+    parser.add_argument("--link-kbps", type=float, default=1000.0, help="client bandwidth (default: 1 Mbit/s)")
+    args = parser.parse_args()
+
+    payloads = build_payloads()
+    try:
+        flask_payload = payloads["Flask POST /predict (base64 image)"]
+        flask_payload["image"] = base64.b64encode(_xray_like_png()).decode()
+    except ImportError:
+        pass  # Pillow missing: keep the random-bytes image
+
+    bytes_per_ms = args.link_kbps * 1000 / 8 / 1000
+    print(f"encodings: {', '.join(AVAILABLE_ENCODINGS)}  link: {args.link_kbps:.0f} kbit/s")
+    print(f"{'endpoint':45s} {'codec':>8s} {'size':>10s} {'ratio':>7s} {'cpu ms':>8s} {'saved ms':>9s}")
+
+    for name, payload in payloads.items():
+        body = fast_json.dumps(payload)
+        print(f"{name:45s} {'identity':>8s} {len(body):>10d} {1.0:>7.2f} {0.0:>8.3f} {0.0:>9.1f}")
+        for encoding in AVAILABLE_ENCODINGS:
+            for level in LEVELS[encoding]:
+                compressed = compress(body, encoding, level)
+                cpu = min(timeit.repeat(lambda: compress(body, encoding, level),
+                                        number=args.repeat, repeat=3)) / args.repeat
+                saved = (len(body) - len(compressed)) / bytes_per_ms
+                codec = f"{encoding}-{level}"
+                print(f"{'':45s} {codec:>8s} {len(compressed):>10d} "
+                      f"{len(body) / len(compressed):>7.2f} {cpu * 1000:>8.3f} {saved:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
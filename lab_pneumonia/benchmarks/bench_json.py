@@ -0,0 +1,141 @@
+"""
+Benchmark of JSON encoding time per endpoint payload.
+
+Compares the standard library encoder (as used by FastAPI's JSONResponse and
+Flask's jsonify) with the shared fast serializer in fast_json.py on payloads
+shaped like the real responses.
+
+The "fast ms" column is what an endpoint pays when it returns a
+FastJSONResponse explicitly. The "default ms" column is the path taken when
+FastJSONResponse is only the default_response_class: FastAPI runs
+jsonable_encoder on the returned value before render, which costs more than
+the encoding itself and rejects NumPy values ("n/a").
+
+Usage:
+    python benchmarks/bench_json.py [--repeat 200]
+"""
+
+import argparse
+import base64
+import json
+import os
+import random
+import sys
+import timeit
+from datetime import datetime
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fast_json
+
+
+def _prediction(i):
+    return {
+        "filename": f"xray_{i:05d}.jpeg",
+        "success": True,
+        "prediction": random.choice(["PNEUMONIA", "NORMAL"]),
+        "confidence": round(random.random(), 4),
+        "confidence_percentage": round(random.random() * 100, 2),
+    }
+
+
+def build_payloads():
+    """Representative response bodies keyed by endpoint."""
+    random.seed(0)
+    image_bytes = os.urandom(150 * 1024)  # ~150 KB PNG in the Flask response
+    cohort = [
+        {
+            "index": i,
+            "success_score": 65.0,
+            "probability": "Élevée",
+            "absence_rate": round(random.random() * 30, 2),
+            "current_average": round(random.uniform(8, 18), 2),
+            "trend": round(random.uniform(-3, 3), 2),
+            "analysis": {
+                "absences": random.randint(0, 10),
+                "total_sessions": 40,
+                "grades": [round(random.uniform(0, 20), 1) for _ in range(8)],
+                "trend_direction": "stable",
+            },
+        }
+        for i in range(5000)
+    ]
+    return {
+        "POST /predict": _prediction(0),
+        "POST /predict/batch (200 files)": {
+            "success": True,
+            "total_files": 200,
+            "results": [_prediction(i) for i in range(200)],
+        },
+        "POST /fruits/predict": {**_prediction(0), "prediction": "apple"},
+        "Flask POST /predict (base64 image)": {
+            **_prediction(0),
+            "image": base64.b64encode(image_bytes).decode(),
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        },
+        "MCP POST /mcp/tools/batch (5000 students)": {
+            "results": cohort,
+            "tool_name": "predict_success",
+            "count": len(cohort),
+            "error_count": 0,
+            "timestamp": datetime.now().isoformat(),
+        },
+        "MCP POST /mcp/rag": {
+            "results": [
+                {"title": "Politique d'absences", "content": "Les étudiants ne peuvent pas dépasser 30% d'absences par module.", "category": "academic"}
+            ] * 3,
+            "query": "absences",
+            "timestamp": datetime.now().isoformat(),
+        },
+    }
+
+
+def _stdlib(content):
+    # Same settings as starlette.responses.JSONResponse
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def _default_class(content):
+    # FastAPI's serialize_response for a route returning a plain dict
+    return fast_json.dumps(jsonable_encoder(content))
+
+
+def _time(function, payload, repeat):
+    try:
+        function(payload)
+    except (TypeError, ValueError):
+        return None
+    return min(timeit.repeat(lambda: function(payload), number=repeat, repeat=3)) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200, help="encodes per measurement")
+    args = parser.parse_args()
+
+    print(f"fast_json backend: {fast_json.BACKEND}")
+    print(f"{'endpoint':45s} {'size':>10s} {'json ms':>10s} {'default ms':>11s} {'fast ms':>10s} {'speedup':>8s}")
+
+    rows = [(name, payload, _stdlib) for name, payload in build_payloads().items()]
+
+    # NumPy outputs: the standard encoder needs .tolist() first
+    probabilities = np.random.rand(1000, 3).astype(np.float32)
+    rows.append((
+        "NumPy probabilities (1000x3 float32)",
+        {"probabilities": probabilities},
+        lambda content: _stdlib({"probabilities": content["probabilities"].tolist()}),
+    ))
+
+    for name, payload, baseline in rows:
+        size = len(fast_json.dumps(payload))
+        slow = _time(baseline, payload, args.repeat)
+        default = _time(_default_class, payload, args.repeat)
+        fast = _time(fast_json.dumps, payload, args.repeat)
+        default_ms = f"{default * 1000:.3f}" if default is not None else "n/a"
+        print(f"{name:45s} {size:>10d} {slow * 1000:>10.3f} {default_ms:>11s} {fast * 1000:>10.3f} {slow / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
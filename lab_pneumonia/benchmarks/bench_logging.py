@@ -0,0 +1,66 @@
+"""
+Benchmark of the cost of logging on the request path.
+
+Compares, per log call made by a handler: logging disabled, the queue-based
+JSON pipeline of structured_logging.py (with and without sampling), and a
+synchronous print to the output stream (the previous behaviour). Output
+goes to os.devnull, so the numbers are the CPU cost seen by the caller;
+with a real terminal or pipe the synchronous print also blocks on I/O.
+
+Usage:
+    python benchmarks/bench_logging.py [--calls 20000]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import structured_logging
+from structured_logging import setup_logging, set_log_config, shutdown_logging
+
+ROUTE = "/fruits/predict"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=20000, help="log calls per measurement")
+    args = parser.parse_args()
+
+    devnull = open(os.devnull, "w")
+    logger = logging.getLogger(f"{structured_logging.ROOT_LOGGER}.bench")
+    setup_logging(level="INFO", sample_rates={}, stream=devnull)
+
+    def log_call():
+        logger.info("Fruits prediction", extra={
+            "route": ROUTE,
+            "fields": {"prediction": "apple", "confidence": 0.9993},
+        })
+
+    def print_call():
+        print(f"Fruits prediction: apple ({0.9993 * 100:.2f}%)", file=devnull, flush=True)
+
+    cases = [
+        ("disabled (level WARNING)", lambda: set_log_config("WARNING", {}), log_call),
+        ("queue + JSON, all records", lambda: set_log_config("INFO", {}), log_call),
+        ("queue + JSON, 10% sampled", lambda: set_log_config("INFO", {ROUTE: 0.1}), log_call),
+        ("synchronous print", lambda: None, print_call),
+    ]
+    print(f"{'case':30s} {'us/call':>10s}")
+    for name, configure, call in cases:
+        configure()
+        per_call = min(timeit.repeat(call, number=args.calls, repeat=3)) / args.calls
+        # Let the listener drain the queue so it does not slow down the next case
+        while structured_logging.get_log_config()["queued"]:
+            time.sleep(0.01)
+        print(f"{name:30s} {per_call * 1e6:>10.2f}")
+
+    shutdown_logging()
+    devnull.close()
+
+
+if __name__ == "__main__":
+    main()
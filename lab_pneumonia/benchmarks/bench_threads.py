@@ -0,0 +1,182 @@
+"""
+Sweep of inference worker processes x threads per process.
+
+For every combination, starts `workers` processes configured like the
+servers (INFERENCE_WORKERS, INFERENCE_THREADS and optionally CPU_PINNING,
+see runtime_config.py). TFLite models use the servers' interpreter pool:
+TFLITE_POOL_SIZE and TFLITE_NUM_THREADS are derived from the thread budget
+unless set in the environment, and each process runs one prediction
+stream per pooled interpreter, like concurrent requests. Each process
+loads the model, waits until all of them are ready, then predicts for
+--seconds. The report gives the total throughput and the latency of each combination;
+combinations using more threads than cores show the cost of
+oversubscription.
+
+Usage:
+    python benchmarks/bench_threads.py [--model model.tflite] [--seconds 10] [--pin]
+    python benchmarks/bench_threads.py --workers 1,2,4 --threads 1,2,4,8
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+LAB_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(LAB_DIR)
+
+BUNDLED_TFLITE = os.path.join(os.path.dirname(LAB_DIR), "appcontrole", "assets", "model", "pneumonia_classifier.tflite")
+
+
+def run_child(model_path, seconds, batch_size):
+    """One worker process: load, signal ready, wait for go, predict for `seconds`."""
+    import runtime_config
+    from shared_utils import load_pneumonia_version, PNEUMONIA_INPUT_SPEC
+
+    config = runtime_config.apply()
+    model = load_pneumonia_version(model_path)
+    data = np.random.default_rng(os.getpid()).uniform(
+        -1, 1, (batch_size, *PNEUMONIA_INPUT_SPEC["input_shape"])
+    ).astype(np.float32)
+    model.predict(data, verbose=0)  # warm-up
+    # As many concurrent streams as the server can serve (InterpreterPool.size)
+    streams = getattr(model, "size", 1)
+
+    print("ready", flush=True)
+    sys.stdin.readline()
+
+    latencies = [[] for _ in range(streams)]
+    deadline = time.perf_counter() + seconds
+
+    def stream(out):
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            model.predict(data, verbose=0)
+            out.append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=stream, args=(out,)) for out in latencies]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies = [latency for out in latencies for latency in out]
+    print(json.dumps({"images": len(latencies) * batch_size, "latencies_ms": latencies,
+                      "config": config, "streams": streams}), flush=True)
+
+
+def run_combination(workers, threads, args):
+    env = {
+        **os.environ,
+        "INFERENCE_WORKERS": str(workers),
+        "INFERENCE_THREADS": str(threads),
+        "CPU_PINNING": "1" if args.pin else "0",
+    }
+    for name in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+                 "TF_NUM_INTRAOP_THREADS", "TF_NUM_INTEROP_THREADS"):
+        env.pop(name, None)  # let runtime_config derive them
+    command = [sys.executable, os.path.abspath(__file__), "--child", args.model,
+               "--seconds", str(args.seconds), "--batch-size", str(args.batch_size)]
+    children = [
+        subprocess.Popen(command, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                         stderr=subprocess.DEVNULL, text=True)
+        for _ in range(workers)
+    ]
+    try:
+        for child in children:
+            if child.stdout.readline().strip() != "ready":
+                raise RuntimeError("worker failed to start")
+        for child in children:
+            child.stdin.write("go\n")
+            child.stdin.flush()
+        results = [json.loads(child.stdout.readline()) for child in children]
+    finally:
+        for child in children:
+            child.stdin.close()
+            try:
+                child.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                child.kill()
+                child.wait()
+
+    latencies = np.concatenate([result["latencies_ms"] for result in results])
+    return {
+        "workers": workers,
+        "threads": threads,
+        "pinned": all(result["config"]["pinned"] for result in results),
+        "streams": results[0]["streams"],
+        "throughput_img_s": round(sum(result["images"] for result in results) / args.seconds, 1),
+        "latency_ms": {
+            "p50": round(float(np.percentile(latencies, 50)), 2),
+            "p95": round(float(np.percentile(latencies, 95)), 2),
+        },
+    }
+
+
+def parse_list(value):
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def powers_of_two(limit):
+    values, value = [], 1
+    while value <= limit:
+        values.append(value)
+        value *= 2
+    return values
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=BUNDLED_TFLITE, help="model file (.tflite or .h5)")
+    parser.add_argument("--workers", type=parse_list, default=None, help="worker counts (default: powers of two)")
+    parser.add_argument("--threads", type=parse_list, default=None, help="threads per worker (default: powers of two)")
+    parser.add_argument("--seconds", type=float, default=10.0, help="measurement time per combination")
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--pin", action="store_true", help="pin workers to disjoint cores (Linux)")
+    parser.add_argument("--oversubscribe", type=float, default=2.0,
+                        help="skip combinations using more than this many threads per core")
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON")
+    parser.add_argument("--child", metavar="MODEL", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.seconds, args.batch_size)
+        return
+
+    import runtime_config
+
+    cores = len(runtime_config.core_groups())
+    workers_list = args.workers or powers_of_two(cores)
+    threads_list = args.threads or powers_of_two(cores)
+    print(f"{cores} physical cores, {len(runtime_config.available_cpus())} logical CPUs, model {args.model}")
+    print(f"{'workers':>8s} {'threads':>8s} {'pinned':>7s} {'img/s':>9s} {'p50 ms':>8s} {'p95 ms':>8s}")
+
+    results = []
+    for workers in workers_list:
+        for threads in threads_list:
+            if workers * threads > cores * args.oversubscribe:
+                continue
+            try:
+                result = run_combination(workers, threads, args)
+            except RuntimeError as e:
+                print(f"{workers:>8d} {threads:>8d} error: {e}")
+                continue
+            results.append(result)
+            print(f"{workers:>8d} {threads:>8d} {str(result['pinned']):>7s} {result['throughput_img_s']:>9.1f} "
+                  f"{result['latency_ms']['p50']:>8.2f} {result['latency_ms']['p95']:>8.2f}")
+
+    if results:
+        best = max(results, key=lambda result: result["throughput_img_s"])
+        print(f"\nBest throughput: INFERENCE_WORKERS={best['workers']} INFERENCE_THREADS={best['threads']}"
+              f"{' CPU_PINNING=1' if best['pinned'] else ''} ({best['throughput_img_s']} img/s)")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"cores": cores, "model": args.model, "seconds": args.seconds, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
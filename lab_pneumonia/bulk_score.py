@@ -0,0 +1,349 @@
+"""
+Offline bulk scoring of a directory of chest X-rays.
+
+Walks a directory tree, decodes images in parallel threads with a bounded
+prefetch, runs the model on batches and appends the results to a CSV,
+JSONL or Parquet output as it goes. Preprocessing (fit_image +
+normalization) and the PNEUMONIA threshold are the ones of the servers, so
+the results match /predict.
+
+The run can be interrupted and started again with the same command: images
+already scored are skipped. Images whose row has an error (unreadable file)
+are retried; the new row is appended after the old one, so readers should
+keep the last row of each path. A tensor store built by tensor_cache.py
+can be given instead of an image directory to skip decoding entirely.
+
+Usage:
+    python bulk_score.py chest_xray/test results.csv
+    python bulk_score.py chest_xray/ results.jsonl --batch-size 64 --workers 8
+    python bulk_score.py chest_xray/ results.parquet --model model.tflite
+    python bulk_score.py cache/test results.csv          # tensor_cache.py store
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from shared_utils import (
+    fit_image, normalize_into, get_buffer_pool, pneumonia_indices,
+    load_pneumonia_version, load_class_names, default_pneumonia_model_path,
+    IMAGE_EXTENSIONS, PNEUMONIA_INPUT_SPEC
+)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional, only for .parquet outputs
+    pa = pq = None
+
+FIELDS = ["path", "prediction", "confidence", "pneumonia_probability", "error"]
+
+
+# ==================== Outputs ====================
+
+class CSVWriter:
+    def __init__(self, path):
+        _truncate_partial_line(path)
+        is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "a", newline="")
+        self.writer = csv.DictWriter(self.file, fieldnames=FIELDS)
+        if is_new:
+            self.writer.writeheader()
+
+    @staticmethod
+    def done_paths(path):
+        if not os.path.exists(path):
+            return set()
+        with open(path, newline="") as f:
+            # A short row (cut by an interrupted run) has missing fields: not done.
+            # Rows are read in order so that a later successful retry wins over an error.
+            done = set()
+            for row in csv.DictReader(f):
+                if not row.get("path") or None in row.values():
+                    continue
+                if row["error"]:
+                    done.discard(row["path"])
+                else:
+                    done.add(row["path"])
+            return done
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class JSONLWriter:
+    def __init__(self, path):
+        _truncate_partial_line(path)
+        self.file = open(path, "a")
+
+    @staticmethod
+    def done_paths(path):
+        if not os.path.exists(path):
+            return set()
+        done = set()
+        with open(path) as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                    path = row["path"]
+                except (ValueError, KeyError):
+                    continue  # partial last line of an interrupted run
+                if row.get("error"):
+                    done.discard(path)
+                else:
+                    done.add(path)
+        return done
+
+    def write(self, rows):
+        self.file.writelines(json.dumps(row) + "\n" for row in rows)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    """
+    Parquet dataset directory: one part file per rows_per_file results, so
+    that every completed part stays readable if the run is interrupted.
+    """
+
+    def __init__(self, path, rows_per_file=4096):
+        if pq is None:
+            raise ImportError("pyarrow is required for Parquet output (pip install pyarrow)")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.rows_per_file = rows_per_file
+        self.pending = []
+        self.parts = len([name for name in os.listdir(path) if name.endswith(".parquet")])
+
+    @staticmethod
+    def done_paths(path):
+        if pq is None or not os.path.isdir(path):
+            return set()
+        done = set()
+        for name in sorted(os.listdir(path)):
+            if name.endswith(".parquet"):
+                table = pq.read_table(os.path.join(path, name), columns=["path", "error"])
+                for row_path, error in zip(table.column("path").to_pylist(), table.column("error").to_pylist()):
+                    if error:
+                        done.discard(row_path)
+                    else:
+                        done.add(row_path)
+        return done
+
+    def write(self, rows):
+        self.pending.extend(rows)
+        if len(self.pending) >= self.rows_per_file:
+            self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return
+        table = pa.Table.from_pylist(self.pending, schema=pa.schema([
+            ("path", pa.string()), ("prediction", pa.string()), ("confidence", pa.float64()),
+            ("pneumonia_probability", pa.float64()), ("error", pa.string()),
+        ]))
+        part = os.path.join(self.path, f"part-{self.parts:05d}.parquet")
+        pq.write_table(table, part + ".tmp")
+        os.replace(part + ".tmp", part)
+        self.parts += 1
+        self.pending = []
+
+    def close(self):
+        self._flush()
+
+
+WRITERS = {".csv": CSVWriter, ".jsonl": JSONLWriter, ".parquet": ParquetWriter}
+
+
+def _truncate_partial_line(path):
+    # A run killed mid-write can leave half a line at the end of the file
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+
+# ==================== Inputs ====================
+
+def find_images(root):
+    """Image files under root, sorted, as paths relative to root."""
+    images = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                images.append(os.path.relpath(os.path.join(dirpath, filename), root))
+    return images
+
+
+def _decode(path, target_size):
+    with Image.open(path) as image:
+        return fit_image(image, target_size)
+
+
+def iter_decoded(root, paths, target_size, workers, prefetch):
+    """
+    Yield (path, uint8 pixels or None, error) in order, decoding up to
+    `prefetch` images ahead in a thread pool.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        remaining = iter(paths)
+
+        def submit():
+            path = next(remaining, None)
+            if path is not None:
+                pending.append((path, executor.submit(_decode, os.path.join(root, path), target_size)))
+
+        for _ in range(prefetch):
+            submit()
+        while pending:
+            path, future = pending.popleft()
+            submit()
+            try:
+                yield path, future.result(), None
+            except Exception as e:
+                yield path, None, f"{type(e).__name__}: {e}"
+
+
+def iter_cached(store, paths):
+    """Yield (path, uint8 pixels, None) from a tensor_cache.py store."""
+    from tensor_cache import TensorCache
+
+    cache = TensorCache(store)
+    todo = set(paths)
+    for entries, batch in cache.iter_batches(256, normalize=False):
+        for entry, pixels in zip(entries, batch):
+            if entry["path"] in todo:
+                yield entry["path"], pixels, None
+
+
+# ==================== Scoring ====================
+
+def score_batch(model, class_names, batch, paths):
+    """Result rows for a normalized batch (same logic as shared_utils.classify_data)."""
+    prediction = np.asarray(model.predict(batch, verbose=0))
+    indices = pneumonia_indices(prediction)
+    return [
+        {
+            "path": path,
+            "prediction": class_names[index],
+            "confidence": round(float(row[index]), 6),
+            "pneumonia_probability": round(float(row[0]), 6),
+            "error": None,
+        }
+        for path, row, index in zip(paths, prediction, indices)
+    ]
+
+
+def bulk_score(items, model, class_names, writer, total, batch_size, input_shape):
+    """
+    Batch the decoded items through the model and write the results.
+
+    Returns (scored, errors, img/s): scored and the rate count only the
+    images the model actually scored, not the ones that failed to decode.
+    """
+    pool = get_buffer_pool(input_shape, batch_size)
+    scored = errors = 0
+    start = last_report = time.perf_counter()
+
+    def report(final=False):
+        elapsed = time.perf_counter() - start
+        rate = scored / elapsed if elapsed else 0.0
+        end = "\n" if final else ""
+        print(f"\r{scored + errors}/{total} images, {errors} errors, {rate:.1f} img/s", end=end, file=sys.stderr)
+        return rate
+
+    with pool.buffer() as buffer:
+        paths, failed = [], []
+        for path, pixels, error in items:
+            if error is not None:
+                failed.append({"path": path, "prediction": None, "confidence": None,
+                               "pneumonia_probability": None, "error": error})
+            else:
+                normalize_into(pixels, buffer[len(paths)])
+                paths.append(path)
+            if len(paths) == batch_size:
+                writer.write(score_batch(model, class_names, buffer, paths) + failed)
+                scored, errors = scored + len(paths), errors + len(failed)
+                paths, failed = [], []
+                if time.perf_counter() - last_report > 1.0:
+                    last_report = time.perf_counter()
+                    report()
+        if paths or failed:
+            rows = score_batch(model, class_names, buffer[:len(paths)], paths) if paths else []
+            writer.write(rows + failed)
+            scored, errors = scored + len(paths), errors + len(failed)
+    return scored, errors, report(final=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="image directory, or a tensor_cache.py store")
+    parser.add_argument("output", help="results file: .csv, .jsonl or .parquet (directory of parts)")
+    parser.add_argument("--model", default=None, help="model file (.h5 or .tflite, default: the bundled model)")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="decoding threads")
+    parser.add_argument("--prefetch", type=int, default=4, help="batches decoded ahead of the model")
+    args = parser.parse_args()
+
+    extension = os.path.splitext(args.output.rstrip("/"))[1].lower()
+    if extension not in WRITERS:
+        parser.error(f"Unsupported output format '{extension}' (use {', '.join(WRITERS)})")
+    writer_class = WRITERS[extension]
+    if writer_class is ParquetWriter and pq is None:
+        parser.error("pyarrow is required for Parquet output (pip install pyarrow)")
+
+    from_cache = os.path.exists(os.path.join(args.input, "index.json"))
+    if from_cache:
+        with open(os.path.join(args.input, "index.json")) as f:
+            paths = sorted(entry["path"] for entry in json.load(f)["entries"])
+    else:
+        paths = find_images(args.input)
+
+    # Opening the writer first drops the partial last line of an interrupted
+    # run, so that the row it held is not counted as done
+    writer = writer_class(args.output)
+    try:
+        done = writer_class.done_paths(args.output)
+        todo = [path for path in paths if path not in done]
+        print(f"{len(paths)} images, {len(paths) - len(todo)} already scored, {len(todo)} to score", file=sys.stderr)
+        if not todo:
+            return
+
+        input_shape = PNEUMONIA_INPUT_SPEC["input_shape"]
+        model = load_pneumonia_version(args.model or default_pneumonia_model_path())
+        class_names = load_class_names()
+        if from_cache:
+            items = iter_cached(args.input, todo)
+        else:
+            items = iter_decoded(args.input, todo, tuple(input_shape[:2]), args.workers,
+                                 args.prefetch * args.batch_size)
+
+        scored, errors, rate = bulk_score(items, model, class_names, writer, len(todo), args.batch_size, input_shape)
+        print(f"Done: {scored} images scored ({errors} errors) at {rate:.1f} img/s -> {args.output}", file=sys.stderr)
+    except KeyboardInterrupt:
+        print("\nInterrupted: run the same command again to resume", file=sys.stderr)
+    finally:
+        writer.close()
+
+
+if __name__ == "__main__":
+    main()
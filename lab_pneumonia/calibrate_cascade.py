@@ -0,0 +1,179 @@
+"""
+Calibrate the early-exit thresholds of the pneumonia cascade (cascade.py).
+
+Runs the stage-1 model and the full model over a local labeled folder
+(NORMAL/ and PNEUMONIA/ subdirectories, e.g. the Kaggle chest_xray/val or
+chest_xray/test folder), then for every (low, high) pair of the grid
+reports the fraction of images exited early, the decision agreement with
+the full model, the accuracy of both, and the expected throughput gain
+(model time only, and end to end including decode + preprocessing).
+
+Usage:
+    python calibrate_cascade.py chest_xray/test --stage1 stage1.tflite
+    python calibrate_cascade.py chest_xray/test --export-quantized stage1.tflite
+    python calibrate_cascade.py chest_xray/test --stage1 stage1.tflite --json report.json
+
+Then serve with PNEUMONIA_CASCADE_STAGE1, PNEUMONIA_CASCADE_LOW and
+PNEUMONIA_CASCADE_HIGH set to the chosen values.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from shared_utils import (
+    load_pneumonia_version, load_class_names, default_pneumonia_model_path,
+    list_labeled_images, fit_image, normalize_into, get_buffer_pool, pneumonia_indices,
+    PNEUMONIA_INPUT_SPEC, PNEUMONIA_THRESHOLD
+)
+from cascade import early_exit_mask, export_quantized_stage1
+
+
+def parse_grid(value):
+    return [float(item) for item in value.split(",") if item.strip()]
+
+
+def score_dataset(images, stage1, full, batch_size):
+    """
+    Run both models over the images.
+
+    Returns:
+        dict: stage-1 and full outputs (n, 2), labels and timings in seconds
+    """
+    pool = get_buffer_pool(PNEUMONIA_INPUT_SPEC["input_shape"], batch_size)
+    stage1_outputs, full_outputs = [], []
+    timings = {"preprocess": 0.0, "stage1": 0.0, "full": 0.0}
+    # Untimed warm-up: first-call graph building and tensor allocation
+    warmup = np.zeros((min(batch_size, len(images)) or 1, *PNEUMONIA_INPUT_SPEC["input_shape"]), dtype=np.float32)
+    for model in (stage1, full):
+        model.predict(warmup, verbose=0)
+    with pool.buffer() as buffer:
+        for start in range(0, len(images), batch_size):
+            chunk = images[start:start + batch_size]
+            data = buffer[:len(chunk)]
+
+            begin = time.perf_counter()
+            for row, (path, _) in zip(data, chunk):
+                with Image.open(path) as image:
+                    normalize_into(fit_image(image, PNEUMONIA_INPUT_SPEC["input_shape"][:2]), row)
+            timings["preprocess"] += time.perf_counter() - begin
+
+            begin = time.perf_counter()
+            stage1_outputs.append(np.asarray(stage1.predict(data, verbose=0)))
+            timings["stage1"] += time.perf_counter() - begin
+
+            begin = time.perf_counter()
+            full_outputs.append(np.asarray(full.predict(data, verbose=0)))
+            timings["full"] += time.perf_counter() - begin
+
+            print(f"\r{min(start + batch_size, len(images))}/{len(images)} images", end="", file=sys.stderr)
+    print(file=sys.stderr)
+    return {
+        "stage1": np.concatenate(stage1_outputs),
+        "full": np.concatenate(full_outputs),
+        "labels": np.array([label for _, label in images]),
+        "timings": timings,
+    }
+
+
+def evaluate(scores, low, high):
+    """Cascade metrics for one pair of thresholds."""
+    stage1, full, labels = scores["stage1"], scores["full"], scores["labels"]
+    timings = {key: value / len(labels) for key, value in scores["timings"].items()}
+
+    exits = early_exit_mask(stage1, low, high)
+    full_decisions = pneumonia_indices(full)
+    decisions = np.where(exits, pneumonia_indices(stage1), full_decisions)
+    exit_rate = float(exits.mean())
+
+    cascade_time = timings["stage1"] + (1 - exit_rate) * timings["full"]
+    return {
+        "low": low,
+        "high": high,
+        "early_exit_rate": round(exit_rate, 4),
+        "agreement": round(float((decisions == full_decisions).mean()), 4),
+        "accuracy": round(float((decisions == labels).mean()), 4),
+        "full_accuracy": round(float((full_decisions == labels).mean()), 4),
+        "model_speedup": round(timings["full"] / cascade_time, 3),
+        "end_to_end_speedup": round(
+            (timings["preprocess"] + timings["full"]) / (timings["preprocess"] + cascade_time), 3
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("data", help="folder with NORMAL/ and PNEUMONIA/ subdirectories")
+    parser.add_argument("--stage1", help="stage-1 model (.tflite or .h5)")
+    parser.add_argument("--export-quantized", metavar="PATH",
+                        help="write a dynamic-range quantized TFLite copy of the full model to PATH and use it as stage 1")
+    parser.add_argument("--full", default=None, help="full model (default: the bundled pneumonia model)")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--limit", type=int, default=None, help="score only the first N images")
+    parser.add_argument("--low-grid", type=parse_grid, default="0.001,0.005,0.01,0.02,0.05,0.1")
+    parser.add_argument("--high-grid", type=parse_grid, default="0.96,0.98,0.99,0.995,0.999")
+    parser.add_argument("--min-agreement", type=float, default=0.99,
+                        help="agreement with the full model required for the recommendation")
+    parser.add_argument("--json", metavar="PATH", help="also write the report as JSON")
+    args = parser.parse_args()
+
+    if not args.stage1 and not args.export_quantized:
+        parser.error("--stage1 or --export-quantized is required")
+
+    class_names = load_class_names()
+    images = list_labeled_images(args.data, class_names)[:args.limit]
+    if not images:
+        parser.error(f"No images under {args.data} in {'/'.join(class_names)} subdirectories")
+
+    full = load_pneumonia_version(args.full or default_pneumonia_model_path())
+    stage1_path = args.stage1
+    if args.export_quantized:
+        stage1_path = export_quantized_stage1(full, args.export_quantized)
+        print(f"Quantized stage 1 written to {stage1_path}", file=sys.stderr)
+    stage1 = load_pneumonia_version(stage1_path)
+
+    scores = score_dataset(images, stage1, full, args.batch_size)
+    results = [
+        evaluate(scores, low, high)
+        for low in args.low_grid for high in args.high_grid
+        if low <= PNEUMONIA_THRESHOLD < high
+    ]
+
+    print(f"{len(images)} images, per-image ms: " + ", ".join(
+        f"{key} {value / len(images) * 1000:.2f}" for key, value in scores["timings"].items()
+    ))
+    print(f"{'low':>7s} {'high':>7s} {'exit':>7s} {'agree':>7s} {'acc':>7s} {'full acc':>8s} {'model x':>8s} {'e2e x':>7s}")
+    for r in results:
+        print(f"{r['low']:>7g} {r['high']:>7g} {r['early_exit_rate']:>7.2%} {r['agreement']:>7.2%} "
+              f"{r['accuracy']:>7.2%} {r['full_accuracy']:>8.2%} {r['model_speedup']:>8.2f} {r['end_to_end_speedup']:>7.2f}")
+
+    eligible = [r for r in results if r["agreement"] >= args.min_agreement and r["model_speedup"] > 1]
+    best = max(eligible, key=lambda r: r["model_speedup"]) if eligible else None
+    if best:
+        print(f"\nRecommended (agreement >= {args.min_agreement:.0%}): "
+              f"PNEUMONIA_CASCADE_LOW={best['low']:g} PNEUMONIA_CASCADE_HIGH={best['high']:g}")
+    else:
+        print(f"\nNo thresholds reach {args.min_agreement:.0%} agreement with a speedup; "
+              f"the cascade is not worth it with this stage 1")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "data": os.path.abspath(args.data),
+                "images": len(images),
+                "stage1": stage1_path,
+                "full": args.full or default_pneumonia_model_path(),
+                "per_image_ms": {key: value / len(images) * 1000 for key, value in scores["timings"].items()},
+                "results": results,
+                "recommended": best,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Cascaded early-exit inference for pneumonia screening.
+
+A cheap first stage (a quantized or otherwise smaller TFLite model taking
+the same 224x224 input) scores every image. Confident results exit early:
+a PNEUMONIA probability >= high or <= low is returned as is. Only the
+uncertain images in between go through the full model. CascadeModel has
+the Keras-like predict() of the models it wraps, so classify_image,
+classify_data and the batch endpoints work unchanged.
+
+low must not exceed PNEUMONIA_THRESHOLD and high must be above it, so an
+early exit always gives the class the threshold would give. Thresholds come
+from PNEUMONIA_CASCADE_LOW / PNEUMONIA_CASCADE_HIGH, can be changed at
+runtime (PUT /admin/cascades/{name}) and are chosen with calibrate_cascade.py.
+
+Usage:
+    cascade = CascadeModel("pneumonia", InterpreterPool("stage1.tflite"), full_model)
+    class_name, confidence = classify_image(image, cascade, class_names)
+"""
+
+import os
+import threading
+
+import numpy as np
+
+from shared_utils import PNEUMONIA_THRESHOLD
+
+CASCADE_STAGE1 = os.environ.get("PNEUMONIA_CASCADE_STAGE1")
+CASCADE_LOW = float(os.environ.get("PNEUMONIA_CASCADE_LOW", "0.02"))
+CASCADE_HIGH = float(os.environ.get("PNEUMONIA_CASCADE_HIGH", "0.995"))
+
+# Cascades by model name, used by the admin endpoints
+CASCADES = {}
+
+
+def validate_thresholds(low, high, threshold=PNEUMONIA_THRESHOLD):
+    """Raise ValueError unless 0 <= low <= threshold < high <= 1."""
+    if not 0.0 <= low <= threshold < high <= 1.0:
+        raise ValueError(
+            f"Cascade thresholds must satisfy 0 <= low <= {threshold} < high <= 1 (got low={low}, high={high})"
+        )
+
+
+def early_exit_mask(prediction, low, high):
+    """Rows of a stage-1 output (n, 2) confident enough to skip the full model."""
+    probabilities = np.asarray(prediction)[:, 0]
+    return (probabilities >= high) | (probabilities <= low)
+
+
+class CascadeModel:
+    """
+    Two-stage model: stage1 for every input, stage2 for uncertain ones.
+
+    Parameters:
+        name (str): Model name (key in CASCADES)
+        stage1: Cheap model with a predict() method
+        stage2: Full model with a predict() method
+        low (float): Stage-1 PNEUMONIA probability at or below which NORMAL exits early
+        high (float): Stage-1 PNEUMONIA probability at or above which PNEUMONIA exits early
+    """
+
+    def __init__(self, name, stage1, stage2, low=CASCADE_LOW, high=CASCADE_HIGH):
+        validate_thresholds(low, high)
+        self.name = name
+        self.stage1 = stage1
+        self.stage2 = stage2
+        self.low = low
+        self.high = high
+        self._lock = threading.Lock()
+        self._rows = 0
+        self._early_exits = 0
+        CASCADES[name] = self
+
+    def set_thresholds(self, low=None, high=None):
+        low = self.low if low is None else low
+        high = self.high if high is None else high
+        validate_thresholds(low, high)
+        self.low, self.high = low, high
+
+    def predict(self, data, verbose=0):
+        """Run the cascade on a batch (Keras-like)."""
+        low, high = self.low, self.high
+        first = np.asarray(self.stage1.predict(data, verbose=verbose), dtype=np.float32)
+        exits = early_exit_mask(first, low, high)
+        exited = int(exits.sum())
+        with self._lock:
+            self._rows += len(first)
+            self._early_exits += exited
+        if exited == len(first):
+            return first
+
+        # Uncertain rows get the full model's output
+        uncertain = ~exits
+        output = first.copy()
+        output[uncertain] = self.stage2.predict(np.asarray(data)[uncertain], verbose=verbose)
+        return output
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "low": self.low,
+            "high": self.high,
+            "rows": self._rows,
+            "early_exits": self._early_exits,
+            "early_exit_rate": round(self._early_exits / self._rows, 4) if self._rows else None,
+            "stage1": type(self.stage1).__name__,
+            "stage2": type(self.stage2).__name__,
+        }
+
+
+def export_quantized_stage1(keras_model, output_path):
+    """
+    Convert a Keras model to a dynamic-range quantized TFLite model
+    (int8 weights, about 4x smaller and faster on CPU) usable as stage 1.
+
+    Returns:
+        str: output_path
+    """
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    with open(output_path, "wb") as f:
+        f.write(converter.convert())
+    return output_path
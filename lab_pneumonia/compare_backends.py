@@ -0,0 +1,275 @@
+"""
+Compare pneumonia model backends: accuracy against throughput.
+
+Every backend (Keras .h5, the bundled .tflite, quantized TFLite variants
+exported from the Keras model, or any model file given with --backend) is
+run in its own subprocess over a local labeled folder (NORMAL/ and
+PNEUMONIA/ subdirectories) or a tensor_cache.py store, so that load time
+and peak memory are measured in isolation. The report gives, per backend:
+accuracy, confusion matrix, decision agreement with the reference backend,
+single-image latency (p50/p95), batched latency and throughput, and peak
+RSS. With --json each run is appended as one line to a JSON Lines file,
+so runs can be tracked over time.
+
+Usage:
+    python compare_backends.py chest_xray/test --json reports/backends.jsonl
+    python compare_backends.py chest_xray/test --quantize --backend int8=model_int8.tflite
+    python compare_backends.py cache/test --reference tflite
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from shared_utils import default_pneumonia_model_path, load_class_names, PNEUMONIA_INPUT_SPEC
+
+BUNDLED_TFLITE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "appcontrole", "assets", "model", "pneumonia_classifier.tflite",
+)
+
+
+# ==================== Worker (one backend per process) ====================
+
+def _iter_dataset(data, batch_size):
+    """Yield (labels, normalized float32 batch) from a folder or a tensor store."""
+    from shared_utils import fit_image, normalize_into, get_buffer_pool, list_labeled_images
+    from PIL import Image
+
+    if os.path.exists(os.path.join(data, "index.json")):
+        from tensor_cache import TensorCache
+
+        for entries, batch in TensorCache(data).iter_batches(batch_size):
+            yield np.array([entry["label"] for entry in entries]), batch
+        return
+
+    images = list_labeled_images(data, load_class_names())
+    target_size = tuple(PNEUMONIA_INPUT_SPEC["input_shape"][:2])
+    with get_buffer_pool(PNEUMONIA_INPUT_SPEC["input_shape"], batch_size).buffer() as buffer:
+        for start in range(0, len(images), batch_size):
+            chunk = images[start:start + batch_size]
+            for row, (path, _) in zip(buffer, chunk):
+                with Image.open(path) as image:
+                    normalize_into(fit_image(image, target_size), row)
+            yield np.array([label for _, label in chunk]), buffer[:len(chunk)]
+
+
+def _percentiles(values_ms):
+    values = np.asarray(values_ms)
+    return {
+        "p50": round(float(np.percentile(values, 50)), 3),
+        "p95": round(float(np.percentile(values, 95)), 3),
+        "mean": round(float(values.mean()), 3),
+    }
+
+
+def run_worker(path, data, batch_size, single):
+    """Measure one backend in this process and return its raw results."""
+    from shared_utils import load_pneumonia_version
+
+    start = time.perf_counter()
+    model = load_pneumonia_version(path)
+    model.predict(np.zeros((1, *PNEUMONIA_INPUT_SPEC["input_shape"]), dtype=np.float32), verbose=0)
+    load_seconds = time.perf_counter() - start
+
+    probabilities, labels, batch_ms, single_ms = [], [], [], []
+    images = 0
+    for batch_labels, batch in _iter_dataset(data, batch_size):
+        # Single-image latency on the first images, one predict() per image
+        for index in range(min(len(batch), single - len(single_ms))):
+            begin = time.perf_counter()
+            model.predict(batch[index:index + 1], verbose=0)
+            single_ms.append((time.perf_counter() - begin) * 1000)
+
+        begin = time.perf_counter()
+        prediction = np.asarray(model.predict(batch, verbose=0))
+        elapsed = time.perf_counter() - begin
+        if len(batch) == batch_size:
+            batch_ms.append(elapsed * 1000)
+        images += len(batch)
+        probabilities.extend(prediction[:, 0].tolist())
+        labels.extend(batch_labels.tolist())
+
+    total_batch_seconds = sum(batch_ms) / 1000
+    full_batches = len(batch_ms) * batch_size
+    return {
+        "path": path,
+        "model_type": type(model).__name__,
+        "size_mb": round(os.path.getsize(path) / (1024 * 1024), 3),
+        "load_seconds": round(load_seconds, 3),
+        "images": images,
+        "single_latency_ms": _percentiles(single_ms) if single_ms else None,
+        "batch_latency_ms": _percentiles(batch_ms) if batch_ms else None,
+        "throughput_img_s": round(full_batches / total_batch_seconds, 1) if total_batch_seconds else None,
+        # ru_maxrss is in kilobytes on Linux, bytes on macOS
+        "peak_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1
+        ),
+        "pneumonia_probabilities": probabilities,
+        "labels": labels,
+    }
+
+
+# ==================== Driver ====================
+
+def export_tflite_variants(keras_path, out_dir):
+    """
+    Export quantized TFLite variants of a Keras model.
+
+    Returns:
+        dict: Backend name -> .tflite path
+    """
+    import tensorflow as tf
+    from shared_utils import load_pneumonia_model
+
+    model = load_pneumonia_model(keras_path)
+    variants = {}
+    for name, configure in (
+        ("tflite-dynamic", lambda c: setattr(c, "optimizations", [tf.lite.Optimize.DEFAULT])),
+        ("tflite-float16", lambda c: (setattr(c, "optimizations", [tf.lite.Optimize.DEFAULT]),
+                                      setattr(c.target_spec, "supported_types", [tf.float16]))),
+    ):
+        converter = tf.lite.TFLiteConverter.from_keras_model(model)
+        configure(converter)
+        path = os.path.join(out_dir, f"{name}.tflite")
+        with open(path, "wb") as f:
+            f.write(converter.convert())
+        variants[name] = path
+    return variants
+
+
+def run_backend(name, path, args):
+    """Run one backend in a subprocess and return its parsed results."""
+    command = [
+        sys.executable, os.path.abspath(__file__), "--worker", path, args.data,
+        "--batch-size", str(args.batch_size), "--single", str(args.single),
+    ]
+    print(f"Running {name} ({path})...", file=sys.stderr)
+    completed = subprocess.run(command, capture_output=True, text=True)
+    # The worker's last stdout line is its result, or {"error": ...} if it raised
+    lines = completed.stdout.strip().splitlines()
+    if lines:
+        try:
+            return json.loads(lines[-1])
+        except ValueError:
+            pass
+    # Killed or crashed before reporting (out of memory, segfault, ...)
+    return {"path": path, "error": f"worker exited with code {completed.returncode}"}
+
+
+def summarize(results, reference, class_names):
+    """Add accuracy, confusion matrix and agreement, and drop the per-image data."""
+    from shared_utils import PNEUMONIA_THRESHOLD
+
+    def decisions(result):
+        return np.where(np.asarray(result["pneumonia_probabilities"]) > PNEUMONIA_THRESHOLD, 0, 1)
+
+    reference_decisions = decisions(results[reference]) if "error" not in results[reference] else None
+    for name, result in results.items():
+        if "error" in result:
+            continue
+        predicted, labels = decisions(result), np.asarray(result.pop("labels"))
+        result.pop("pneumonia_probabilities")
+        confusion = np.zeros((len(class_names), len(class_names)), dtype=np.int64)
+        np.add.at(confusion, (labels, predicted), 1)
+        result["accuracy"] = round(float((predicted == labels).mean()), 4) if len(labels) else None
+        result["confusion_matrix"] = confusion.tolist()
+        if reference_decisions is not None and len(reference_decisions) == len(predicted):
+            result["agreement_with_reference"] = round(float((predicted == reference_decisions).mean()), 4)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("data", help="folder with NORMAL/ and PNEUMONIA/ subdirectories, or a tensor_cache.py store")
+    parser.add_argument("--backend", action="append", default=[], metavar="NAME=PATH",
+                        help="extra backend (.h5 or .tflite), repeatable")
+    parser.add_argument("--quantize", action="store_true",
+                        help="also export and compare dynamic-range and float16 TFLite variants of the Keras model")
+    parser.add_argument("--reference", default=None, help="backend used for agreement (default: the first one)")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--single", type=int, default=50, help="images timed one by one for single-image latency")
+    parser.add_argument("--json", metavar="PATH",
+                        help="append the report as one line to the JSON Lines file PATH (default: stdout only)")
+    parser.add_argument("--worker", metavar="MODEL", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        try:
+            result = run_worker(args.worker, args.data, args.batch_size, args.single)
+        except Exception as e:
+            # Reported on stdout: stderr is full of TensorFlow logs
+            print(json.dumps({"path": args.worker, "error": f"{type(e).__name__}: {e}"}))
+            sys.exit(1)
+        print(json.dumps(result))
+        return
+
+    backends = {}
+    keras_path = default_pneumonia_model_path()
+    if os.path.exists(keras_path):
+        backends["keras"] = keras_path
+    if os.path.exists(BUNDLED_TFLITE):
+        backends["tflite"] = BUNDLED_TFLITE
+    for item in args.backend:
+        name, _, path = item.partition("=")
+        if not path:
+            parser.error(f"--backend expects NAME=PATH, got '{item}'")
+        backends[name] = path
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.quantize:
+            try:
+                backends.update(export_tflite_variants(keras_path, tmp))
+            except Exception as e:
+                print(f"Quantized export skipped: {e}", file=sys.stderr)
+        if not backends:
+            parser.error("No backend found")
+        results = {name: run_backend(name, path, args) for name, path in backends.items()}
+
+    reference = args.reference or next(iter(backends))
+    if reference not in results:
+        parser.error(f"Unknown reference backend '{reference}'")
+    if "error" in results[reference]:
+        # Agreement is still useful against the first backend that ran
+        reference = next((name for name, result in results.items() if "error" not in result), reference)
+    class_names = load_class_names()
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "data": os.path.abspath(args.data),
+        "batch_size": args.batch_size,
+        "reference": reference,
+        "class_names": class_names,
+        "host": {"platform": platform.platform(), "python": platform.python_version(), "cpu_count": os.cpu_count()},
+        "backends": summarize(results, reference, class_names),
+    }
+
+    print(f"{'backend':16s} {'acc':>7s} {'agree':>7s} {'1-img p50':>10s} {'batch p50':>10s} {'img/s':>8s} {'rss MB':>8s}")
+    for name, result in report["backends"].items():
+        if "error" in result:
+            print(f"{name:16s} error: {result['error']}")
+            continue
+        single = result["single_latency_ms"] or {}
+        batch = result["batch_latency_ms"] or {}
+        agreement = result.get("agreement_with_reference")
+        print(f"{name:16s} {result['accuracy'] or 0:>7.2%} {agreement if agreement is not None else float('nan'):>7.2%} "
+              f"{single.get('p50', float('nan')):>10.2f} {batch.get('p50', float('nan')):>10.2f} "
+              f"{result['throughput_img_s'] or float('nan'):>8.1f} {result['peak_rss_mb']:>8.1f}")
+
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "a") as f:
+            f.write(json.dumps(report) + "\n")
+        print(f"Report appended to {args.json}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Content-negotiated response compression (gzip, brotli, zstd).
+
+Shared by the FastAPI apps (ASGI middleware), the Flask app (after_request
+hook) and the MCP server. Small bodies and bodies that are already
+compressed are sent as-is. Compression levels can be set per route prefix.
+
+brotli and zstandard are optional: only installed codecs are negotiated.
+"""
+
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", "1024"))
+
+# Server preference order when the client accepts several encodings equally
+DEFAULT_LEVELS = {"zstd": 3, "br": 4, "gzip": 6}
+AVAILABLE_ENCODINGS = [
+    encoding for encoding, available in (
+        ("zstd", zstandard is not None),
+        ("br", brotli is not None),
+        ("gzip", True),
+    ) if available
+]
+
+# Content types that are already compressed (compressing them again wastes CPU)
+INCOMPRESSIBLE_TYPES = (
+    "image/jpeg", "image/png", "image/gif", "image/webp", "image/avif",
+    "video/", "audio/",
+    "application/zip", "application/gzip", "application/x-gzip",
+    "application/zstd", "application/x-7z-compressed", "application/x-rar-compressed",
+)
+
+
+def negotiate(accept_encoding, encodings=None):
+    """
+    Pick the best encoding from an Accept-Encoding header.
+
+    Parameters:
+        accept_encoding (str): Accept-Encoding header value (may be empty)
+        encodings (list): Candidate encodings in server preference order
+
+    Returns:
+        str or None: Chosen encoding, or None to send the body uncompressed
+    """
+    if not accept_encoding:
+        return None
+    encodings = encodings or AVAILABLE_ENCODINGS
+    qualities = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        qualities[name.strip().lower()] = q
+
+    wildcard = qualities.get("*")
+    best, best_q = None, 0.0
+    for encoding in encodings:
+        q = qualities.get(encoding, wildcard if wildcard is not None else 0.0)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def is_compressible(content_type, content_encoding=None):
+    """Whether a body with these headers is worth compressing."""
+    if content_encoding and content_encoding.lower() != "identity":
+        return False
+    content_type = (content_type or "").lower()
+    return not content_type.startswith(INCOMPRESSIBLE_TYPES)
+
+
+def compress(data, encoding, level=None):
+    """
+    Compress data with the given encoding.
+
+    Parameters:
+        data (bytes): Body to compress
+        encoding (str): "gzip", "br" or "zstd"
+        level (int): Compression level (None for the default level)
+
+    Returns:
+        bytes: Compressed body
+    """
+    level = DEFAULT_LEVELS[encoding] if level is None else level
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    if encoding == "br":
+        return brotli.compress(data, quality=level)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+class CompressionPolicy:
+    """
+    Minimum size and per-route compression levels.
+
+    Parameters:
+        min_size (int): Bodies smaller than this are sent uncompressed
+        levels (dict): Default level per encoding
+        route_levels (dict): Path prefix -> {encoding: level}; a level of 0
+            (or an empty dict) disables compression for that prefix
+    """
+
+    def __init__(self, min_size=MIN_SIZE, levels=None, route_levels=None):
+        self.min_size = min_size
+        self.levels = {**DEFAULT_LEVELS, **(levels or {})}
+        # Longest prefix first so the most specific route wins
+        self.route_levels = sorted((route_levels or {}).items(), key=lambda item: -len(item[0]))
+
+    def negotiated(self, path):
+        """Whether responses on this path may be compressed (and so need Vary)."""
+        return any(self.level_for(path, encoding) for encoding in AVAILABLE_ENCODINGS)
+
+    def level_for(self, path, encoding):
+        for prefix, levels in self.route_levels:
+            if path.startswith(prefix):
+                return levels.get(encoding, 0 if not levels else self.levels[encoding])
+        return self.levels[encoding]
+
+    def encode(self, path, accept_encoding, content_type, content_encoding, body):
+        """
+        Returns:
+            tuple: (encoding or None, body to send)
+        """
+        if len(body) < self.min_size or not is_compressible(content_type, content_encoding):
+            return None, body
+        encoding = negotiate(accept_encoding)
+        if encoding is None:
+            return None, body
+        level = self.level_for(path, encoding)
+        if not level:
+            return None, body
+        compressed = compress(body, encoding, level)
+        if len(compressed) >= len(body):
+            return None, body
+        return encoding, compressed
+
+
+def _with_vary(headers):
+    """ASGI headers with Accept-Encoding added to Vary (merged with an existing Vary)."""
+    vary = [value for name, value in headers if name.lower() == b"vary"]
+    if any(b"accept-encoding" in value.lower() or value.strip() == b"*" for value in vary):
+        return headers
+    headers = [(name, value) for name, value in headers if name.lower() != b"vary"]
+    vary.append(b"Accept-Encoding")
+    headers.append((b"vary", b", ".join(vary)))
+    return headers
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing HTTP responses.
+
+    The response body is buffered until complete, so it is meant for JSON
+    endpoints rather than long-lived streams. Every response on a route where
+    compression is enabled carries Vary: Accept-Encoding, compressed or not,
+    so that shared caches keep one copy per encoding.
+
+    Usage:
+        app.add_middleware(CompressionMiddleware, route_levels={"/predict/batch": {"gzip": 9}})
+    """
+
+    def __init__(self, app, min_size=MIN_SIZE, levels=None, route_levels=None):
+        self.app = app
+        self.policy = CompressionPolicy(min_size, levels, route_levels)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.policy.negotiated(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = ""
+        for name, value in scope.get("headers", ()):
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+        if not accept_encoding:
+            async def add_vary(message):
+                if message["type"] == "http.response.start":
+                    message = {**message, "headers": _with_vary(list(message["headers"]))}
+                await send(message)
+
+            await self.app(scope, receive, add_vary)
+            return
+
+        start = None
+        chunks = []
+
+        async def send_wrapper(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            await self._send_response(scope["path"], accept_encoding, start, b"".join(chunks), send)
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def _send_response(self, path, accept_encoding, start, body, send):
+        headers = _with_vary([(name, value) for name, value in start["headers"]])
+        header_map = {name.lower(): value for name, value in headers}
+        encoding, body = self.policy.encode(
+            path,
+            accept_encoding,
+            header_map.get(b"content-type", b"").decode("latin-1"),
+            header_map.get(b"content-encoding", b"").decode("latin-1"),
+            body,
+        )
+        if encoding is not None:
+            headers = [(n, v) for n, v in headers if n.lower() not in (b"content-length", b"etag")]
+            headers += [
+                (b"content-encoding", encoding.encode("latin-1")),
+                (b"content-length", str(len(body)).encode("latin-1")),
+            ]
+            # A strong ETag is tied to the exact bytes: keep it only as a weak validator
+            if b"etag" in header_map:
+                etag = header_map[b"etag"]
+                headers.append((b"etag", etag if etag.startswith(b"W/") else b"W/" + etag))
+        await send({**start, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+def init_flask_compression(app, min_size=MIN_SIZE, levels=None, route_levels=None):
+    """Register an after_request hook compressing Flask responses."""
+    from flask import request
+
+    policy = CompressionPolicy(min_size, levels, route_levels)
+
+    @app.after_request
+    def _compress_response(response):
+        if response.direct_passthrough or response.is_streamed or not policy.negotiated(request.path):
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding, body = policy.encode(
+            request.path,
+            request.headers.get("Accept-Encoding", ""),
+            response.content_type,
+            response.headers.get("Content-Encoding"),
+            response.get_data(),
+        )
+        if encoding is not None:
+            response.set_data(body)
+            response.headers["Content-Encoding"] = encoding
+        return response
+
+    return app
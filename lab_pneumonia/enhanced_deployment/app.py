@@ -4,6 +4,7 @@ Features: Avatar, improved UI/UX, modern styling, animations
 """
 
 from flask import Flask, render_template, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from PIL import Image
 import os
 import sys
@@ -14,8 +15,29 @@ from datetime import datetime
 # Add parent directory to path to import shared_utils
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from shared_utils import load_pneumonia_model, load_class_names, classify_image
+import fast_json
+from compression import init_flask_compression
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by the shared fast serializer."""
+
+    def dumps(self, obj, **kwargs):
+        return fast_json.dumps(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return fast_json.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        # Encoded bytes go straight into the response body
+        return self._app.response_class(fast_json.dumps(obj), mimetype=self.mimetype)
+
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
+# The base64 PNG in /predict is high-entropy: a fast level recovers the base64 overhead
+init_flask_compression(app, route_levels={'/predict': {'gzip': 1, 'br': 1, 'zstd': 1}})
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 app.config['SECRET_KEY'] = 'pneumonia-classification-enhanced'
 
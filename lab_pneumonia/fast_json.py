@@ -0,0 +1,84 @@
+"""
+Fast JSON serialization shared by the FastAPI, Flask and MCP servers.
+
+Uses orjson when it is installed and falls back to the standard library
+otherwise. NumPy scalars and arrays are encoded natively by orjson instead
+of being converted to Python lists first.
+"""
+
+import json
+
+from profiling import stage
+
+try:
+    import orjson
+except ImportError:  # orjson is optional
+    orjson = None
+
+try:
+    from starlette.responses import JSONResponse
+except ImportError:  # only needed by the FastAPI deployments
+    JSONResponse = None
+
+
+def _default(obj):
+    """Fallback for types the encoder does not handle natively."""
+    # NumPy arrays orjson cannot serialize directly (non-contiguous, float16, ...)
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps(content) -> bytes:
+        """
+        Serialize content to UTF-8 JSON bytes.
+
+        Parameters:
+            content: JSON-compatible object (may contain NumPy values)
+
+        Returns:
+            bytes: Encoded JSON document
+        """
+        return orjson.dumps(content, default=_default, option=_ORJSON_OPTIONS)
+
+    loads = orjson.loads
+else:
+    def dumps(content) -> bytes:
+        """
+        Serialize content to UTF-8 JSON bytes.
+
+        Parameters:
+            content: JSON-compatible object (may contain NumPy values)
+
+        Returns:
+            bytes: Encoded JSON document
+        """
+        return json.dumps(
+            content, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+        ).encode("utf-8")
+
+    loads = json.loads
+
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+if JSONResponse is not None:
+    class FastJSONResponse(JSONResponse):
+        """
+        JSONResponse rendered with the fast serializer.
+
+        Return an instance explicitly from hot endpoints. When it is only the
+        default_response_class, FastAPI first runs the returned value through
+        jsonable_encoder (slow, and it rejects NumPy values) and render only
+        sees the already converted copy.
+        """
+
+        def render(self, content) -> bytes:
+            with stage("serialize"):
+                return dumps(content)
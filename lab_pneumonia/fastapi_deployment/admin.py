@@ -0,0 +1,187 @@
+"""
+Admin endpoints for FastAPI (runtime configuration, model hot-swap,
+cascade thresholds, profiling).
+
+Every route requires the X-Admin-Token header to match the ADMIN_TOKEN
+environment variable; when ADMIN_TOKEN is not set the admin routes are
+disabled (403).
+"""
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+from typing import Dict, Optional
+import hmac
+import os
+import sys
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from structured_logging import get_log_config, set_log_config
+from model_manager import MODEL_MANAGERS, get_manager
+from inference_server import INFERENCE_SERVER_ADDRESS
+from cascade import CASCADES
+from profiling import StackSampler
+
+
+def is_admin_token(token):
+    """Whether token matches ADMIN_TOKEN (always False when ADMIN_TOKEN is not set)."""
+    admin_token = os.environ.get("ADMIN_TOKEN")
+    return bool(admin_token and token and hmac.compare_digest(token, admin_token))
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Reject the request unless X-Admin-Token matches ADMIN_TOKEN."""
+    if not os.environ.get("ADMIN_TOKEN"):
+        raise HTTPException(status_code=403, detail="Admin endpoints disabled (ADMIN_TOKEN not set)")
+    if not is_admin_token(x_admin_token):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+
+class LogConfigUpdate(BaseModel):
+    level: Optional[str] = None
+    sample_rates: Optional[Dict[str, float]] = None
+
+
+@router.get("/logging")
+async def read_log_config():
+    """Current log level and per-route sampling rates"""
+    return get_log_config()
+
+
+@router.put("/logging")
+async def update_log_config(update: LogConfigUpdate):
+    """
+    Change the log level and/or the per-route sampling rates.
+
+    Example body: {"level": "DEBUG", "sample_rates": {"/fruits/predict": 0.1}}
+    """
+    try:
+        return set_log_config(update.level, update.sample_rates)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+class ModelLoadRequest(BaseModel):
+    path: str
+    mode: str = "swap"
+    shadow_rate: Optional[float] = None
+
+
+def _manager(name):
+    try:
+        return get_manager(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown model '{name}'. Available: {', '.join(MODEL_MANAGERS)}")
+
+
+@router.get("/models")
+async def list_models():
+    """Serving version, shadow candidate and shadow statistics of each model"""
+    return {name: manager.stats() for name, manager in MODEL_MANAGERS.items()}
+
+
+@router.post("/models/{name}/load", status_code=202)
+async def load_model_version(name: str, load: ModelLoadRequest):
+    """
+    Load a new model version in the background.
+
+    mode "swap" serves it as soon as it is warmed up; mode "shadow" keeps it
+    as a candidate receiving shadow_rate of the traffic (see GET /admin/models).
+    Example body: {"path": "/models/pneumonia_v2.h5", "mode": "shadow", "shadow_rate": 0.1}
+
+    Not available when the models run in a shared inference server
+    (INFERENCE_SERVER_ADDRESS): loading here would bring TensorFlow back
+    into the HTTP workers.
+    """
+    manager = _manager(name)
+    if INFERENCE_SERVER_ADDRESS:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Models are served by the inference server at {INFERENCE_SERVER_ADDRESS}; "
+                   "update its model files and restart it",
+        )
+    if not os.path.exists(load.path):
+        raise HTTPException(status_code=400, detail=f"Model file not found: {load.path}")
+    try:
+        manager.load(load.path, load.mode, load.shadow_rate)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return manager.stats()
+
+
+@router.post("/models/{name}/promote")
+async def promote_model_version(name: str):
+    """Serve the shadow candidate for new requests"""
+    manager = _manager(name)
+    try:
+        manager.promote()
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return manager.stats()
+
+
+@router.delete("/models/{name}/candidate")
+async def discard_model_version(name: str):
+    """Drop the shadow candidate"""
+    manager = _manager(name)
+    manager.discard_candidate()
+    return manager.stats()
+
+
+class CascadeThresholds(BaseModel):
+    low: Optional[float] = None
+    high: Optional[float] = None
+
+
+@router.get("/cascades")
+async def list_cascades():
+    """Thresholds and early-exit rate of each cascade"""
+    return {name: cascade.stats() for name, cascade in CASCADES.items()}
+
+
+@router.put("/cascades/{name}")
+async def update_cascade(name: str, thresholds: CascadeThresholds):
+    """
+    Change the early-exit thresholds of a cascade.
+
+    Example body: {"low": 0.01, "high": 0.998}
+    """
+    if name not in CASCADES:
+        raise HTTPException(status_code=404, detail=f"No cascade for model '{name}'")
+    try:
+        CASCADES[name].set_thresholds(thresholds.low, thresholds.high)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return CASCADES[name].stats()
+
+
+# One worker profile at a time: sampling has a cost on live traffic
+_profile_lock = threading.Lock()
+
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def profile_worker(
+    seconds: float = Query(10.0, gt=0, le=120, description="Sampling duration"),
+    interval_ms: float = Query(5.0, ge=1, le=1000, description="Time between samples"),
+):
+    """
+    Sample the stacks of every thread of this worker for N seconds.
+
+    Returns folded stacks ("frame;frame;frame count" per line), the input
+    format of flamegraph.pl and speedscope.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    try:
+        sampler = StackSampler(interval_ms / 1000)
+        folded = await run_in_threadpool(sampler.run, seconds)
+    finally:
+        _profile_lock.release()
+    return PlainTextResponse(folded, headers={"X-Profile-Samples": str(sampler.count)})
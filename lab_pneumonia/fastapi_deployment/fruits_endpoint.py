@@ -3,45 +3,61 @@ Fruits Classification Endpoint for FastAPI
 Uses H5 model (like pneumonia) for better compatibility
 """
 
-from fastapi import APIRouter, File, UploadFile, HTTPException
-from fastapi.responses import JSONResponse
-from PIL import Image, ImageOps
-import io
-import numpy as np
 import os
 import sys
 
 # Add parent directory to path to import shared_utils style functions
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import runtime_config
+runtime_config.apply()  # thread counts, before numpy and TensorFlow are imported
 
-# Try to import Keras model loader
-USE_TF_KERAS = False
-try:
-    import tensorflow as tf
-    from tensorflow.keras.models import load_model
-    USE_TF_KERAS = True
-except (ImportError, AttributeError):
-    try:
-        from keras.models import load_model
-        USE_TF_KERAS = False
-    except ImportError:
-        raise ImportError("TensorFlow/Keras is required for fruits classification")
+from fastapi import APIRouter, File, UploadFile, HTTPException, Query, Request, Response
+from typing import List, Optional
+from fastapi.concurrency import run_in_threadpool
+from PIL import Image
+import io
+import logging
+import numpy as np
+from fast_json import FastJSONResponse
+from admission import AdmissionController, AdmissionRejected
+from tflite_pool import InterpreterPool
+import shared_utils
+from shared_utils import TENSOR_CONTENT_TYPES, decode_raw_tensor, fit_image, get_buffer_pool, import_keras_loader
+from profiling import stage
 
 # Create router
 router = APIRouter()
+logger = logging.getLogger("lab_pneumonia.fruits")
 
 # Load fruits model (adjust path as needed)
 fruits_model = None
+fruits_model_path = None  # File the loaded model came from (None for a remote model)
 fruits_class_names = ["apple", "banana", "orange"]
 
+# Input contract of the fruits model, published by GET /models/fruits/spec
+FRUITS_INPUT_SPEC = {
+    "name": "fruits",
+    "input_shape": [32, 32, 3],
+    "dtype": "uint8",
+    "layout": "HWC",
+    "color_mode": "RGB",
+    "resize": "center crop to the target aspect ratio, then LANCZOS resize (PIL ImageOps.fit)",
+    "resample": "lanczos",
+    "normalization": {"scale": 1.0, "offset": 0.0, "applied_by": "model (Rescaling layer)"},
+    "content_types": ["application/octet-stream", "application/x-npy"],
+}
+
+# Bounded in-flight inferences and queue (FRUITS_MAX_IN_FLIGHT, FRUITS_MAX_QUEUE, FRUITS_MAX_WAIT)
+fruits_admission = AdmissionController.from_env("FRUITS")
+
+# Largest number of images accepted by /fruits/predict/batch
+FRUITS_BATCH_MAX_FILES = int(os.environ.get("FRUITS_BATCH_MAX_FILES", "1024"))
+
 def load_fruits_model(model_path=None):
     """
     Load the fruits H5 model (preferred) or TFLite model (fallback)
     """
-    global fruits_model  # Declare global at the very top
-    
-    print(f"[DEBUG] load_fruits_model called. Current fruits_model: {fruits_model}")
-    print(f"[DEBUG] Function locals before: {locals().keys()}")
+    global fruits_model, fruits_model_path  # Declare global at the very top
     
     # Try H5 model first (better compatibility)
     if model_path is None:
@@ -55,32 +71,27 @@ def load_fruits_model(model_path=None):
             model_path = tflite_path
             use_h5 = False
         else:
-            print(f"Warning: Fruits model not found!")
-            print(f"  H5 path: {h5_path}")
-            print(f"  TFLite path: {tflite_path}")
-            print(f"  Current directory: {os.getcwd()}")
-            print(f"\nTo create H5 model, run: python C:\\Users\\iezze\\Downloads\\LAB\\LAB1\\labs\\02_cnn_fruits\\save_fruits_model.py")
-            fruits_model = None
+            logger.warning("Fruits model not found", extra={"fields": {
+                "h5_path": h5_path,
+                "tflite_path": tflite_path,
+                "cwd": os.getcwd(),
+                "hint": r"To create H5 model, run: python C:\Users\iezze\Downloads\LAB\LAB1\labs\02_cnn_fruits\save_fruits_model.py",
+            }})
+            fruits_model = fruits_model_path = None
             return None
     else:
         use_h5 = model_path.endswith('.h5')
     
     try:
         if use_h5:
-            # Load H5 model (like pneumonia)
-            print(f"\n{'='*60}")
-            print(f"Loading fruits H5 model from: {model_path}")
-            print(f"Model file exists: {os.path.exists(model_path)}")
-            if os.path.exists(model_path):
-                print(f"File size: {os.path.getsize(model_path) / (1024*1024):.2f} MB")
-            print(f"{'='*60}")
-            
-            if USE_TF_KERAS:
-                print("Using TensorFlow Keras to load model...")
-                loaded_model = load_model(model_path, compile=False)
-            else:
-                print("Using standalone Keras to load model...")
-                loaded_model = load_model(model_path, compile=False)
+            # Load H5 model (like pneumonia); TensorFlow is only imported here
+            load_model = import_keras_loader()
+            logger.info("Loading fruits H5 model", extra={"fields": {
+                "model_path": model_path,
+                "size_mb": round(os.path.getsize(model_path) / (1024*1024), 2) if os.path.exists(model_path) else None,
+                "loader": "tensorflow.keras" if shared_utils.USE_TF_KERAS else "keras",
+            }})
+            loaded_model = load_model(model_path, compile=False)
             
             # Explicitly set the global variable
             fruits_model = loaded_model
@@ -89,153 +100,176 @@ def load_fruits_model(model_path=None):
             import sys
             current_module = sys.modules[__name__]
             current_module.fruits_model = loaded_model
+            fruits_model_path = model_path
             
-            print(f"✓ Fruits H5 model loaded successfully!")
-            print(f"Model type: {type(fruits_model)}")
-            print(f"Model has 'predict' method: {hasattr(fruits_model, 'predict')}")
-            print(f"Global fruits_model variable set: {fruits_model is not None}")
-            print(f"[DEBUG] After assignment - fruits_model id: {id(fruits_model)}")
-            print(f"[DEBUG] After assignment - fruits_model is None: {fruits_model is None}")
-            print(f"[DEBUG] Module's fruits_model via sys.modules: {current_module.fruits_model is not None}")
-            print(f"{'='*60}\n")
+            logger.info("Fruits H5 model loaded", extra={"fields": {"model_type": type(fruits_model).__name__}})
             
             return fruits_model
         else:
-            # Load TFLite model (fallback)
-            print(f"Loading fruits TFLite model from: {model_path}")
-            interpreter = tf.lite.Interpreter(model_path=model_path)
-            interpreter.allocate_tensors()
+            # Load TFLite model (fallback): one interpreter per concurrent request
+            logger.info("Loading fruits TFLite model", extra={"fields": {"model_path": model_path}})
+            pool = InterpreterPool(model_path)
             
-            fruits_model = interpreter
+            fruits_model = pool
+            fruits_model_path = model_path
             
-            input_details = interpreter.get_input_details()
-            output_details = interpreter.get_output_details()
-            print(f"Fruits TFLite model loaded successfully!")
-            print(f"Input shape: {input_details[0]['shape']}, dtype: {input_details[0]['dtype']}")
-            print(f"Output shape: {output_details[0]['shape']}, dtype: {output_details[0]['dtype']}")
-            return interpreter
-    except Exception as e:
-        print(f"ERROR loading fruits model: {e}")
-        import traceback
-        error_trace = traceback.format_exc()
-        print(f"Full error traceback:\n{error_trace}")
-        fruits_model = None
+            logger.info("Fruits TFLite model loaded", extra={"fields": {"tflite_pool": pool.stats()}})
+            return pool
+    except Exception:
+        logger.exception("Error loading fruits model", extra={"fields": {"model_path": model_path}})
+        fruits_model = fruits_model_path = None
         return None
 
-def preprocess_fruits_image(image, target_size=(32, 32)):
+def preprocess_fruits_image(image, target_size=(32, 32), out=None):
     """
     Preprocess image for fruits model.
     The model has Rescaling(1./255) layer, so it expects raw pixel values (0-255).
+    If out is given (float32 [1, 32, 32, 3], e.g. from get_buffer_pool) the
+    pixels are written into it instead of a new array.
     """
-    # Convert to RGB if needed
-    if image.mode != 'RGB':
-        image = image.convert('RGB')
-    
-    # Resize to 32x32 (fruits model input size)
-    image = ImageOps.fit(image, target_size, Image.Resampling.LANCZOS)
-    
-    # Convert to numpy array (raw pixel values 0-255)
+    # Resize to 32x32 (fruits model input size), raw pixel values 0-255
     # The model's Rescaling layer will normalize it
-    image_array = np.asarray(image, dtype=np.float32)
+    image_array = fit_image(image, target_size)
     
-    # Reshape for model input: [1, 32, 32, 3]
-    data = np.expand_dims(image_array, axis=0)
+    # Model input: [1, 32, 32, 3] float32
+    if out is None:
+        out = np.empty((1, *image_array.shape), dtype=np.float32)
+    np.copyto(out[0], image_array, casting='unsafe')
     
-    return data
+    return out
 
 def classify_fruits_image(image):
     """
     Classify fruits image using H5 model (preferred) or TFLite model
     """
+    with get_buffer_pool(FRUITS_INPUT_SPEC["input_shape"]).buffer() as data:
+        with stage("preprocess"):
+            preprocess_fruits_image(image, out=data)
+        return classify_fruits_data(data)
+
+def classify_fruits_tensor(image_array):
+    """
+    Classify a uint8 32x32x3 tensor already resized by the client
+    """
+    with get_buffer_pool(image_array.shape).buffer() as data:
+        with stage("preprocess"):
+            np.copyto(data[0], image_array, casting='unsafe')
+        return classify_fruits_data(data)
+
+def classify_fruits_data(data):
+    """
+    Run the fruits model on a preprocessed (1, 32, 32, 3) float32 array
+    """
     if fruits_model is None:
         raise ValueError("Fruits model not loaded")
     
-    # Preprocess image
-    data = preprocess_fruits_image(image)
-    
-    # Check if it's H5 model or TFLite
-    if hasattr(fruits_model, 'predict'):
-        # H5 Keras model
+    # H5 Keras model or TFLite interpreter pool (same predict API)
+    with stage("inference"):
         prediction = fruits_model.predict(data, verbose=0)
-        # Model outputs logits, apply softmax
-        exp_predictions = np.exp(prediction[0] - np.max(prediction[0]))
-        probabilities = exp_predictions / np.sum(exp_predictions)
-        
-        # Get top prediction
-        top_index = np.argmax(probabilities)
-        class_name = fruits_class_names[top_index]
-        confidence = float(probabilities[top_index])
-        
-        print(f"Fruits prediction: {class_name} ({confidence*100:.2f}%)")
-        return class_name, confidence
+    # Model outputs logits, apply softmax
+    probabilities = softmax_rows(prediction)[0]
+    
+    # Get top prediction
+    top_index = np.argmax(probabilities)
+    class_name = fruits_class_names[top_index]
+    confidence = float(probabilities[top_index])
+    
+    logger.debug("Fruits prediction", extra={
+        "route": "/fruits/predict",
+        "fields": {"prediction": class_name, "confidence": round(confidence, 4)},
+    })
+    return class_name, confidence
+
+def softmax_rows(logits):
+    """
+    Row-wise softmax of a (n, classes) logits matrix
+    """
+    probabilities = np.asarray(logits, dtype=np.float32).reshape(len(logits), -1)
+    probabilities = probabilities - probabilities.max(axis=1, keepdims=True)
+    np.exp(probabilities, out=probabilities)
+    probabilities /= probabilities.sum(axis=1, keepdims=True)
+    return probabilities
+
+def top_k_rows(probabilities, k):
+    """
+    Indices of the k largest values of each row, sorted by decreasing value
+    """
+    k = min(k, probabilities.shape[1])
+    if k < probabilities.shape[1]:
+        candidates = np.argpartition(-probabilities, k - 1, axis=1)[:, :k]
     else:
-        # TFLite model
-        input_details = fruits_model.get_input_details()
-        output_details = fruits_model.get_output_details()
-        
-        # Set input tensor
-        fruits_model.set_tensor(input_details[0]['index'], data)
-        
-        # Run inference
-        fruits_model.invoke()
-        
-        # Get output
-        output_data = fruits_model.get_tensor(output_details[0]['index'])
-        predictions = output_data[0] if len(output_data.shape) > 1 else output_data
-        
-        # Apply softmax to get probabilities
-        exp_predictions = np.exp(predictions - np.max(predictions))
-        probabilities = exp_predictions / np.sum(exp_predictions)
-        
-        # Get top prediction
-        top_index = np.argmax(probabilities)
-        class_name = fruits_class_names[top_index]
-        confidence = float(probabilities[top_index])
-        
-        print(f"Fruits prediction: {class_name} ({confidence*100:.2f}%)")
-        return class_name, confidence
+        candidates = np.broadcast_to(np.arange(k), probabilities.shape)
+    order = np.argsort(-np.take_along_axis(probabilities, candidates, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=1)
+
+def decode_fruits_image(contents, target_size=(32, 32)):
+    """
+    Decode an uploaded image and fit it to the model input right away, so
+    only the small uint8 array outlives the call (not the full-size image).
+    Used by both /fruits/predict and /fruits/predict/batch: the same upload
+    always gives the model the same pixels.
+    """
+    with Image.open(io.BytesIO(contents)) as image:
+        return fit_image(image, target_size)
+
+def classify_fruits_batch(images, top_k=1):
+    """
+    Classify many images with one forward pass
+    
+    Parameters:
+        images (list): uint8 (32, 32, 3) arrays, see decode_fruits_image
+        top_k (int): Number of classes returned per image
+    
+    Returns:
+        tuple: (top indices (n, k), top probabilities (n, k))
+    """
+    if fruits_model is None:
+        raise ValueError("Fruits model not loaded")
+    
+    # Preprocess every image into one pooled (n, 32, 32, 3) tensor
+    bucket = 1 << max(len(images) - 1, 0).bit_length()
+    with get_buffer_pool(FRUITS_INPUT_SPEC["input_shape"], bucket).buffer() as buffer:
+        data = buffer[:len(images)]
+        for row, image_array in zip(data, images):
+            np.copyto(row, image_array, casting='unsafe')
+        prediction = fruits_model.predict(data, verbose=0)
+    
+    probabilities = softmax_rows(prediction)
+    indices = top_k_rows(probabilities, top_k)
+    return indices, np.take_along_axis(probabilities, indices, axis=1)
 
 @router.get("/fruits/status")
 async def fruits_status():
-    """Check fruits model status"""
-    global fruits_model  # Make sure we're reading the global variable
-    h5_path = r"C:\Users\iezze\Downloads\LAB\LAB1\labs\02_cnn_fruits\fruits_classifier.h5"
-    tflite_path = r"C:\Users\iezze\Downloads\LAB\LAB1\labs\02_cnn_fruits\model.tflite"
-    
-    # Debug: Print current state
-    print(f"\n[DEBUG] Status check - fruits_model is None: {fruits_model is None}")
-    print(f"[DEBUG] fruits_model type: {type(fruits_model)}")
-    print(f"[DEBUG] fruits_model value: {fruits_model}")
+    """Check fruits model status (describes the model actually being served)"""
+    from inference_server import RemoteModel
     
-    # Determine model type
-    model_type = None
-    if fruits_model is not None:
-        if hasattr(fruits_model, 'predict'):
-            model_type = "H5"
-        else:
-            model_type = "TFLite"
+    if fruits_model is None:
+        model_type = None
+    elif isinstance(fruits_model, InterpreterPool):
+        model_type = "TFLite"
+    elif isinstance(fruits_model, RemoteModel):
+        model_type = "remote"
+    else:
+        model_type = "H5"
     
     return {
         "model_loaded": fruits_model is not None,
         "model_type": model_type,
+        "model_path": fruits_model_path,
         "class_names": fruits_class_names,
-        "h5_path": h5_path,
-        "h5_exists": os.path.exists(h5_path),
-        "tflite_path": tflite_path,
-        "tflite_exists": os.path.exists(tflite_path),
-        "model_object": str(type(fruits_model)) if fruits_model is not None else None,
-        "debug_fruits_model_is_none": fruits_model is None,
-        "debug_fruits_model_type": str(type(fruits_model)),
-        "note": "Check server console for loading errors if model_loaded is false"
+        "admission": fruits_admission.stats(),
+        "tflite_pool": fruits_model.stats() if isinstance(fruits_model, InterpreterPool) else None,
     }
 
 @router.post("/fruits/predict")
-async def predict_fruits(file: UploadFile = File(...)):
+async def predict_fruits(request: Request, file: Optional[UploadFile] = File(None)):
     """
     Predict fruit type from image.
     
     Parameters:
-        file: Uploaded image file (JPEG, PNG, etc.)
+        file: Uploaded image file (JPEG, PNG, etc.), or instead a request body
+            with a 32x32x3 uint8 tensor (application/octet-stream raw bytes or
+            application/x-npy), see GET /models/fruits/spec
     
     Returns:
         JSON response with prediction results
@@ -249,46 +283,146 @@ async def predict_fruits(file: UploadFile = File(...)):
     
     # Use module reference if global is None
     if fruits_model is None and module_fruits_model is not None:
-        print("[DEBUG] Global fruits_model is None, but module has it. Using module reference.")
+        logger.debug("Global fruits_model is None, using the module reference")
         fruits_model = module_fruits_model
     
     if fruits_model is None:
         raise HTTPException(
             status_code=503, 
-            detail="Fruits model not loaded. Check /fruits/status for details. Model loading may have failed - check server console."
+            detail="Fruits model not loaded. Check /fruits/status for details. Model loading may have failed - check server logs."
         )
     
-    # Validate file type
-    if not file.content_type.startswith('image/'):
-        raise HTTPException(status_code=400, detail="File must be an image")
-    
-    try:
+    if request.headers.get("content-type", "").startswith(TENSOR_CONTENT_TYPES):
+        # Tensor already resized by the client: no image decoding
+        try:
+            body = await request.body()
+            with stage("decode"):
+                image_array = decode_raw_tensor(body, FRUITS_INPUT_SPEC["input_shape"])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        filename = None
+        
+        def classify():
+            return classify_fruits_tensor(image_array)
+    else:
+        # Validate file type
+        if file is None:
+            raise HTTPException(status_code=400, detail="No file provided")
+        if not file.content_type.startswith('image/'):
+            raise HTTPException(status_code=400, detail="File must be an image")
+        
         # Read image file
         contents = await file.read()
-        image = Image.open(io.BytesIO(contents))
+        filename = file.filename
         
-        print(f"Image size: {image.size}, mode: {image.mode}")
-        
-        # Classify image
-        class_name, confidence_score = classify_fruits_image(image)
+        def classify():
+            with stage("decode"):
+                image_array = decode_fruits_image(contents, tuple(FRUITS_INPUT_SPEC["input_shape"][:2]))
+            return classify_fruits_tensor(image_array)
+    
+    try:
+        async with fruits_admission.admit() as queue_wait_ms:
+            # Client gone while queued: skip the inference
+            if await request.is_disconnected():
+                return Response(status_code=499)
+            class_name, confidence_score = await run_in_threadpool(classify)
         
         # Return results
-        return JSONResponse({
+        return FastJSONResponse({
             "success": True,
             "prediction": class_name,
             "confidence": round(confidence_score, 4),
             "confidence_percentage": round(confidence_score * 100, 2),
-            "filename": file.filename
+            "filename": filename,
+            "queue_wait_ms": round(queue_wait_ms, 2)
+        }, headers={"X-Queue-Wait-Ms": f"{queue_wait_ms:.2f}"})
+    
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=e.headers)
+    except (TimeoutError, ConnectionError) as e:
+        # Inference server (or interpreter pool) saturated or unreachable
+        logger.warning("Inference unavailable", extra={"route": "/fruits/predict", "fields": {"error": str(e)}})
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except Exception as e:
+        # The traceback goes to the logs only, never into the response body
+        logger.exception("Error in fruits prediction", extra={
+            "route": "/fruits/predict",
+            "fields": {"filename": filename},
         })
+        raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
+
+@router.post("/fruits/predict/batch")
+async def predict_fruits_batch(
+    files: List[UploadFile] = File(...),
+    top_k: int = Query(1, ge=1, description="Number of classes returned per image")
+):
+    """
+    Predict fruit types for many images with a single forward pass.
+    
+    Parameters:
+        files: Uploaded image files
+        top_k: Number of most likely classes returned per image
+    
+    Returns:
+        JSON response with one result per file, in upload order
+    """
+    if fruits_model is None:
+        raise HTTPException(status_code=503, detail="Fruits model not loaded. Check /fruits/status for details.")
+    if len(files) > FRUITS_BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"Too many files (max {FRUITS_BATCH_MAX_FILES})")
+    
+    uploads = [(file.filename, file.content_type, await file.read()) for file in files]
+    
+    def classify_all():
+        results = [None] * len(uploads)
+        images, positions = [], []
+        for position, (filename, content_type, contents) in enumerate(uploads):
+            if not content_type.startswith('image/'):
+                results[position] = {"filename": filename, "success": False, "error": "File must be an image"}
+                continue
+            try:
+                image_array = decode_fruits_image(contents, tuple(FRUITS_INPUT_SPEC["input_shape"][:2]))
+            except Exception as e:
+                results[position] = {"filename": filename, "success": False, "error": str(e)}
+                continue
+            images.append(image_array)
+            positions.append(position)
+            uploads[position] = (filename, content_type, None)  # encoded bytes no longer needed
+        
+        if images:
+            indices, probabilities = classify_fruits_batch(images, top_k)
+            for position, row_indices, row_probabilities in zip(positions, indices.tolist(), probabilities.tolist()):
+                results[position] = {
+                    "filename": uploads[position][0],
+                    "success": True,
+                    "prediction": fruits_class_names[row_indices[0]],
+                    "confidence": round(row_probabilities[0], 4),
+                    "confidence_percentage": round(row_probabilities[0] * 100, 2),
+                    "top_k": [
+                        {"label": fruits_class_names[index], "confidence": round(probability, 4)}
+                        for index, probability in zip(row_indices, row_probabilities)
+                    ]
+                }
+        return results
     
+    try:
+        # One forward pass in one inference slot; admission counts it as len(uploads) inferences
+        async with fruits_admission.admit(units=max(len(uploads), 1)) as queue_wait_ms:
+            results = await run_in_threadpool(classify_all)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=e.headers)
+    except (TimeoutError, ConnectionError) as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
-        import traceback
-        error_details = traceback.format_exc()
-        print(f"Error in fruits prediction: {error_details}")
-        raise HTTPException(
-            status_code=500, 
-            detail=f"Error processing image: {str(e)}\n\nDetails: {error_details}"
-        )
+        raise HTTPException(status_code=500, detail=f"Error processing images: {str(e)}")
+    
+    return FastJSONResponse({
+        "success": True,
+        "total_files": len(uploads),
+        "top_k": min(top_k, len(fruits_class_names)),
+        "results": results,
+        "queue_wait_ms": round(queue_wait_ms, 2)
+    }, headers={"X-Queue-Wait-Ms": f"{queue_wait_ms:.2f}"})
 
 # Don't load model at import - let startup event handle it
 # This prevents errors during import and allows better error handling
@@ -3,27 +3,47 @@ FastAPI Deployment for Pneumonia Classification
 Provides REST API endpoints for image classification
 """
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from typing import Optional
 from fastapi.middleware.cors import CORSMiddleware
 from PIL import Image
 import io
+import logging
 import sys
 import os
 
 # Add parent directory to path to import shared_utils
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from shared_utils import load_pneumonia_model, load_class_names, classify_image
+# Thread counts first: numpy reads them when it is loaded
+import runtime_config
+runtime_config.apply()
+from shared_utils import (
+    load_pneumonia_version, load_class_names, classify_image, classify_tensor,
+    decode_raw_tensor, default_pneumonia_model_path, pneumonia_indices,
+    PNEUMONIA_INPUT_SPEC, TENSOR_CONTENT_TYPES
+)
+from fast_json import FastJSONResponse
+from compression import CompressionMiddleware
+from admission import AdmissionController, AdmissionRejected
+from inference_server import INFERENCE_SERVER_ADDRESS, remote_model
+from structured_logging import setup_logging, RequestLoggingMiddleware
+from model_manager import ModelManager
+from profiling import ProfilingMiddleware, stage
+from cascade import CascadeModel, CASCADE_STAGE1
+from admin import router as admin_router, is_admin_token
+
+# JSON logs written by a background thread (LOG_LEVEL, LOG_SAMPLE_RATES)
+setup_logging()
+logger = logging.getLogger("lab_pneumonia.api")
 
 # Import fruits endpoint
 try:
     import fruits_endpoint
     from fruits_endpoint import router as fruits_router, load_fruits_model
     FRUITS_AVAILABLE = True
-    print("✓ Fruits endpoint module imported successfully")
 except ImportError as e:
-    print(f"Warning: Fruits endpoint not available. Error: {e}")
-    print("Install fruits_endpoint.py to enable fruits classification.")
+    logger.warning("Fruits endpoint not available", extra={"fields": {"error": str(e)}})
     FRUITS_AVAILABLE = False
     fruits_endpoint = None
 
@@ -31,17 +51,16 @@ except ImportError as e:
 app = FastAPI(
     title="Image Classification API",
     description="API for classifying images: Pneumonia (chest X-rays) and Fruits",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
 
 # Include fruits router if available
 if FRUITS_AVAILABLE:
     app.include_router(fruits_router)
-    print("✓ Fruits endpoint enabled at /fruits/predict")
-    print(f"[DEBUG] fruits_endpoint module: {fruits_endpoint}")
-    print(f"[DEBUG] fruits_endpoint.fruits_model before startup: {fruits_endpoint.fruits_model if hasattr(fruits_endpoint, 'fruits_model') else 'NOT FOUND'}")
-else:
-    print("✗ Fruits endpoint NOT available")
+
+# Runtime configuration (X-Admin-Token header, ADMIN_TOKEN env)
+app.include_router(admin_router)
 
 # Enable CORS
 app.add_middleware(
@@ -52,68 +71,76 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large responses (batch results) for clients on slow networks
+app.add_middleware(
+    CompressionMiddleware,
+    route_levels={
+        "/predict/batch": {"gzip": 6, "br": 5, "zstd": 6},
+        "/fruits/predict/batch": {"gzip": 6, "br": 5, "zstd": 6},
+    },
+)
+
+# Per-request stage breakdown for admins (X-Profile: 1 + X-Admin-Token)
+app.add_middleware(ProfilingMiddleware, authorize=is_admin_token)
+
+# One access log record per request, sampled per route
+app.add_middleware(RequestLoggingMiddleware)
+
 # Load model and class names at startup
 model = None
 class_names = None
 
+# Serving version of the pneumonia model, hot-swappable through /admin/models
+# or by replacing the model file when PNEUMONIA_MODEL_WATCH_INTERVAL is set
+pneumonia_models = ModelManager(
+    "pneumonia", load_pneumonia_version, PNEUMONIA_INPUT_SPEC["input_shape"],
+    agreement=lambda primary, candidate: pneumonia_indices(primary) == pneumonia_indices(candidate),
+)
+MODEL_WATCH_INTERVAL = float(os.environ.get("PNEUMONIA_MODEL_WATCH_INTERVAL", "0"))
+
+# Bounded in-flight inferences and queue (PNEUMONIA_MAX_IN_FLIGHT, PNEUMONIA_MAX_QUEUE, PNEUMONIA_MAX_WAIT)
+pneumonia_admission = AdmissionController.from_env("PNEUMONIA")
+
 @app.on_event("startup")
 async def load_model():
     """Load the models and class names when the application starts."""
     global model, class_names
     try:
-        # Load pneumonia model
-        model = load_pneumonia_model()
+        # Load pneumonia model (proxy to the shared inference process when
+        # INFERENCE_SERVER_ADDRESS is set, see inference_server.py)
+        if INFERENCE_SERVER_ADDRESS:
+            pneumonia_models.set(remote_model("pneumonia"), INFERENCE_SERVER_ADDRESS)
+        else:
+            model_path = default_pneumonia_model_path()
+            pneumonia_models.set(load_pneumonia_version(model_path), model_path)
+            if MODEL_WATCH_INTERVAL > 0:
+                pneumonia_models.watch(model_path, MODEL_WATCH_INTERVAL)
+        # Requests go through the manager, which always runs the serving version
+        model = pneumonia_models
+        if CASCADE_STAGE1:
+            # Cheap first stage, the full model only sees uncertain images
+            model = CascadeModel("pneumonia", load_pneumonia_version(CASCADE_STAGE1), pneumonia_models)
         class_names = load_class_names()
-        print("Pneumonia model loaded successfully!")
+        logger.info("Pneumonia model loaded", extra={"fields": {"remote": bool(INFERENCE_SERVER_ADDRESS)}})
         
         # Load fruits model if available
         if FRUITS_AVAILABLE and fruits_endpoint is not None:
             try:
-                print("\n" + "="*60)
-                print("="*60)
-                print("LOADING FRUITS MODEL IN STARTUP EVENT")
-                print("="*60)
-                print(f"[DEBUG] FRUITS_AVAILABLE: {FRUITS_AVAILABLE}")
-                print(f"[DEBUG] fruits_endpoint module exists: {fruits_endpoint is not None}")
-                print(f"[DEBUG] load_fruits_model function: {load_fruits_model}")
-                print("="*60)
-                
-                result = load_fruits_model()
-                
-                # Also check the module's global variable directly
-                print(f"\n[DEBUG] After load_fruits_model() call:")
-                print(f"  - Result is None: {result is None}")
-                print(f"  - Result type: {type(result)}")
-                print(f"  - fruits_endpoint.fruits_model is None: {fruits_endpoint.fruits_model is None}")
-                print(f"  - fruits_endpoint.fruits_model type: {type(fruits_endpoint.fruits_model)}")
+                if INFERENCE_SERVER_ADDRESS:
+                    result = fruits_endpoint.fruits_model = remote_model("fruits")
+                else:
+                    result = load_fruits_model()
                 
                 if result is None:
-                    print("="*60)
-                    print("⚠️  WARNING: Fruits model failed to load!")
-                    print("Check error messages above for details.")
-                    print("="*60)
+                    logger.warning("Fruits model failed to load, see the previous log records")
                 else:
-                    print("="*60)
-                    print("✅ Fruits model loaded successfully in startup event!")
-                    print(f"Model type: {type(result)}")
-                    print(f"Module's fruits_model variable: {fruits_endpoint.fruits_model is not None}")
-                    print("="*60)
-            except Exception as e:
-                print("="*60)
-                print(f"❌ ERROR: Failed to load fruits model in startup!")
-                print(f"Error: {e}")
-                print("="*60)
-                import traceback
-                traceback.print_exc()
-                print("="*60)
+                    logger.info("Fruits model loaded", extra={"fields": {"model_type": type(result).__name__}})
+            except Exception:
+                logger.exception("Failed to load fruits model in startup")
         else:
-            print("\n" + "="*60)
-            print("⚠️  Fruits model NOT being loaded:")
-            print(f"  FRUITS_AVAILABLE: {FRUITS_AVAILABLE}")
-            print(f"  fruits_endpoint is None: {fruits_endpoint is None}")
-            print("="*60 + "\n")
-    except Exception as e:
-        print(f"Error loading model: {e}")
+            logger.warning("Fruits model not loaded: fruits endpoint not available")
+    except Exception:
+        logger.exception("Error loading model")
         raise
 
 
@@ -127,7 +154,9 @@ async def root():
             "/": "API information",
             "/health": "Health check",
             "/predict": "Classify chest X-ray image (POST)",
+            "/models/{name}/spec": "Model input spec for pre-resized tensor uploads",
             "/fruits/predict": "Classify fruit image (POST)" if FRUITS_AVAILABLE else "Not available",
+            "/fruits/predict/batch": "Classify many fruit images in one forward pass (POST)" if FRUITS_AVAILABLE else "Not available",
             "/docs": "Interactive API documentation"
         }
     }
@@ -138,51 +167,112 @@ async def health_check():
     """Health check endpoint."""
     return {
         "status": "healthy",
-        "model_loaded": model is not None
+        "model_loaded": model is not None,
+        "model_version": pneumonia_models.current.version if pneumonia_models.current else None,
+        "cascade": model.stats() if isinstance(model, CascadeModel) else None,
+        "runtime": runtime_config.describe(),
+        "admission": pneumonia_admission.stats()
     }
 
 
+@app.get("/models/{name}/spec")
+async def model_spec(name: str):
+    """
+    Input spec of a model: shape, dtype and normalization expected by the
+    predict endpoints when the client sends a pre-resized uint8 tensor.
+    """
+    specs = {"pneumonia": PNEUMONIA_INPUT_SPEC}
+    if FRUITS_AVAILABLE:
+        specs["fruits"] = fruits_endpoint.FRUITS_INPUT_SPEC
+    if name not in specs:
+        raise HTTPException(status_code=404, detail=f"Unknown model '{name}'. Available: {', '.join(specs)}")
+    return FastJSONResponse(specs[name], headers={"Cache-Control": "public, max-age=3600"})
+
+
+def classify_bytes(contents):
+    """Decode and classify one image (runs in the threadpool)."""
+    with stage("decode"):
+        image = Image.open(io.BytesIO(contents))
+        image.load()
+    return classify_image(image, model, class_names)
+
+
+def classify_tensor_array(image_array):
+    """Classify a pre-resized uint8 tensor (runs in the threadpool)."""
+    return classify_tensor(image_array, model, class_names)
+
+
 @app.post("/predict")
-async def predict(file: UploadFile = File(...)):
+async def predict(request: Request, file: Optional[UploadFile] = File(None)):
     """
     Predict pneumonia from chest X-ray image.
     
     Parameters:
-        file: Uploaded image file (JPEG, PNG, etc.)
+        file: Uploaded image file (JPEG, PNG, etc.), or instead a request body
+            with a 224x224x3 uint8 tensor (application/octet-stream raw bytes or
+            application/x-npy), see GET /models/pneumonia/spec
     
     Returns:
-        JSON response with prediction results
+        JSON response with prediction results. Returns 429/503 with
+        Retry-After when the model is overloaded.
     """
     if model is None or class_names is None:
         raise HTTPException(status_code=503, detail="Model not loaded")
     
-    # Validate file type
-    if not file.content_type.startswith('image/'):
-        raise HTTPException(status_code=400, detail="File must be an image")
+    if request.headers.get("content-type", "").startswith(TENSOR_CONTENT_TYPES):
+        # Tensor already resized by the client: no image decoding
+        try:
+            body = await request.body()
+            with stage("decode"):
+                image_array = decode_raw_tensor(body, PNEUMONIA_INPUT_SPEC["input_shape"])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        filename = None
+        classify, argument = classify_tensor_array, image_array
+    else:
+        # Validate file type
+        if file is None:
+            raise HTTPException(status_code=400, detail="No file provided")
+        if not file.content_type.startswith('image/'):
+            raise HTTPException(status_code=400, detail="File must be an image")
+        
+        # Read image file
+        filename = file.filename
+        classify, argument = classify_bytes, await file.read()
     
     try:
-        # Read image file
-        contents = await file.read()
-        image = Image.open(io.BytesIO(contents))
-        
-        # Classify image
-        class_name, confidence_score = classify_image(image, model, class_names)
+        async with pneumonia_admission.admit() as queue_wait_ms:
+            # Client gone while queued: skip the inference
+            if await request.is_disconnected():
+                return Response(status_code=499)
+            class_name, confidence_score = await run_in_threadpool(classify, argument)
         
         # Return results
-        return JSONResponse({
+        return FastJSONResponse({
             "success": True,
             "prediction": class_name,
             "confidence": round(confidence_score, 4),
             "confidence_percentage": round(confidence_score * 100, 2),
-            "filename": file.filename
-        })
+            "filename": filename,
+            "queue_wait_ms": round(queue_wait_ms, 2)
+        }, headers={"X-Queue-Wait-Ms": f"{queue_wait_ms:.2f}"})
     
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=e.headers)
+    except (TimeoutError, ConnectionError) as e:
+        # Inference server (or interpreter pool) saturated or unreachable
+        logger.warning("Inference unavailable", extra={"route": "/predict", "fields": {"error": str(e)}})
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
+        logger.exception("Error in pneumonia prediction", extra={
+            "route": "/predict",
+            "fields": {"filename": filename},
+        })
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
 
 
 @app.post("/predict/batch")
-async def predict_batch(files: list[UploadFile] = File(...)):
+async def predict_batch(request: Request, files: list[UploadFile] = File(...)):
     """
     Predict pneumonia from multiple chest X-ray images.
     
@@ -195,41 +285,51 @@ async def predict_batch(files: list[UploadFile] = File(...)):
     if model is None or class_names is None:
         raise HTTPException(status_code=503, detail="Model not loaded")
     
-    results = []
+    uploads = [(file.filename, file.content_type, await file.read()) for file in files]
     
-    for file in files:
-        if not file.content_type.startswith('image/'):
-            results.append({
-                "filename": file.filename,
-                "success": False,
-                "error": "File must be an image"
-            })
-            continue
-        
-        try:
-            contents = await file.read()
-            image = Image.open(io.BytesIO(contents))
-            class_name, confidence_score = classify_image(image, model, class_names)
+    def classify_all():
+        results = []
+        for filename, content_type, contents in uploads:
+            if not content_type.startswith('image/'):
+                results.append({
+                    "filename": filename,
+                    "success": False,
+                    "error": "File must be an image"
+                })
+                continue
             
-            results.append({
-                "filename": file.filename,
-                "success": True,
-                "prediction": class_name,
-                "confidence": round(confidence_score, 4),
-                "confidence_percentage": round(confidence_score * 100, 2)
-            })
-        except Exception as e:
-            results.append({
-                "filename": file.filename,
-                "success": False,
-                "error": str(e)
-            })
+            try:
+                class_name, confidence_score = classify_bytes(contents)
+                results.append({
+                    "filename": filename,
+                    "success": True,
+                    "prediction": class_name,
+                    "confidence": round(confidence_score, 4),
+                    "confidence_percentage": round(confidence_score * 100, 2)
+                })
+            except Exception as e:
+                results.append({
+                    "filename": filename,
+                    "success": False,
+                    "error": str(e)
+                })
+        return results
+    
+    # The batch runs sequentially in one inference slot; admission counts it as len(uploads) inferences
+    try:
+        async with pneumonia_admission.admit(units=len(uploads)) as queue_wait_ms:
+            if await request.is_disconnected():
+                return Response(status_code=499)
+            results = await run_in_threadpool(classify_all)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=e.headers)
     
-    return JSONResponse({
+    return FastJSONResponse({
         "success": True,
         "total_files": len(files),
-        "results": results
-    })
+        "results": results,
+        "queue_wait_ms": round(queue_wait_ms, 2)
+    }, headers={"X-Queue-Wait-Ms": f"{queue_wait_ms:.2f}"})
 
 
 if __name__ == "__main__":
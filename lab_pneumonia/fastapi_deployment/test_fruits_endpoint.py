@@ -0,0 +1,108 @@
+"""
+Tests for fruits_endpoint.py: /fruits/predict and /fruits/predict/batch
+must classify the same upload identically.
+
+Run with: python -m pytest test_fruits_endpoint.py
+"""
+
+import io
+import os
+import sys
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from PIL import Image
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import fruits_endpoint
+
+FRUITS_TFLITE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "appcontrole", "assets", "model", "fruits_classifier.tflite",
+)
+
+
+class PixelModel:
+    """Fake model whose logits depend on every pixel: any decoding difference shows"""
+
+    def predict(self, data, verbose=0):
+        data = np.asarray(data, dtype=np.float64)
+        return np.stack([data.mean(axis=(1, 2, 3)) / 16, data[..., 0].std(axis=(1, 2)) / 16,
+                         data[..., 2].mean(axis=(1, 2)) / 16], axis=1)
+
+
+@pytest.fixture
+def pixel_client(monkeypatch):
+    monkeypatch.setattr(fruits_endpoint, "fruits_model", PixelModel())
+    app = FastAPI()
+    app.include_router(fruits_endpoint.router)
+    return TestClient(app)
+
+
+@pytest.fixture(scope="module")
+def client():
+    if fruits_endpoint.load_fruits_model(FRUITS_TFLITE) is None:
+        pytest.skip("fruits model not available (TensorFlow or tflite_runtime required)")
+    app = FastAPI()
+    app.include_router(fruits_endpoint.router)
+    return TestClient(app)
+
+
+def jpeg(seed, size=(640, 480)):
+    # Large, detailed JPEG: a reduced-scale decode would change the 32x32 pixels
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, (size[1] // 8, size[0] // 8, 3), dtype=np.uint8)
+    image = Image.fromarray(pixels).resize(size, Image.BILINEAR)
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def predict_both(client, uploads):
+    single = []
+    for index, contents in enumerate(uploads):
+        response = client.post("/fruits/predict", files={"file": (f"{index}.jpg", contents, "image/jpeg")})
+        assert response.status_code == 200
+        single.append(response.json())
+    response = client.post("/fruits/predict/batch", files=[
+        ("files", (f"{index}.jpg", contents, "image/jpeg")) for index, contents in enumerate(uploads)
+    ])
+    assert response.status_code == 200
+    return single, response.json()["results"]
+
+
+def test_batch_and_single_paths_feed_the_same_pixels(pixel_client):
+    single, batched = predict_both(pixel_client, [jpeg(seed) for seed in range(4)])
+    for one, other in zip(single, batched):
+        assert other["prediction"] == one["prediction"]
+        assert other["confidence"] == one["confidence"]
+
+
+def test_batch_and_single_predictions_agree(client):
+    single, results = predict_both(client, [jpeg(seed) for seed in range(4)])
+    for one, batched in zip(single, results):
+        assert batched["prediction"] == one["prediction"]
+        assert batched["confidence"] == pytest.approx(one["confidence"], abs=1e-4)
+
+
+def test_single_path_matches_on_device_tensor(client):
+    # The app uploads ImageOps.fit(..., LANCZOS) pixels: same result as the image upload
+    contents = jpeg(7)
+    with Image.open(io.BytesIO(contents)) as image:
+        tensor = fruits_endpoint.fit_image(image, (32, 32))
+    by_image = client.post("/fruits/predict", files={"file": ("a.jpg", contents, "image/jpeg")}).json()
+    by_tensor = client.post("/fruits/predict", content=tensor.tobytes(),
+                            headers={"Content-Type": "application/octet-stream"}).json()
+    assert by_tensor["prediction"] == by_image["prediction"]
+    assert by_tensor["confidence"] == by_image["confidence"]
+
+
+def test_status_describes_the_loaded_model(client):
+    status = client.get("/fruits/status").json()
+    assert status["model_loaded"] is True
+    assert status["model_type"] == "TFLite"
+    assert status["model_path"] == FRUITS_TFLITE
+    assert status["tflite_pool"]["input_shape"] == fruits_endpoint.FRUITS_INPUT_SPEC["input_shape"]
+    assert not any(key.startswith("debug") or key.endswith("_exists") for key in status)
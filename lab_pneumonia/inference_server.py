@@ -0,0 +1,500 @@
+"""
+Dedicated inference process shared by several HTTP workers.
+
+With `uvicorn --workers N` every worker would otherwise load its own copy of
+the models. In this optional architecture the HTTP workers only decode and
+preprocess images; one inference process owns the models and batches the
+requests of all workers together.
+
+Tensors never go through pickle: each worker connection gets a
+shared-memory ring of slots per model (input tensor + output vector). The
+worker writes the preprocessed tensor into a free slot and sends only the
+slot index; the server copies the slots of all pending requests into one
+batch, runs the model once and writes each output back into its slot.
+
+The channel uses multiprocessing.connection, which unpickles every message:
+a peer that knows the authkey can run code in the other process. There is
+no default key: INFERENCE_SERVER_AUTHKEY must be set to the same random
+secret on both sides, and the address must stay on loopback or a Unix
+socket (the server refuses other hosts).
+
+The inference process can be restarted on its own: requests in flight fail
+with ConnectionError (503 on the HTTP side) and the workers reconnect on
+the next request, backing off while the server is down
+(INFERENCE_SERVER_RECONNECT_SECONDS, INFERENCE_SERVER_RECONNECT_MAX_SECONDS).
+
+Usage:
+    export INFERENCE_SERVER_AUTHKEY=$(python -c "import secrets; print(secrets.token_hex(32))")
+
+    # Inference process
+    python inference_server.py --address 127.0.0.1:6010
+
+    # HTTP workers
+    INFERENCE_SERVER_ADDRESS=127.0.0.1:6010 uvicorn main:app --workers 4
+"""
+
+import argparse
+import os
+import queue
+import threading
+import time
+from multiprocessing import AuthenticationError, resource_tracker
+from multiprocessing.connection import Client, Listener
+from multiprocessing.shared_memory import SharedMemory
+
+import runtime_config
+
+runtime_config.apply()  # BLAS/TF thread counts, before numpy is imported
+
+import numpy as np
+
+INFERENCE_SERVER_ADDRESS = os.environ.get("INFERENCE_SERVER_ADDRESS")
+INFERENCE_SERVER_AUTHKEY = os.environ.get("INFERENCE_SERVER_AUTHKEY", "").encode()
+# After a failed (re)connection, wait this long before the next attempt (doubled up to the max)
+INFERENCE_SERVER_RECONNECT_SECONDS = float(os.environ.get("INFERENCE_SERVER_RECONNECT_SECONDS", "0.5"))
+INFERENCE_SERVER_RECONNECT_MAX_SECONDS = float(os.environ.get("INFERENCE_SERVER_RECONNECT_MAX_SECONDS", "30"))
+
+LOOPBACK_HOSTS = ("127.0.0.1", "::1", "localhost")
+
+# Model name -> input shape of one sample (HWC, float32)
+MODEL_INPUT_SHAPES = {
+    "pneumonia": (224, 224, 3),
+    "fruits": (32, 32, 3),
+}
+
+
+def parse_address(address):
+    """"host:port" -> (host, port); anything else is a Unix socket path."""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit():
+        return (host or "127.0.0.1", int(port))
+    return address
+
+
+def require_authkey(authkey=None):
+    """The shared secret of the channel; refuses to run without one."""
+    authkey = authkey or INFERENCE_SERVER_AUTHKEY
+    if not authkey:
+        raise RuntimeError(
+            "INFERENCE_SERVER_AUTHKEY must be set to a random secret shared by the "
+            "inference server and the HTTP workers"
+        )
+    return authkey
+
+
+# ==================== MODEL LOADING ====================
+
+def _load_pneumonia():
+    from shared_utils import load_pneumonia_model
+
+    model = load_pneumonia_model()
+    return lambda batch: model.predict(batch, verbose=0)
+
+
+def _load_fruits():
+    import sys
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "fastapi_deployment"))
+    import fruits_endpoint
+
+    model = fruits_endpoint.load_fruits_model(os.environ.get("FRUITS_MODEL_PATH"))
+    if model is None:
+        raise RuntimeError("Fruits model could not be loaded")
+    # Keras model or TFLite InterpreterPool
+    return lambda batch: model.predict(batch, verbose=0)
+
+
+MODEL_LOADERS = {
+    "pneumonia": _load_pneumonia,
+    "fruits": _load_fruits,
+}
+
+
+# ==================== SHARED MEMORY RING ====================
+
+class SlotRing:
+    """
+    Shared-memory array of slots for one model: inputs (slots, *input_shape)
+    followed by outputs (slots, output_size), both float32.
+    """
+
+    def __init__(self, shm, slots, input_shape, output_size):
+        self.shm = shm
+        self.slots = slots
+        self.input_shape = tuple(input_shape)
+        self.output_size = output_size
+        input_count = slots * int(np.prod(input_shape))
+        self.inputs = np.ndarray((slots, *input_shape), dtype=np.float32, buffer=shm.buf)
+        self.outputs = np.ndarray(
+            (slots, output_size), dtype=np.float32, buffer=shm.buf, offset=input_count * 4
+        )
+
+    @classmethod
+    def create(cls, slots, input_shape, output_size):
+        size = 4 * slots * (int(np.prod(input_shape)) + output_size)
+        return cls(SharedMemory(create=True, size=size), slots, input_shape, output_size)
+
+    @classmethod
+    def attach(cls, name, slots, input_shape, output_size):
+        try:
+            shm = SharedMemory(name=name, track=False)
+        except TypeError:  # Python < 3.13: the creator owns the segment, do not track it here
+            shm = SharedMemory(name=name)
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return cls(shm, slots, input_shape, output_size)
+
+    def describe(self):
+        return {
+            "shm": self.shm.name,
+            "slots": self.slots,
+            "input_shape": self.input_shape,
+            "output_size": self.output_size,
+        }
+
+    def close(self, unlink=False):
+        # Views must be released before the mapping can be closed
+        self.inputs = self.outputs = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+# ==================== SERVER ====================
+
+class _Connection:
+    """Server side of one worker connection and its rings."""
+
+    def __init__(self, conn, rings):
+        self.conn = conn
+        self.rings = rings
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def send(self, message):
+        with self.lock:
+            if not self.closed:
+                self.conn.send(message)
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            for ring in self.rings.values():
+                ring.close(unlink=True)
+            self.conn.close()
+
+
+class InferenceServer:
+    """
+    Owns the models and batches requests from all connected workers.
+
+    Parameters:
+        address: (host, port) or Unix socket path
+        models (list): Model names to load (keys of MODEL_LOADERS)
+        slots (int): Ring slots per model and per connection
+        max_batch (int): Largest batch sent to a model
+        max_delay_ms (float): How long the first request of a batch waits for others
+    """
+
+    def __init__(self, address, authkey=None, models=None,
+                 slots=16, max_batch=32, max_delay_ms=5.0):
+        self.address = address
+        self.authkey = require_authkey(authkey)
+        self.model_names = list(models or MODEL_LOADERS)
+        self.slots = slots
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self._predict = {}
+        self._output_sizes = {}
+        self._queues = {}
+
+    def load_models(self):
+        for name in self.model_names:
+            try:
+                predict = MODEL_LOADERS[name]()
+            except Exception as e:
+                print(f"Model '{name}' not available: {e}")
+                continue
+            # Warm-up run also gives the output size
+            sample = np.zeros((1, *MODEL_INPUT_SHAPES[name]), dtype=np.float32)
+            self._output_sizes[name] = int(np.asarray(predict(sample)).reshape(1, -1).shape[1])
+            self._predict[name] = predict
+            self._queues[name] = queue.Queue()
+            print(f"Model '{name}' loaded (output size {self._output_sizes[name]})")
+
+    def serve_forever(self):
+        self.load_models()
+        for name in self._predict:
+            threading.Thread(target=self._batch_loop, args=(name,), daemon=True,
+                             name=f"batcher-{name}").start()
+
+        with Listener(self.address, authkey=self.authkey) as listener:
+            print(f"Inference server listening on {listener.address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:  # bad authkey, aborted handshake
+                    print(f"Rejected connection: {e}")
+                    continue
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+    def _serve_connection(self, conn):
+        rings = {
+            name: SlotRing.create(self.slots, MODEL_INPUT_SHAPES[name], self._output_sizes[name])
+            for name in self._predict
+        }
+        client = _Connection(conn, rings)
+        try:
+            conn.send({name: ring.describe() for name, ring in rings.items()})
+            while True:
+                name, slot = conn.recv()
+                self._queues[name].put((client, slot))
+        except (EOFError, OSError):
+            pass
+        finally:
+            client.close()
+
+    def _next_batch(self, requests):
+        items = [requests.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(items) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                items.append(requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return items
+
+    def _batch_loop(self, name):
+        requests = self._queues[name]
+        predict = self._predict[name]
+        batch_buffer = np.empty((self.max_batch, *MODEL_INPUT_SHAPES[name]), dtype=np.float32)
+
+        while True:
+            items = self._next_batch(requests)
+            live = []
+            for client, slot in items:
+                with client.lock:
+                    if client.closed:
+                        continue
+                    batch_buffer[len(live)] = client.rings[name].inputs[slot]
+                live.append((client, slot))
+            if not live:
+                continue
+
+            try:
+                outputs = np.asarray(predict(batch_buffer[:len(live)])).reshape(len(live), -1)
+            except Exception as e:
+                for client, slot in live:
+                    client.send(("error", name, slot, str(e)))
+                continue
+
+            for (client, slot), output in zip(live, outputs):
+                with client.lock:
+                    if client.closed:
+                        continue
+                    client.rings[name].outputs[slot] = output
+                client.send(("done", name, slot, None))
+
+
+# ==================== CLIENT ====================
+
+class _PendingPrediction:
+    def __init__(self, rows, output_size):
+        self.outputs = np.empty((rows, output_size), dtype=np.float32)
+        self.remaining = rows
+        self.error = None
+        self.connection_lost = False
+        self.done = threading.Event()
+
+
+class InferenceClient:
+    """
+    Worker side: writes tensors into shared-memory slots and waits for the
+    outputs. Thread-safe; one connection per worker process.
+    """
+
+    def __init__(self, address, authkey=None):
+        self._conn = Client(address, authkey=require_authkey(authkey))
+        layouts = self._conn.recv()
+        self._rings = {
+            name: SlotRing.attach(layout["shm"], layout["slots"], layout["input_shape"], layout["output_size"])
+            for name, layout in layouts.items()
+        }
+        self._free = {}
+        for name, ring in self._rings.items():
+            self._free[name] = queue.Queue()
+            for slot in range(ring.slots):
+                self._free[name].put(slot)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        self._receiver = threading.Thread(target=self._receive_loop, daemon=True, name="inference-client")
+        self._receiver.start()
+
+    @property
+    def models(self):
+        return list(self._rings)
+
+    @property
+    def closed(self):
+        """True once the connection to the server is lost."""
+        return self._closed
+
+    def _receive_loop(self):
+        try:
+            while True:
+                status, name, slot, error = self._conn.recv()
+                with self._lock:
+                    pending, row = self._pending.pop((name, slot))
+                    if status == "done":
+                        pending.outputs[row] = self._rings[name].outputs[slot]
+                    else:
+                        pending.error = error
+                    pending.remaining -= 1
+                    if pending.remaining == 0:
+                        pending.done.set()
+                # The slot is free as soon as its output has been copied
+                self._free[name].put(slot)
+        except (EOFError, OSError):
+            pass
+        finally:
+            with self._lock:
+                self._closed = True
+                for pending, _ in self._pending.values():
+                    pending.connection_lost = True
+                    pending.done.set()
+                self._pending.clear()
+
+    def predict(self, name, data, timeout=30.0):
+        """
+        Run the model on a batch of preprocessed samples.
+
+        Parameters:
+            name (str): Model name
+            data (numpy.ndarray): Batch of shape (n, *input_shape)
+            timeout (float): Seconds to wait for the outputs
+
+        Returns:
+            numpy.ndarray: Outputs of shape (n, output_size)
+        """
+        ring = self._rings.get(name)
+        if ring is None:
+            raise KeyError(f"Model '{name}' is not served by the inference server")
+        data = np.asarray(data, dtype=np.float32).reshape(-1, *ring.input_shape)
+        pending = _PendingPrediction(len(data), ring.output_size)
+        if len(data) == 0:
+            return pending.outputs
+
+        for row, sample in enumerate(data):
+            try:
+                slot = self._free[name].get(timeout=timeout)
+            except queue.Empty:
+                raise TimeoutError(f"No free '{name}' slot within {timeout}s") from None
+            ring.inputs[slot] = sample
+            with self._lock:
+                if self._closed:
+                    raise ConnectionError("Inference server connection lost")
+                self._pending[(name, slot)] = (pending, row)
+                self._conn.send((name, slot))
+
+        if not pending.done.wait(timeout):
+            raise TimeoutError(f"Inference server did not answer within {timeout}s")
+        if pending.connection_lost:
+            raise ConnectionError("Inference server connection lost")
+        if pending.error:
+            raise RuntimeError(pending.error)
+        return pending.outputs
+
+    def close(self):
+        self._conn.close()
+        self._receiver.join(timeout=1)
+        for ring in self._rings.values():
+            ring.close()
+
+
+class RemoteModel:
+    """
+    Keras-like proxy (model.predict) for a model served by the inference server.
+    Each call goes through get_client(), so it survives server restarts.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def predict(self, data, verbose=0):
+        return get_client().predict(self.name, data)
+
+
+_client = None
+_client_lock = threading.Lock()
+_connect_failures = 0
+_next_connect = 0.0
+
+
+def get_client():
+    """
+    Shared InferenceClient of this worker, or None when INFERENCE_SERVER_ADDRESS
+    is not set. A client whose connection was lost (server restart) is
+    replaced by a new connection; failed attempts back off exponentially.
+
+    Raises:
+        ConnectionError: The server cannot be reached (or the next attempt is not due yet)
+    """
+    global _client, _connect_failures, _next_connect
+    if not INFERENCE_SERVER_ADDRESS:
+        return None
+    with _client_lock:
+        if _client is not None and not _client.closed:
+            return _client
+        # The old rings stay mapped until no request thread uses them anymore
+        _client = None
+        wait = _next_connect - time.monotonic()
+        if wait > 0:
+            raise ConnectionError(f"Inference server unavailable (next connection attempt in {wait:.1f}s)")
+        try:
+            _client = InferenceClient(parse_address(INFERENCE_SERVER_ADDRESS))
+        except (OSError, EOFError, AuthenticationError) as e:
+            _connect_failures += 1
+            delay = min(INFERENCE_SERVER_RECONNECT_SECONDS * 2 ** (_connect_failures - 1),
+                        INFERENCE_SERVER_RECONNECT_MAX_SECONDS)
+            _next_connect = time.monotonic() + delay
+            raise ConnectionError(f"Inference server unavailable: {e}") from e
+        _connect_failures = 0
+        return _client
+
+
+def remote_model(name):
+    """RemoteModel for name, or None when the inference server is not configured."""
+    client = get_client()
+    if client is None:
+        return None
+    if name not in client.models:
+        raise KeyError(f"Model '{name}' is not served by the inference server")
+    return RemoteModel(name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dedicated inference server")
+    parser.add_argument("--address", default=INFERENCE_SERVER_ADDRESS or "127.0.0.1:6010",
+                        help="host:port or Unix socket path")
+    parser.add_argument("--models", nargs="+", default=list(MODEL_LOADERS), choices=list(MODEL_LOADERS))
+    parser.add_argument("--slots", type=int, default=16, help="ring slots per model and per worker")
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-delay-ms", type=float, default=5.0,
+                        help="how long a request waits for others to join its batch")
+    args = parser.parse_args()
+
+    address = parse_address(args.address)
+    if isinstance(address, tuple) and address[0] not in LOOPBACK_HOSTS:
+        parser.error("The address must be a loopback host or a Unix socket path")
+    if not INFERENCE_SERVER_AUTHKEY:
+        parser.error("INFERENCE_SERVER_AUTHKEY is not set (see the module docstring)")
+
+    server = InferenceServer(address, models=args.models, slots=args.slots,
+                             max_batch=args.max_batch, max_delay_ms=args.max_delay_ms)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
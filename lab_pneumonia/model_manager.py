@@ -0,0 +1,313 @@
+"""
+Zero-downtime model hot-swap with optional shadow evaluation.
+
+A ModelManager has the Keras-like predict() of the model it serves, so it
+can be passed wherever a model is expected (classify_image, classify_data,
+...). Each predict() call reads the current version once: swapping in a new
+version only affects calls that start afterwards, and in-flight calls
+finish on the version they started with.
+
+New versions are loaded and warmed up in a background thread, then either
+swapped in directly or kept as a shadow candidate. In shadow mode a sample
+of the requests is also run on the candidate, in a separate worker thread
+that never delays or changes the responses; agreement and latency are
+recorded until the candidate is promoted or discarded.
+
+Usage:
+    models = ModelManager("pneumonia", load_pneumonia_model, (224, 224, 3))
+    models.set(load_pneumonia_model(path), path)
+    models.watch(path)                             # reload when the file changes
+    models.load(new_path, mode="shadow", shadow_rate=0.1)
+    models.promote()
+"""
+
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+logger = logging.getLogger("lab_pneumonia.models")
+
+# Shadow requests waiting for the candidate; extra ones are dropped
+SHADOW_QUEUE_SIZE = int(os.environ.get("SHADOW_QUEUE_SIZE", "32"))
+
+# Managers by model name, used by the admin endpoints
+MODEL_MANAGERS = {}
+
+
+def get_manager(name):
+    """Registered ModelManager for a model name (KeyError if unknown)."""
+    return MODEL_MANAGERS[name]
+
+
+def same_argmax(primary, candidate):
+    """Default agreement test: same top class for each row."""
+    return np.argmax(primary, axis=1) == np.argmax(candidate, axis=1)
+
+
+class ModelVersion:
+    """One loaded model with where and when it was loaded."""
+
+    def __init__(self, model, version, source, load_seconds=0.0):
+        self.model = model
+        self.version = version
+        self.source = source
+        self.loaded_at = time.time()
+        self.load_seconds = load_seconds
+
+    def describe(self):
+        return {
+            "version": self.version,
+            "source": self.source,
+            "model_type": type(self.model).__name__,
+            "loaded_at": round(self.loaded_at, 3),
+            "load_seconds": round(self.load_seconds, 3),
+        }
+
+
+class ShadowStats:
+    """Agreement and latency of a candidate against the serving version."""
+
+    def __init__(self, window=1000):
+        self.sampled = 0
+        self.dropped = 0
+        self.errors = 0
+        self.rows = 0
+        self.agreements = 0
+        self.primary_ms = deque(maxlen=window)
+        self.candidate_ms = deque(maxlen=window)
+
+    @staticmethod
+    def _latency(values):
+        if not values:
+            return None
+        values = np.asarray(values)
+        return {"mean": round(float(values.mean()), 2), "p95": round(float(np.percentile(values, 95)), 2)}
+
+    def summary(self):
+        return {
+            "sampled": self.sampled,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "rows": self.rows,
+            "agreement": round(self.agreements / self.rows, 4) if self.rows else None,
+            "primary_latency_ms": self._latency(self.primary_ms),
+            "candidate_latency_ms": self._latency(self.candidate_ms),
+        }
+
+
+class ModelManager:
+    """
+    Serving version, candidate version and background loading of one model.
+
+    Parameters:
+        name (str): Model name (key in MODEL_MANAGERS)
+        loader (callable): loader(source) -> model with a predict() method
+        input_shape (tuple): Shape of one input, used for the warm-up
+        agreement (callable): agreement(primary, candidate) -> bool array,
+            one value per row (default: same argmax)
+    """
+
+    def __init__(self, name, loader, input_shape, agreement=same_argmax):
+        self.name = name
+        self.loader = loader
+        self.input_shape = tuple(input_shape)
+        self.agreement = agreement
+        self.current = None
+        self.candidate = None
+        self.shadow_rate = 0.0
+        self.shadow_stats = ShadowStats()
+        self.state = "empty"
+        self.last_error = None
+        self._versions = 0
+        self._load_lock = threading.Lock()
+        self._shadow_queue = None
+        self._watcher = None
+        MODEL_MANAGERS[name] = self
+
+    # ==================== Serving ====================
+
+    def predict(self, data, verbose=0):
+        """Run the serving version (Keras-like); may also feed the shadow candidate."""
+        version = self.current
+        if version is None:
+            raise RuntimeError(f"No {self.name} model loaded")
+        candidate = self.candidate
+        if candidate is None or random.random() >= self.shadow_rate:
+            return version.model.predict(data, verbose=verbose)
+
+        # Copy the input: the caller's buffer is reused once predict returns
+        data = np.array(data, copy=True)
+        start = time.perf_counter()
+        output = version.model.predict(data, verbose=verbose)
+        primary_ms = (time.perf_counter() - start) * 1000
+        self._submit_shadow(candidate, data, np.array(output, copy=True), primary_ms)
+        return output
+
+    def set(self, model, source=None):
+        """Serve an already loaded model (waits for a background load in progress)."""
+        with self._load_lock:
+            self._versions += 1
+            self.current = ModelVersion(model, self._versions, source)
+            self.state = "ready"
+            return self.current
+
+    # ==================== Loading ====================
+
+    def load(self, source, mode="swap", shadow_rate=None):
+        """
+        Load and warm up a new version in a background thread.
+
+        Parameters:
+            source (str): Passed to the loader (model path)
+            mode (str): "swap" to serve it once ready, "shadow" to keep it as
+                a candidate fed with a sample of the traffic
+            shadow_rate (float): Fraction of requests mirrored in shadow mode
+
+        Returns:
+            threading.Thread: The loading thread
+
+        Raises:
+            ValueError: Unknown mode or rate outside [0, 1]
+            RuntimeError: Another version is already loading
+        """
+        if mode not in ("swap", "shadow"):
+            raise ValueError(f"Unknown mode '{mode}' (expected 'swap' or 'shadow')")
+        if shadow_rate is not None and not 0.0 <= shadow_rate <= 1.0:
+            raise ValueError("shadow_rate must be between 0 and 1")
+        if not self._load_lock.acquire(blocking=False):
+            raise RuntimeError(f"A {self.name} model is already loading")
+        self.state = "loading"
+        thread = threading.Thread(
+            target=self._load, args=(source, mode, shadow_rate),
+            name=f"{self.name}-model-loader", daemon=True,
+        )
+        thread.start()
+        return thread
+
+    def _load(self, source, mode, shadow_rate):
+        try:
+            start = time.perf_counter()
+            model = self.loader(source)
+            # Warm-up: the first predict() builds the graph / allocates tensors
+            model.predict(np.zeros((1, *self.input_shape), dtype=np.float32), verbose=0)
+            self._versions += 1  # _load_lock is held since load()
+            version = ModelVersion(model, self._versions, source, time.perf_counter() - start)
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            self.state = "ready" if self.current is not None else "empty"
+            self._load_lock.release()
+            logger.exception("Model load failed", extra={"fields": {"model": self.name, "source": source}})
+            return
+
+        self.last_error = None
+        if mode == "swap":
+            self.current = version
+            logger.info("Model swapped in", extra={"fields": {"model": self.name, **version.describe()}})
+        else:
+            self.shadow_stats = ShadowStats()
+            if shadow_rate is not None:
+                self.shadow_rate = shadow_rate
+            self.candidate = version
+            logger.info("Shadow candidate loaded", extra={"fields": {
+                "model": self.name, "shadow_rate": self.shadow_rate, **version.describe(),
+            }})
+        self.state = "ready"
+        self._load_lock.release()
+
+    def promote(self):
+        """Serve the shadow candidate (new requests only)."""
+        candidate = self.candidate
+        if candidate is None:
+            raise RuntimeError(f"No {self.name} candidate to promote")
+        self.current, self.candidate = candidate, None
+        logger.info("Candidate promoted", extra={"fields": {
+            "model": self.name, **candidate.describe(), "shadow": self.shadow_stats.summary(),
+        }})
+        return candidate
+
+    def discard_candidate(self):
+        """Drop the shadow candidate."""
+        self.candidate = None
+
+    # ==================== File watch ====================
+
+    def watch(self, path, interval=5.0, mode="swap"):
+        """
+        Reload path (in the given mode) whenever its mtime or size changes.
+        The file should be replaced atomically (write elsewhere, then rename).
+        """
+        if self._watcher is not None:
+            return self._watcher
+
+        def signature():
+            try:
+                stat = os.stat(path)
+                return stat.st_mtime_ns, stat.st_size
+            except OSError:
+                return None
+
+        def poll():
+            seen = signature()
+            while True:
+                time.sleep(interval)
+                current = signature()
+                if current is None or current == seen:
+                    continue
+                try:
+                    self.load(path, mode)
+                    seen = current
+                except RuntimeError:
+                    pass  # a load is already running: retry at the next poll
+
+        self._watcher = threading.Thread(target=poll, name=f"{self.name}-model-watch", daemon=True)
+        self._watcher.start()
+        logger.info("Watching model file", extra={"fields": {"model": self.name, "path": path, "interval_s": interval}})
+        return self._watcher
+
+    # ==================== Shadow ====================
+
+    def _submit_shadow(self, candidate, data, primary_output, primary_ms):
+        if self._shadow_queue is None:
+            self._shadow_queue = queue.Queue(maxsize=SHADOW_QUEUE_SIZE)
+            threading.Thread(target=self._shadow_worker, name=f"{self.name}-shadow", daemon=True).start()
+        try:
+            self._shadow_queue.put_nowait((candidate, data, primary_output, primary_ms))
+        except queue.Full:
+            self.shadow_stats.dropped += 1
+
+    def _shadow_worker(self):
+        while True:
+            candidate, data, primary_output, primary_ms = self._shadow_queue.get()
+            if candidate is not self.candidate:
+                continue  # promoted or discarded meanwhile
+            stats = self.shadow_stats
+            stats.sampled += 1
+            try:
+                start = time.perf_counter()
+                candidate_output = candidate.model.predict(data, verbose=0)
+                stats.candidate_ms.append((time.perf_counter() - start) * 1000)
+                stats.primary_ms.append(primary_ms)
+                agree = np.asarray(self.agreement(primary_output, candidate_output))
+                stats.rows += agree.size
+                stats.agreements += int(agree.sum())
+            except Exception:
+                stats.errors += 1
+                logger.exception("Shadow prediction failed", extra={"fields": {"model": self.name}})
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "state": self.state,
+            "last_error": self.last_error,
+            "current": self.current.describe() if self.current else None,
+            "candidate": self.candidate.describe() if self.candidate else None,
+            "shadow_rate": self.shadow_rate,
+            "shadow": self.shadow_stats.summary() if self.candidate else None,
+            "watching": self._watcher is not None,
+        }
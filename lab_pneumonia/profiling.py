@@ -0,0 +1,198 @@
+"""
+On-demand profiling of the inference endpoints.
+
+Per-request profile: the pipeline marks its stages with stage("decode"),
+stage("preprocess"), stage("inference") and stage("serialize"). Outside a
+profiled request stage() is a no-op costing one ContextVar lookup. When an
+admin sends X-Profile: 1 (or ?profile=1) with a valid X-Admin-Token,
+ProfilingMiddleware times the stages of that request. It returns the
+breakdown in a Server-Timing header (shown by browser dev tools) and writes
+it as folded stacks (flamegraph.pl / speedscope format) to PROFILE_DIR;
+the file name is in the X-Profile-File header.
+
+Worker profile: StackSampler samples the stacks of every thread of the
+process (sys._current_frames) for N seconds under live load and returns
+folded stacks, see GET /admin/profile.
+"""
+
+import contextvars
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "lab_pneumonia_profiles"))
+
+_current_timer = contextvars.ContextVar("profiling_timer", default=None)
+
+
+class StageTimer:
+    """Durations of the (possibly nested) stages of one request."""
+
+    def __init__(self, root="request"):
+        self.root = root
+        self.durations = Counter()  # stage path -> seconds
+        self._stack = [root]
+        self._start = time.perf_counter()
+        self.total = None
+
+    @contextmanager
+    def stage(self, name):
+        self._stack.append(name)
+        path = ";".join(self._stack)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[path] += time.perf_counter() - start
+            self._stack.pop()
+
+    def stop(self):
+        self.total = time.perf_counter() - self._start
+        return self.total
+
+    def breakdown(self):
+        """Milliseconds per top-level stage, plus the unaccounted rest as "other"."""
+        stages = {
+            path.split(";", 1)[1]: round(seconds * 1000, 3)
+            for path, seconds in self.durations.items() if path.count(";") == 1
+        }
+        if self.total is not None:
+            stages["other"] = round(max(self.total * 1000 - sum(stages.values()), 0.0), 3)
+            stages["total"] = round(self.total * 1000, 3)
+        return stages
+
+    def server_timing(self):
+        return ", ".join(f"{name};dur={ms}" for name, ms in self.breakdown().items())
+
+    def folded(self):
+        """Folded stacks with self time in microseconds (flamegraph.pl input)."""
+        self_time = Counter(self.durations)
+        for path, seconds in self.durations.items():
+            parent = path.rsplit(";", 1)[0]
+            if parent in self_time and parent != path:
+                self_time[parent] -= seconds
+        if self.total is not None:
+            self_time[self.root] += self.total - sum(
+                seconds for path, seconds in self.durations.items() if path.count(";") == 1
+            )
+        return "".join(f"{path} {max(int(seconds * 1e6), 0)}\n" for path, seconds in self_time.items())
+
+
+@contextmanager
+def _no_stage():
+    yield
+
+
+def stage(name):
+    """Time a stage of the current request when it is being profiled."""
+    timer = _current_timer.get()
+    return timer.stage(name) if timer is not None else _no_stage()
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling the requests that ask for it.
+
+    Parameters:
+        authorize (callable): authorize(admin_token or None) -> bool
+        profile_dir (str): Where folded stack files are written
+    """
+
+    def __init__(self, app, authorize, profile_dir=PROFILE_DIR):
+        self.app = app
+        self.authorize = authorize
+        self.profile_dir = profile_dir
+
+    def _requested(self, scope):
+        if scope["type"] != "http":
+            return False
+        headers = dict(scope.get("headers", ()))
+        wanted = headers.get(b"x-profile", b"").lower() in (b"1", b"true") or \
+            b"profile=1" in scope.get("query_string", b"").split(b"&")
+        if not wanted:
+            return False
+        token = headers.get(b"x-admin-token")
+        return self.authorize(token.decode("latin-1") if token else None)
+
+    async def __call__(self, scope, receive, send):
+        if not self._requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        timer = StageTimer(root=scope["path"].strip("/").replace("/", ".") or "root")
+        token = _current_timer.set(timer)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                timer.stop()
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timer.server_timing().encode("latin-1")))
+                path = self._save(timer)
+                if path:
+                    headers.append((b"x-profile-file", path.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_timer.reset(token)
+
+    def _save(self, timer):
+        try:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            path = os.path.join(self.profile_dir, f"{timer.root}-{time.strftime('%Y%m%d-%H%M%S')}-{id(timer):x}.folded")
+            with open(path, "w") as f:
+                f.write(timer.folded())
+            return path
+        except OSError:
+            return None
+
+
+class StackSampler:
+    """
+    Sampling profiler of all the threads of the process.
+
+    Parameters:
+        interval (float): Seconds between samples
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = Counter()
+        self.count = 0
+
+    @staticmethod
+    def _frame_name(frame):
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def sample(self):
+        me = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_name(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            self.samples[";".join(reversed(stack))] += 1
+        self.count += 1
+
+    def run(self, seconds):
+        """Sample for `seconds` and return the folded stacks."""
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            self.sample()
+            time.sleep(self.interval)
+        return self.folded()
+
+    def folded(self):
+        """Folded stacks with sample counts (flamegraph.pl / speedscope input)."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
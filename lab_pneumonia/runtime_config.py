@@ -0,0 +1,274 @@
+"""
+CPU thread configuration for the inference processes.
+
+By default TensorFlow (and the BLAS/OpenMP libraries underneath) size their
+thread pools to every core of the machine, in every process: 4 uvicorn or
+Flask workers on a 16-core box then run 4 x 16 compute threads plus our own
+executors. apply() gives each process a share of the cores instead:
+
+    INFERENCE_WORKERS            Inference processes on the machine
+                                 (default: WEB_CONCURRENCY, else 1)
+    INFERENCE_THREADS            Intra-op threads per process
+                                 (default: physical cores / workers)
+    INFERENCE_INTER_OP_THREADS   Inter-op threads per process (default 1)
+    CPU_PINNING                  "1" to pin each process to its own core set
+    CPU_PINNING_LOCK_DIR         Where worker slots are claimed (default: temp dir)
+
+It must run before numpy and TensorFlow are imported: OpenBLAS and OpenMP
+read their thread counts once, when the library is loaded. The entrypoints
+(fastapi_deployment/main.py, the MCP server's dl_models.py) and the modules
+they load first (shared_utils, fruits_endpoint, tflite_pool,
+inference_server) call it before importing numpy; this module imports
+nothing heavy. If OpenBLAS is already loaded anyway, apply() sets its
+thread count at runtime through its C API. Values already set in the
+environment (OMP_NUM_THREADS, ...) are kept. With CPU_PINNING each process claims a
+free worker slot (an flock-ed lock file, released when the process exits)
+and is pinned with sched_setaffinity to the cores of that slot; hyperthread
+siblings stay in the same slot. Pinning is Linux-only and skipped elsewhere.
+
+Pinning belongs to the worker processes, after the fork. A forked child
+drops the slot and affinity inherited from its parent and claims its own
+slot (os.register_at_fork). A pre-fork master that imported the app
+(gunicorn --preload) still holds a slot itself; release it before the
+workers are forked, e.g. in gunicorn.conf.py:
+
+    def when_ready(server):
+        import runtime_config
+        runtime_config.release()
+
+benchmarks/bench_threads.py finds the best workers x threads combination.
+"""
+
+import ctypes
+import logging
+import os
+import sys
+import tempfile
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger("lab_pneumonia.runtime")
+
+THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS", "NUMEXPR_NUM_THREADS",
+)
+
+_config = None
+_apply_args = None
+_initial_cpus = None  # affinity before pinning, restored by release()
+_slot_file = None  # kept open: the flock lasts as long as the process
+
+
+def available_cpus():
+    """Logical CPUs this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def core_groups(cpus=None):
+    """
+    Group logical CPUs by physical core (hyperthread siblings together),
+    from /sys/devices/system/cpu/cpu*/topology on Linux.
+
+    Returns:
+        list: Lists of logical CPU ids, one list per physical core
+    """
+    cpus = available_cpus() if cpus is None else cpus
+    groups = {}
+    for cpu in cpus:
+        topology = f"/sys/devices/system/cpu/cpu{cpu}/topology"
+        try:
+            with open(f"{topology}/physical_package_id") as f:
+                package = f.read().strip()
+            with open(f"{topology}/core_id") as f:
+                core = f.read().strip()
+            key = (package, core)
+        except OSError:
+            key = ("cpu", cpu)
+        groups.setdefault(key, []).append(cpu)
+    return sorted(groups.values())
+
+
+def _openblas_libraries():
+    """
+    (get_num_threads, set_num_threads) of each OpenBLAS library loaded in
+    this process (Linux only; numpy wheels ship scipy-openblas).
+    """
+    try:
+        with open("/proc/self/maps") as f:
+            paths = sorted({line.split()[-1] for line in f if "openblas" in line and "/" in line})
+    except OSError:
+        return []
+    libraries = []
+    for path in paths:
+        try:
+            library = ctypes.CDLL(path)
+        except OSError:
+            continue
+        for prefix in ("openblas", "scipy_openblas"):
+            for suffix in ("", "64_", "_64_"):
+                get = getattr(library, f"{prefix}_get_num_threads{suffix}", None)
+                set_ = getattr(library, f"{prefix}_set_num_threads{suffix}", None)
+                if get is not None and set_ is not None:
+                    get.restype = ctypes.c_int
+                    libraries.append((get, set_))
+                    break
+            else:
+                continue
+            break
+    return libraries
+
+
+def blas_threads():
+    """Threads OpenBLAS actually uses in this process (None if it is not loaded)."""
+    libraries = _openblas_libraries()
+    return libraries[0][0]() if libraries else None
+
+
+def default_workers():
+    return int(os.environ.get("INFERENCE_WORKERS") or os.environ.get("WEB_CONCURRENCY") or 1)
+
+
+def claim_worker_slot(workers, lock_dir=None):
+    """
+    Claim the first free slot in [0, workers) for this process.
+
+    Returns:
+        int or None: Slot number, or None if every slot is taken
+    """
+    global _slot_file
+    if fcntl is None:
+        return None
+    lock_dir = lock_dir or os.environ.get("CPU_PINNING_LOCK_DIR", tempfile.gettempdir())
+    for slot in range(workers):
+        handle = open(os.path.join(lock_dir, f"lab_pneumonia-cpu-slot-{slot}.lock"), "w")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            continue
+        _slot_file = handle
+        return slot
+    return None
+
+
+def slot_cpus(slot, workers, groups=None):
+    """Logical CPUs of a worker slot: an equal share of the physical cores."""
+    groups = core_groups() if groups is None else groups
+    per_worker = max(len(groups) // workers, 1)
+    start = (slot * per_worker) % len(groups)
+    return [cpu for group in groups[start:start + per_worker] for cpu in group]
+
+
+def apply(threads=None, inter_op=None, workers=None, pin=None):
+    """
+    Configure the thread pools of this process (idempotent).
+
+    Parameters:
+        threads (int): Intra-op threads (default: INFERENCE_THREADS or cores / workers)
+        inter_op (int): Inter-op threads (default: INFERENCE_INTER_OP_THREADS or 1)
+        workers (int): Inference processes sharing the machine
+        pin (bool): Pin this process to its own cores (default: CPU_PINNING)
+
+    Returns:
+        dict: The applied configuration
+    """
+    global _config, _apply_args, _initial_cpus
+    if _config is not None:
+        return _config
+    _apply_args = (threads, inter_op, workers, pin)
+
+    workers = workers or default_workers()
+    pin = os.environ.get("CPU_PINNING", "0") == "1" if pin is None else pin
+    groups = core_groups()
+
+    slot, cpus = None, None
+    if pin and hasattr(os, "sched_setaffinity"):
+        slot = claim_worker_slot(workers)
+        if slot is not None:
+            cpus = slot_cpus(slot, workers, groups)
+            _initial_cpus = available_cpus()
+            os.sched_setaffinity(0, cpus)
+            groups = core_groups(cpus)
+        else:
+            logger.warning("No free CPU slot, running unpinned", extra={"fields": {"workers": workers}})
+    elif pin:
+        logger.warning("CPU pinning is not supported on this platform")
+
+    if threads is None:
+        threads = int(os.environ.get("INFERENCE_THREADS") or 0) or max(
+            len(groups) // (1 if cpus is not None else workers), 1
+        )
+    if inter_op is None:
+        inter_op = int(os.environ.get("INFERENCE_INTER_OP_THREADS") or 1)
+
+    for name in THREAD_ENV_VARS:
+        os.environ.setdefault(name, str(threads))
+    os.environ.setdefault("TF_NUM_INTRAOP_THREADS", str(threads))
+    os.environ.setdefault("TF_NUM_INTEROP_THREADS", str(inter_op))
+
+    # Loaded before apply(): the environment variables above came too late
+    libraries = _openblas_libraries()
+    for _, set_num_threads in libraries:
+        set_num_threads(int(os.environ["OPENBLAS_NUM_THREADS"]))
+    if "numpy" in sys.modules and not libraries:
+        logger.warning("numpy was imported before runtime_config.apply(): BLAS thread caps may not apply")
+
+    _config = {
+        "workers": workers,
+        "threads": int(os.environ["TF_NUM_INTRAOP_THREADS"]),
+        "inter_op_threads": int(os.environ["TF_NUM_INTEROP_THREADS"]),
+        "pinned": cpus is not None,
+        "slot": slot,
+        "cpus": cpus if cpus is not None else available_cpus(),
+        "physical_cores": len(groups),
+    }
+    if "tensorflow" in sys.modules:
+        configure_tensorflow(sys.modules["tensorflow"])
+    return _config
+
+
+def release():
+    """
+    Give up this process's worker slot and CPU affinity (pre-fork masters,
+    see the module docstring). The next apply() runs the configuration again.
+    """
+    global _config, _slot_file, _initial_cpus
+    if _slot_file is not None:
+        _slot_file.close()
+        _slot_file = None
+    if _initial_cpus is not None:
+        os.sched_setaffinity(0, _initial_cpus)
+        _initial_cpus = None
+    _config = None
+
+
+def _after_fork_in_child():
+    # The slot lock and the affinity were inherited from the parent: claim our own
+    if _config is not None and _config["pinned"]:
+        release()
+        apply(*_apply_args)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def configure_tensorflow(tf):
+    """Set the TensorFlow thread pools (only possible before its first op runs)."""
+    config = apply()
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(config["threads"])
+        tf.config.threading.set_inter_op_parallelism_threads(config["inter_op_threads"])
+    except (RuntimeError, AttributeError):
+        pass  # runtime already initialized: TF_NUM_*_THREADS were read at startup
+
+
+def describe():
+    """Applied configuration and effective BLAS threads (for status endpoints)."""
+    return {**apply(), "blas_threads": blas_threads()}
@@ -3,29 +3,107 @@ Shared utility functions for pneumonia classification model.
 Can be used by Streamlit, FastAPI, Flask, and other deployments.
 """
 
+import runtime_config
+
+# Per-process TF/BLAS thread counts (and optional core pinning), before numpy
+# and TensorFlow are imported
+runtime_config.apply()
+
 from PIL import ImageOps, Image
 import numpy as np
+import io
 import os
+import threading
+from contextlib import contextmanager
+
+from profiling import stage
 
-# Import Keras model loader - prefer TensorFlow Keras for better compatibility
+# Keras is imported on first model load, so that HTTP workers proxying to the
+# inference server (INFERENCE_SERVER_ADDRESS) never load the TensorFlow runtime
 USE_TF_KERAS = False
-try:
-    import tensorflow as tf
-    # Verify TensorFlow is actually working
-    _ = tf.__version__
-    from tensorflow.keras.models import load_model
-    USE_TF_KERAS = True
-except (ImportError, AttributeError):
+_load_model = None
+
+
+def import_keras_loader():
+    """
+    Import the Keras model loader - prefer TensorFlow Keras for better compatibility.
+    
+    Returns:
+        callable: load_model(path, compile=False, ...)
+    """
+    global USE_TF_KERAS, _load_model
+    if _load_model is not None:
+        return _load_model
     try:
-        from keras.models import load_model
-        USE_TF_KERAS = False
-    except ImportError:
-        raise ImportError(
-            "TensorFlow is not working correctly. Try:\n"
-            "1. pip uninstall tensorflow tensorflow-intel\n"
-            "2. pip install tensorflow==2.12.0 --no-cache-dir\n"
-            "3. Restart Python/terminal"
-        )
+        import tensorflow as tf
+        # Verify TensorFlow is actually working
+        _ = tf.__version__
+        runtime_config.configure_tensorflow(tf)
+        from tensorflow.keras.models import load_model
+        USE_TF_KERAS = True
+    except (ImportError, AttributeError):
+        try:
+            from keras.models import load_model
+            USE_TF_KERAS = False
+        except ImportError:
+            raise ImportError(
+                "TensorFlow is not working correctly. Try:\n"
+                "1. pip uninstall tensorflow tensorflow-intel\n"
+                "2. pip install tensorflow==2.12.0 --no-cache-dir\n"
+                "3. Restart Python/terminal"
+            )
+    _load_model = load_model
+    return load_model
+
+
+# Input contract of the pneumonia model, published by GET /models/pneumonia/spec.
+# Clients that already resize images can send the uint8 tensor directly.
+PNEUMONIA_INPUT_SPEC = {
+    "name": "pneumonia",
+    "input_shape": [224, 224, 3],
+    "dtype": "uint8",
+    "layout": "HWC",
+    "color_mode": "RGB",
+    "resize": "center crop to the target aspect ratio, then LANCZOS resize (PIL ImageOps.fit)",
+    "resample": "lanczos",
+    "normalization": {"scale": 1 / 127.5, "offset": -1.0, "applied_by": "server"},
+    "content_types": ["application/octet-stream", "application/x-npy"],
+}
+
+# Request bodies holding a preprocessed uint8 tensor instead of an encoded image
+TENSOR_CONTENT_TYPES = ("application/octet-stream", "application/x-npy")
+
+
+# Probability of PNEUMONIA (output index 0) above which an image is classified PNEUMONIA
+PNEUMONIA_THRESHOLD = 0.95
+
+
+def default_pneumonia_model_path():
+    """
+    Path of the bundled pneumonia model (PNEUMONIA_MODEL_PATH overrides it).
+    
+    Returns:
+        str: Model file path
+    """
+    if os.environ.get("PNEUMONIA_MODEL_PATH"):
+        return os.environ["PNEUMONIA_MODEL_PATH"]
+    
+    # Default path relative to this file
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    model_path = os.path.join(base_dir, 'streamlit', 'model', 'pneumonia_classifier.h5')
+    
+    # If path doesn't exist, try alternative paths
+    if not os.path.exists(model_path):
+        # Try relative to current working directory
+        alt_path = os.path.join('streamlit', 'model', 'pneumonia_classifier.h5')
+        if os.path.exists(alt_path):
+            model_path = alt_path
+        else:
+            # Try from streamlit directory
+            alt_path = os.path.join(os.path.dirname(base_dir), 'streamlit', 'model', 'pneumonia_classifier.h5')
+            if os.path.exists(alt_path):
+                model_path = alt_path
+    return model_path
 
 
 def load_pneumonia_model(model_path=None):
@@ -39,21 +117,8 @@ def load_pneumonia_model(model_path=None):
         model: Loaded Keras model
     """
     if model_path is None:
-        # Default path relative to this file
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        model_path = os.path.join(base_dir, 'streamlit', 'model', 'pneumonia_classifier.h5')
-        
-        # If path doesn't exist, try alternative paths
-        if not os.path.exists(model_path):
-            # Try relative to current working directory
-            alt_path = os.path.join('streamlit', 'model', 'pneumonia_classifier.h5')
-            if os.path.exists(alt_path):
-                model_path = alt_path
-            else:
-                # Try from streamlit directory
-                alt_path = os.path.join(os.path.dirname(base_dir), 'streamlit', 'model', 'pneumonia_classifier.h5')
-                if os.path.exists(alt_path):
-                    model_path = alt_path
+        model_path = default_pneumonia_model_path()
+    load_model = import_keras_loader()
     
     # Handle model loading with compatibility for older models
     try:
@@ -78,6 +143,19 @@ def load_pneumonia_model(model_path=None):
                         f"Error: {str(e)}")
 
 
+def load_pneumonia_version(model_path):
+    """
+    Load a Keras (.h5) or TFLite (.tflite) pneumonia model.
+    
+    Returns:
+        model: Keras model, or tflite_pool.InterpreterPool (same predict API)
+    """
+    if model_path.endswith('.tflite'):
+        from tflite_pool import InterpreterPool
+        return InterpreterPool(model_path)
+    return load_pneumonia_model(model_path)
+
+
 def load_class_names(labels_path=None):
     """
     Load class names from labels file.
@@ -109,16 +187,71 @@ def load_class_names(labels_path=None):
     return class_names
 
 
-def preprocess_image(image, target_size=(224, 224)):
+class InputBufferPool:
     """
-    Preprocess an image for model prediction.
+    Reusable float32 model input buffers of shape (batch_size, *input_shape).
+    
+    Preprocessing writes into a pooled buffer instead of allocating new
+    arrays for every request. When all buffers are in use a new one is
+    allocated; at most max_buffers are kept for reuse.
+    """
+    
+    def __init__(self, input_shape, batch_size=1, max_buffers=8):
+        self.shape = (batch_size, *input_shape)
+        self.max_buffers = max_buffers
+        self._free = []
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+        return np.empty(self.shape, dtype=np.float32)
+    
+    def release(self, buffer):
+        with self._lock:
+            if len(self._free) < self.max_buffers:
+                self._free.append(buffer)
+    
+    @contextmanager
+    def buffer(self):
+        """Borrow a buffer for the duration of a with block."""
+        buffer = self.acquire()
+        try:
+            yield buffer
+        finally:
+            self.release(buffer)
+
+
+_buffer_pools = {}
+_buffer_pools_lock = threading.Lock()
+
+
+def get_buffer_pool(input_shape, batch_size=1):
+    """
+    Shared InputBufferPool for a model input shape and batch size.
     
     Parameters:
-        image (PIL.Image.Image): Input image
-        target_size (tuple): Target size for resizing (width, height)
+        input_shape (tuple): (height, width, channels)
+        batch_size (int): Number of samples per buffer
     
     Returns:
-        numpy.ndarray: Preprocessed image array ready for model input
+        InputBufferPool: Pool shared by all callers with the same key
+    """
+    key = (tuple(input_shape), batch_size)
+    with _buffer_pools_lock:
+        pool = _buffer_pools.get(key)
+        if pool is None:
+            pool = _buffer_pools[key] = InputBufferPool(key[0], batch_size)
+        return pool
+
+
+def fit_image(image, target_size=(224, 224)):
+    """
+    Convert to RGB and center-crop/resize to target_size.
+    
+    Returns:
+        numpy.ndarray: uint8 array of shape (height, width, 3)
     """
     # Convert image to RGB if needed
     if image.mode != 'RGB':
@@ -128,16 +261,94 @@ def preprocess_image(image, target_size=(224, 224)):
     image = ImageOps.fit(image, target_size, Image.Resampling.LANCZOS)
     
     # Convert to numpy array
-    image_array = np.asarray(image)
+    return np.asarray(image)
+
+
+def preprocess_image(image, target_size=(224, 224), out=None):
+    """
+    Preprocess an image for model prediction.
     
-    # Normalize image (values between -1 and 1)
-    normalized_image_array = (image_array.astype(np.float32) / 127.5) - 1
+    Parameters:
+        image (PIL.Image.Image): Input image
+        target_size (tuple): Target size for resizing (width, height)
+        out (numpy.ndarray): Optional float32 (1, height, width, 3) buffer
+            (e.g. from get_buffer_pool) to write into instead of allocating
     
-    # Reshape for model input
-    data = np.ndarray(shape=(1, target_size[1], target_size[0], 3), dtype=np.float32)
-    data[0] = normalized_image_array
+    Returns:
+        numpy.ndarray: Preprocessed image array ready for model input
+    """
+    return normalize_image_array(fit_image(image, target_size), out)
+
+
+def normalize_into(image_array, out):
+    """
+    Write (image_array / 127.5) - 1 into out without temporary arrays.
     
-    return data
+    Parameters:
+        image_array (numpy.ndarray): uint8 pixels
+        out (numpy.ndarray): float32 array of the same shape
+    """
+    # uint8 / float32 is computed in float32 directly into out, then shifted in place
+    np.divide(image_array, np.float32(127.5), out=out, casting='unsafe')
+    np.subtract(out, np.float32(1.0), out=out)
+    return out
+
+
+def normalize_image_array(image_array, out=None):
+    """
+    Normalize a uint8 HxWx3 array for the pneumonia model.
+    
+    Parameters:
+        image_array (numpy.ndarray): RGB pixels, already at the model input size
+        out (numpy.ndarray): Optional float32 (1, H, W, 3) buffer to write into
+    
+    Returns:
+        numpy.ndarray: Array of shape (1, H, W, 3), values between -1 and 1
+    """
+    if out is None:
+        out = np.empty((1, *image_array.shape), dtype=np.float32)
+    normalize_into(image_array, out[0])
+    return out
+
+
+def decode_raw_tensor(body, input_shape):
+    """
+    Decode a uint8 HxWx3 tensor sent as raw bytes or as a .npy file, without PIL.
+    
+    Parameters:
+        body (bytes): Request body
+        input_shape (list): Expected (height, width, channels)
+    
+    Returns:
+        numpy.ndarray: Read-only uint8 array of shape input_shape (no copy of the body)
+    
+    Raises:
+        ValueError: If the size, dtype or shape does not match input_shape
+    """
+    input_shape = tuple(input_shape)
+    if bytes(body[:6]) == b"\x93NUMPY":
+        header = io.BytesIO(bytes(body[:4096]))
+        version = np.lib.format.read_magic(header)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(header)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(header)
+        if dtype != np.uint8:
+            raise ValueError(f"Tensor dtype must be uint8, got {dtype}")
+        if shape not in (input_shape, (1, *input_shape)):
+            raise ValueError(f"Tensor shape must be {input_shape}, got {shape}")
+        offset = header.tell()
+        if len(body) - offset != int(np.prod(input_shape)):
+            raise ValueError("Truncated .npy tensor")
+        array = np.frombuffer(body, dtype=np.uint8, offset=offset)
+        return array.reshape(shape, order='F' if fortran_order else 'C').reshape(input_shape)
+    
+    expected = int(np.prod(input_shape))
+    if len(body) != expected:
+        raise ValueError(
+            f"Raw tensor must be {'x'.join(map(str, input_shape))} uint8 ({expected} bytes), got {len(body)} bytes"
+        )
+    return np.frombuffer(body, dtype=np.uint8).reshape(input_shape)
 
 
 def classify_image(image, model, class_names):
@@ -152,15 +363,87 @@ def classify_image(image, model, class_names):
     Returns:
         tuple: (class_name, confidence_score)
     """
-    # Preprocess image
-    data = preprocess_image(image)
+    with get_buffer_pool(PNEUMONIA_INPUT_SPEC["input_shape"]).buffer() as data:
+        with stage("preprocess"):
+            preprocess_image(image, out=data)
+        return classify_data(data, model, class_names)
+
+
+def classify_tensor(image_array, model, class_names):
+    """
+    Classify a uint8 HxWx3 tensor already resized to the model input size.
+    
+    Parameters:
+        image_array (numpy.ndarray): Tensor from decode_raw_tensor
+        model: Trained Keras model
+        class_names (list): List of class names
+    
+    Returns:
+        tuple: (class_name, confidence_score)
+    """
+    with get_buffer_pool(image_array.shape).buffer() as data:
+        with stage("preprocess"):
+            normalize_image_array(image_array, out=data)
+        return classify_data(data, model, class_names)
+
+
+def classify_data(data, model, class_names):
+    """
+    Run the pneumonia model on a preprocessed (1, 224, 224, 3) array.
     
+    Returns:
+        tuple: (class_name, confidence_score)
+    """
     # Make prediction
-    prediction = model.predict(data, verbose=0)
+    with stage("inference"):
+        prediction = model.predict(data, verbose=0)
     
     # Determine class (threshold-based for binary classification)
-    index = 0 if prediction[0][0] > 0.95 else 1
+    index = int(pneumonia_indices(prediction)[0])
     class_name = class_names[index]
     confidence_score = float(prediction[0][index])
     
     return class_name, confidence_score
+
+
+def pneumonia_indices(prediction):
+    """
+    Class index of each row of a pneumonia model output
+    (0 = PNEUMONIA when its probability exceeds PNEUMONIA_THRESHOLD, else 1).
+    
+    Parameters:
+        prediction (numpy.ndarray): Model output of shape (n, 2)
+    
+    Returns:
+        numpy.ndarray: Indices of shape (n,)
+    """
+    return np.where(np.asarray(prediction)[:, 0] > PNEUMONIA_THRESHOLD, 0, 1)
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tif', '.tiff', '.webp')
+
+
+def list_labeled_images(root, class_names):
+    """
+    List the images of a labeled folder with one subdirectory per class
+    (e.g. chest_xray/test/NORMAL and chest_xray/test/PNEUMONIA).
+    
+    Parameters:
+        root (str): Dataset folder
+        class_names (list): Class names; subdirectories are matched case-insensitively
+    
+    Returns:
+        list: (path, label index) tuples, sorted by path
+    """
+    indices = {name.lower(): index for index, name in enumerate(class_names)}
+    images = []
+    for entry in sorted(os.listdir(root)):
+        label = indices.get(entry.lower())
+        class_dir = os.path.join(root, entry)
+        if label is None or not os.path.isdir(class_dir):
+            continue
+        for dirpath, _, filenames in os.walk(class_dir):
+            for filename in filenames:
+                if filename.lower().endswith(IMAGE_EXTENSIONS):
+                    images.append((os.path.join(dirpath, filename), label))
+    return sorted(images)
@@ -0,0 +1,249 @@
+"""
+Non-blocking structured (JSON) logging for the deployment apps.
+
+Request handlers only put log records on an in-memory queue; a
+QueueListener thread formats them as JSON lines and writes them to stdout,
+so no stream I/O happens on the event loop. Hot routes can be sampled
+(only a fraction of their records is kept); warnings and errors are always
+kept. The log level and the sampling rates can be changed at runtime
+(see fastapi_deployment/admin.py).
+
+Environment:
+    LOG_LEVEL          Initial level (default INFO)
+    LOG_SAMPLE_RATES   Per-route sampling, e.g. "/predict=0.1,/fruits/predict=0.05"
+    LOG_FAST_RECORDS   "1" to skip caller, thread and process lookups when any
+                       record is created. This sets logging._srcfile,
+                       logThreads, logProcesses and logMultiprocessing for
+                       the whole process, other loggers included (default 0)
+
+Usage:
+    setup_logging()
+    logger = logging.getLogger("lab_pneumonia.fruits")
+    logger.info("prediction", extra={"route": "/fruits/predict", "fields": {"class": "apple"}})
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+
+import fast_json
+
+ROOT_LOGGER = "lab_pneumonia"
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FAST_RECORDS = os.environ.get("LOG_FAST_RECORDS", "0") == "1"
+
+# Attributes of every LogRecord (everything else was passed through extra=)
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_listener = None
+
+
+def parse_sample_rates(value):
+    """Parse "route=rate,route=rate" into a dict (invalid items are ignored)."""
+    rates = {}
+    for item in (value or "").split(","):
+        route, _, rate = item.strip().partition("=")
+        try:
+            rates[route.strip()] = min(max(float(rate), 0.0), 1.0)
+        except ValueError:
+            continue
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of the records of each route.
+
+    Records carry their route with extra={"route": ...}; records without a
+    route, and records at WARNING or above, are always kept.
+
+    Parameters:
+        rates (dict): Route -> fraction of records kept (0.0 to 1.0)
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = dict(rates or {})
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(getattr(record, "route", None), 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+class JSONFormatter(logging.Formatter):
+    """Format a record as one JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key != "fields":
+                entry[key] = value
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            record.exc_text = record.exc_text or self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return fast_json.dumps(entry).decode()
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    # The stock prepare() merges the traceback into the message; keep it
+    # separate (as text, tracebacks cannot go through the queue) for JSON
+    def prepare(self, record):
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(level=LOG_LEVEL, sample_rates=None, stream=None, fast_records=LOG_FAST_RECORDS):
+    """
+    Route the lab_pneumonia loggers through the logging queue (idempotent).
+
+    Parameters:
+        level (str or int): Initial log level
+        sample_rates (dict): Route -> fraction kept (default: LOG_SAMPLE_RATES)
+        stream: Output stream of the listener thread (default: stdout)
+        fast_records (bool): Turn off the caller/thread/process lookups of
+            the logging module, process-wide (default: LOG_FAST_RECORDS)
+
+    Returns:
+        logging.Logger: The lab_pneumonia root logger
+    """
+    global _listener
+    logger = logging.getLogger(ROOT_LOGGER)
+    if _listener is not None:
+        return logger
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JSONFormatter())
+
+    records = queue.SimpleQueue()
+    handler = _QueueHandler(records)
+    handler.addFilter(SamplingFilter(
+        parse_sample_rates(os.environ.get("LOG_SAMPLE_RATES")) if sample_rates is None else sample_rates
+    ))
+
+    if fast_records:
+        # Caller, thread and process lookups are not in the JSON records: skip
+        # them when records are created (see "Optimization" in the logging docs).
+        # Global to the logging module: other libraries' records lose them too.
+        logging._srcfile = None
+        logging.logThreads = False
+        logging.logProcesses = False
+        logging.logMultiprocessing = False
+
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return logger
+
+
+def shutdown_logging():
+    """Flush the queue and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _sampling_filter():
+    for handler in logging.getLogger(ROOT_LOGGER).handlers:
+        for log_filter in handler.filters:
+            if isinstance(log_filter, SamplingFilter):
+                return log_filter
+    return None
+
+
+def get_log_config():
+    """Current level and sampling rates."""
+    sampler = _sampling_filter()
+    return {
+        "level": logging.getLevelName(logging.getLogger(ROOT_LOGGER).getEffectiveLevel()),
+        "sample_rates": dict(sampler.rates) if sampler else {},
+        "queued": _listener.queue.qsize() if _listener is not None else 0,
+    }
+
+
+def set_log_config(level=None, sample_rates=None):
+    """
+    Change the level and/or the sampling rates at runtime.
+
+    Raises:
+        ValueError: Unknown level or rate outside [0, 1]
+    """
+    if level is not None:
+        level = level.upper()
+        if not isinstance(logging.getLevelName(level), int):
+            raise ValueError(f"Unknown log level: {level}")
+    if sample_rates is not None:
+        for route, rate in sample_rates.items():
+            if not 0.0 <= rate <= 1.0:
+                raise ValueError(f"Sample rate for {route} must be between 0 and 1")
+
+    if level is not None:
+        logging.getLogger(ROOT_LOGGER).setLevel(level)
+    sampler = _sampling_filter()
+    if sample_rates is not None and sampler is not None:
+        sampler.rates = dict(sample_rates)
+    return get_log_config()
+
+
+class RequestLoggingMiddleware:
+    """
+    ASGI middleware logging one record per HTTP request (method, route,
+    status, duration), subject to the route's sampling rate.
+    """
+
+    def __init__(self, app, logger_name=f"{ROOT_LOGGER}.access"):
+        self.app = app
+        self.logger = logging.getLogger(logger_name)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.logger.isEnabledFor(logging.INFO):
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.logger.log(
+                logging.WARNING if status >= 500 else logging.INFO,
+                "request",
+                extra={
+                    "route": scope["path"],
+                    "fields": {
+                        "method": scope["method"],
+                        "status": status,
+                        "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+                    },
+                },
+            )
@@ -0,0 +1,285 @@
+"""
+Memory-mapped cache of preprocessed images for repeated dataset evaluation.
+
+A labeled folder (NORMAL/ and PNEUMONIA/ subdirectories, e.g. the Kaggle
+chest_xray/train, val and test folders) is decoded and resized once with
+the servers' fit_image() into a uint8 tensor store:
+
+    <store>/tensors.u8    raw uint8 rows of shape input_shape (np.memmap)
+    <store>/index.json    input shape + one entry per image: path, label,
+                          content hash, mtime, size and row in tensors.u8
+
+Rebuilding only reprocesses new or changed files (same mtime and size, or
+same content hash, means unchanged). Rows referenced by the current index
+are never written: new and changed images go to free rows or to the end
+of the store, and the rows of deleted or changed files only become free
+once the new index has replaced the old one, so a TensorCache opened
+before a rebuild keeps reading consistent pixels.
+Evaluation then streams batches straight from the memmap: normalization
+to the model input is the only per-run cost.
+
+Usage:
+    python tensor_cache.py build chest_xray/test cache/test
+    python tensor_cache.py evaluate cache/test [--model model.tflite]
+
+    cache = TensorCache("cache/test")
+    for entries, batch in cache.iter_batches(64):
+        prediction = model.predict(batch, verbose=0)
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from shared_utils import (
+    fit_image, normalize_into, get_buffer_pool, list_labeled_images,
+    load_class_names, PNEUMONIA_INPUT_SPEC
+)
+
+INDEX_FILE = "index.json"
+TENSORS_FILE = "tensors.u8"
+INDEX_VERSION = 1
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """BLAKE2b digest of a file's content."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _decode(path, input_shape):
+    with Image.open(path) as image:
+        return fit_image(image, tuple(input_shape[:2]))
+
+
+def _open_tensors(store_dir, input_shape, rows, mode):
+    path = os.path.join(store_dir, TENSORS_FILE)
+    row_bytes = int(np.prod(input_shape))
+    if mode == "r+":
+        # Grow (or create) the file to hold `rows` rows
+        with open(path, "ab") as f:
+            if f.tell() < rows * row_bytes:
+                f.truncate(rows * row_bytes)
+    if rows == 0:
+        return np.empty((0, *input_shape), dtype=np.uint8)
+    return np.memmap(path, dtype=np.uint8, mode=mode, shape=(rows, *input_shape))
+
+
+def _read_index(store_dir):
+    path = os.path.join(store_dir, INDEX_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_index(store_dir, index):
+    # Write then rename so readers never see a partial index
+    path = os.path.join(store_dir, INDEX_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(index, f)
+    os.replace(path + ".tmp", path)
+
+
+def build_cache(root, store_dir, class_names=None, input_shape=None, workers=None, verbose=True):
+    """
+    Create or incrementally update the tensor store of a labeled folder.
+
+    Parameters:
+        root (str): Dataset folder with one subdirectory per class
+        store_dir (str): Output directory
+        class_names (list): Class names (default: the pneumonia labels)
+        input_shape (tuple): (height, width, 3) (default: pneumonia model input)
+        workers (int): Decoding threads (default: CPU count)
+
+    Returns:
+        dict: Counts of kept, reprocessed, added and removed images
+    """
+    class_names = class_names or load_class_names()
+    input_shape = list(input_shape or PNEUMONIA_INPUT_SPEC["input_shape"])
+    os.makedirs(store_dir, exist_ok=True)
+
+    previous = _read_index(store_dir)
+    if previous and (previous.get("version") != INDEX_VERSION or previous["input_shape"] != input_shape):
+        previous = None  # different layout: rebuild everything
+    old_entries = {entry["path"]: entry for entry in previous["entries"]} if previous else {}
+    capacity = previous["rows"] if previous else 0
+    # Rows not referenced by the committed index (freed by an earlier build)
+    live_rows = {entry["row"] for entry in old_entries.values()}
+    free_rows = [row for row in reversed(range(capacity)) if row not in live_rows]
+
+    entries, todo, reprocessed = [], [], 0
+    for path, label in list_labeled_images(root, class_names):
+        relative = os.path.relpath(path, root)
+        stat = os.stat(path)
+        entry = {"path": relative, "label": label, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+        old = old_entries.pop(relative, None)
+        if old and old["mtime_ns"] == entry["mtime_ns"] and old["size"] == entry["size"]:
+            entry.update(hash=old["hash"], row=old["row"])
+        else:
+            entry["hash"] = file_hash(path)
+            if old and old["hash"] == entry["hash"]:
+                entry["row"] = old["row"]  # touched but identical
+            else:
+                # Never overwrite a row the committed index still points to
+                if free_rows:
+                    entry["row"] = free_rows.pop()  # lowest free row first
+                else:
+                    entry["row"] = capacity
+                    capacity += 1
+                todo.append(entry)
+                if old:
+                    reprocessed += 1
+        entries.append(entry)
+
+    tensors = _open_tensors(store_dir, input_shape, capacity, "r+")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        decoded = executor.map(lambda entry: _decode(os.path.join(root, entry["path"]), input_shape), todo)
+        for done, (entry, pixels) in enumerate(zip(todo, decoded), 1):
+            tensors[entry["row"]] = pixels
+            if verbose and (done % 100 == 0 or done == len(todo)):
+                rate = done / (time.perf_counter() - start)
+                print(f"\r{done}/{len(todo)} images preprocessed ({rate:.0f} img/s)", end="", file=sys.stderr)
+    if verbose and todo:
+        print(file=sys.stderr)
+    if isinstance(tensors, np.memmap):
+        tensors.flush()
+    del tensors
+
+    _write_index(store_dir, {
+        "version": INDEX_VERSION,
+        "root": os.path.abspath(root),
+        "class_names": class_names,
+        "input_shape": input_shape,
+        "rows": capacity,
+        "entries": entries,
+    })
+    return {
+        "images": len(entries),
+        "kept": len(entries) - len(todo),
+        "reprocessed": reprocessed,
+        "added": len(todo) - reprocessed,
+        "removed": len(old_entries),
+    }
+
+
+class TensorCache:
+    """
+    Read-only view of a tensor store built by build_cache().
+
+    Attributes:
+        entries (list): Index entries (path, label, hash, row, ...)
+        tensors (numpy.memmap): uint8 array (rows, height, width, 3)
+    """
+
+    def __init__(self, store_dir):
+        index = _read_index(store_dir)
+        if index is None:
+            raise FileNotFoundError(f"No tensor cache in {store_dir} (run: python tensor_cache.py build ...)")
+        self.store_dir = store_dir
+        self.root = index["root"]
+        self.class_names = index["class_names"]
+        self.input_shape = tuple(index["input_shape"])
+        # Sequential rows: batches are contiguous reads from the memmap
+        self.entries = sorted(index["entries"], key=lambda entry: entry["row"])
+        self.tensors = _open_tensors(store_dir, self.input_shape, index["rows"], "r")
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def labels(self):
+        return np.array([entry["label"] for entry in self.entries])
+
+    def iter_batches(self, batch_size=64, normalize=True):
+        """
+        Yield (entries, batch) pairs in row order.
+
+        With normalize=True the batch is the float32 model input of the
+        pneumonia servers ((x / 127.5) - 1), written into a pooled buffer
+        that is reused for the next batch; otherwise it is the uint8 rows.
+        """
+        rows = np.array([entry["row"] for entry in self.entries], dtype=np.int64)
+        pool = get_buffer_pool(self.input_shape, batch_size)
+        with pool.buffer() as buffer:
+            for start in range(0, len(rows), batch_size):
+                batch_rows = rows[start:start + batch_size]
+                first, last = batch_rows[0], batch_rows[-1]
+                if last - first + 1 == len(batch_rows):
+                    pixels = self.tensors[first:last + 1]  # contiguous: no gather copy
+                else:
+                    pixels = self.tensors[batch_rows]
+                entries = self.entries[start:start + batch_size]
+                if not normalize:
+                    yield entries, np.asarray(pixels)
+                    continue
+                yield entries, normalize_into(pixels, buffer[:len(batch_rows)])
+
+
+def evaluate(cache, model, batch_size=64):
+    """
+    Score every cached image with the pneumonia threshold logic.
+
+    Returns:
+        dict: accuracy, confusion matrix (rows = label, columns = prediction), img/s
+    """
+    from shared_utils import pneumonia_indices
+
+    classes = len(cache.class_names)
+    confusion = np.zeros((classes, classes), dtype=np.int64)
+    start = time.perf_counter()
+    for entries, batch in cache.iter_batches(batch_size):
+        predicted = pneumonia_indices(model.predict(batch, verbose=0))
+        labels = np.array([entry["label"] for entry in entries])
+        np.add.at(confusion, (labels, predicted), 1)
+    elapsed = time.perf_counter() - start
+    return {
+        "images": len(cache),
+        "accuracy": round(float(np.trace(confusion) / max(confusion.sum(), 1)), 4),
+        "confusion_matrix": confusion.tolist(),
+        "class_names": cache.class_names,
+        "images_per_second": round(len(cache) / elapsed, 1) if elapsed else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="create or update a tensor store")
+    build.add_argument("root", help="folder with NORMAL/ and PNEUMONIA/ subdirectories")
+    build.add_argument("store", help="output directory")
+    build.add_argument("--workers", type=int, default=None, help="decoding threads")
+
+    run = commands.add_parser("evaluate", help="score a tensor store with a model")
+    run.add_argument("store", help="tensor store directory")
+    run.add_argument("--model", default=None, help="model file (.h5 or .tflite, default: the bundled model)")
+    run.add_argument("--batch-size", type=int, default=64)
+
+    args = parser.parse_args()
+    if args.command == "build":
+        start = time.perf_counter()
+        counts = build_cache(args.root, args.store, workers=args.workers)
+        print(json.dumps({**counts, "seconds": round(time.perf_counter() - start, 2)}))
+    else:
+        from shared_utils import load_pneumonia_version, default_pneumonia_model_path
+
+        cache = TensorCache(args.store)
+        model = load_pneumonia_version(args.model or default_pneumonia_model_path())
+        print(json.dumps(evaluate(cache, model, args.batch_size), indent=2))
+
+
+if __name__ == "__main__":
+    main()
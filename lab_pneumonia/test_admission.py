@@ -0,0 +1,111 @@
+"""
+Tests for admission.py: 429 when the queue is full, 503 after max_wait, and a
+Retry-After that counts the queued inferences.
+
+Run with: python -m pytest test_admission.py
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from admission import AdmissionController, AdmissionRejected
+
+
+async def hold(admission, release, units=1):
+    async with admission.admit(units=units):
+        await release.wait()
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_full_queue_is_rejected_with_429():
+    async def scenario():
+        admission = AdmissionController("test", max_in_flight=1, max_queue=1, max_wait=5.0, service_time=1.0)
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(hold(admission, release)) for _ in range(2)]
+        await settle()
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire()
+        release.set()
+        await asyncio.gather(*tasks)
+        return admission, rejected.value
+
+    admission, rejected = asyncio.run(scenario())
+    assert rejected.status_code == 429
+    # One request running and one queued, one second each
+    assert rejected.headers == {"Retry-After": "2"}
+    assert admission.stats()["rejected"] == 1
+    assert admission.stats()["in_flight"] == 0
+
+
+def test_request_waiting_past_max_wait_gets_503():
+    async def scenario():
+        admission = AdmissionController("test", max_in_flight=1, max_queue=4, max_wait=0.05, service_time=1.0)
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(admission, release))
+        await settle()
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire()
+        release.set()
+        await holder
+        return admission, rejected.value
+
+    admission, rejected = asyncio.run(scenario())
+    assert rejected.status_code == 503
+    assert int(rejected.headers["Retry-After"]) >= 1
+    stats = admission.stats()
+    assert stats["expired"] == 1
+    assert stats["queued"] == 0 and stats["in_flight"] == 0 and stats["backlog_units"] == 0
+
+
+def test_retry_after_counts_batch_units():
+    async def scenario():
+        admission = AdmissionController("test", max_in_flight=1, max_queue=4, max_wait=5.0, service_time=0.5)
+        release = asyncio.Event()
+        tasks = [
+            asyncio.create_task(hold(admission, release, units=10)),
+            asyncio.create_task(hold(admission, release, units=20)),
+        ]
+        await settle()
+        retry_after = admission.retry_after()
+        release.set()
+        await asyncio.gather(*tasks)
+        return admission, retry_after
+
+    admission, retry_after = asyncio.run(scenario())
+    # 30 inferences at 0.5 s each, not 2 requests
+    assert retry_after == 15
+    assert admission.stats()["backlog_units"] == 0
+
+
+def test_released_slot_goes_to_the_oldest_waiter():
+    async def scenario():
+        admission = AdmissionController("test", max_in_flight=1, max_queue=4, max_wait=5.0)
+        order = []
+
+        async def request(name, release):
+            async with admission.admit():
+                order.append(name)
+                await release.wait()
+
+        releases = [asyncio.Event() for _ in range(3)]
+        tasks = []
+        for index, release in enumerate(releases):
+            tasks.append(asyncio.create_task(request(index, release)))
+            await settle()
+        for release in releases:
+            release.set()
+            await settle()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == [0, 1, 2]
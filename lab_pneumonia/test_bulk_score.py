@@ -0,0 +1,118 @@
+"""
+Tests for bulk_score.py: resuming an interrupted run.
+
+Run with: python -m pytest test_bulk_score.py
+"""
+
+import csv
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import bulk_score
+
+
+class FakeModel:
+    """Deterministic stand-in for the pneumonia model (no TensorFlow needed)."""
+
+    def __init__(self):
+        self.seen = 0
+
+    def predict(self, batch, verbose=0):
+        self.seen += len(batch)
+        pneumonia = (np.asarray(batch).reshape(len(batch), -1).mean(axis=1) + 1) / 2
+        return np.stack([pneumonia, 1 - pneumonia], axis=1)
+
+
+@pytest.fixture
+def image_dir(tmp_path):
+    root = tmp_path / "images"
+    for label in ("NORMAL", "PNEUMONIA"):
+        (root / label).mkdir(parents=True)
+        for index in range(3):
+            value = 40 * index + (120 if label == "PNEUMONIA" else 0)
+            Image.new("RGB", (64, 48), (value, value, value)).save(root / label / f"{index}.png")
+    return root
+
+
+def run(image_dir, output, model, monkeypatch):
+    monkeypatch.setattr(bulk_score, "load_pneumonia_version", lambda path: model)
+    monkeypatch.setattr(sys, "argv", ["bulk_score.py", str(image_dir), str(output),
+                                      "--batch-size", "2", "--workers", "2"])
+    bulk_score.main()
+
+
+def read_csv(path):
+    with open(path, newline="") as f:
+        return {row["path"]: row for row in csv.DictReader(f)}
+
+
+def test_resume_after_row_cut_mid_write(image_dir, tmp_path, monkeypatch):
+    output = tmp_path / "results.csv"
+    run(image_dir, output, FakeModel(), monkeypatch)
+    expected = read_csv(output)
+    assert len(expected) == 6
+
+    # Simulate a run killed while writing the last row
+    with open(output) as f:
+        lines = f.readlines()
+    last_path = lines[-1].split(",")[0]
+    with open(output, "w") as f:
+        f.writelines(lines[:-1])
+        f.write(lines[-1][:len(last_path) + 5])
+
+    model = FakeModel()
+    run(image_dir, output, model, monkeypatch)
+    assert model.seen == 1
+    assert read_csv(output) == expected
+
+
+def test_resume_skips_scored_images(image_dir, tmp_path, monkeypatch):
+    output = tmp_path / "results.jsonl"
+    run(image_dir, output, FakeModel(), monkeypatch)
+
+    # Keep the first two results, plus half of the third line
+    with open(output) as f:
+        lines = f.readlines()
+    with open(output, "w") as f:
+        f.writelines(lines[:2])
+        f.write(lines[2][:10])
+
+    model = FakeModel()
+    run(image_dir, output, model, monkeypatch)
+    assert model.seen == 4
+    with open(output) as f:
+        rows = [json.loads(line) for line in f]
+    assert sorted(row["path"] for row in rows) == sorted(bulk_score.find_images(str(image_dir)))
+
+
+def test_csv_done_paths_ignores_short_rows(tmp_path):
+    output = tmp_path / "results.csv"
+    output.write_text("path,prediction,confidence,pneumonia_probability,error\n"
+                      "NORMAL/a.png,NORMAL,0.9,0.1,\n"
+                      "NORMAL/b.png,NORM")
+    assert bulk_score.CSVWriter.done_paths(str(output)) == {"NORMAL/a.png"}
+
+
+@pytest.mark.parametrize("extension", [".csv", ".jsonl"])
+def test_failed_images_are_not_counted_and_retried_on_resume(image_dir, tmp_path, monkeypatch, capsys, extension):
+    broken = image_dir / "NORMAL" / "broken.png"
+    broken.write_bytes(b"not an image")
+    output = tmp_path / f"results{extension}"
+    run(image_dir, output, FakeModel(), monkeypatch)
+    assert "Done: 6 images scored (1 errors)" in capsys.readouterr().err
+    assert bulk_score.WRITERS[extension].done_paths(str(output)) == \
+        set(bulk_score.find_images(str(image_dir))) - {"NORMAL/broken.png"}
+
+    # Once the file is fixed, only that image is scored again
+    Image.new("RGB", (64, 48), (10, 10, 10)).save(broken, format="PNG")
+    model = FakeModel()
+    run(image_dir, output, model, monkeypatch)
+    assert model.seen == 1
+    assert "1 to score" in capsys.readouterr().err
+    assert bulk_score.WRITERS[extension].done_paths(str(output)) == set(bulk_score.find_images(str(image_dir)))
@@ -0,0 +1,88 @@
+"""
+Tests for cascade.py: threshold validation and early exits that never
+change the class given by PNEUMONIA_THRESHOLD.
+
+Run with: python -m pytest test_cascade.py
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import cascade
+from cascade import CascadeModel, early_exit_mask, validate_thresholds
+from shared_utils import PNEUMONIA_THRESHOLD, pneumonia_indices
+
+
+class TableModel:
+    """Fake model: each input is a row index into a fixed table of PNEUMONIA probabilities."""
+
+    def __init__(self, probabilities):
+        self.probabilities = np.asarray(probabilities, dtype=np.float32)
+        self.seen = []
+
+    def predict(self, data, verbose=0):
+        rows = np.asarray(data).reshape(len(data), -1)[:, 0].astype(int)
+        self.seen.extend(rows.tolist())
+        pneumonia = self.probabilities[rows]
+        return np.stack([pneumonia, 1 - pneumonia], axis=1)
+
+
+@pytest.fixture(autouse=True)
+def clean_registry():
+    yield
+    cascade.CASCADES.pop("test", None)
+
+
+@pytest.mark.parametrize("low, high", [
+    (-0.1, 0.99),                        # below 0
+    (0.1, 1.5),                          # above 1
+    (0.5, 0.4),                          # low above high
+    (PNEUMONIA_THRESHOLD + 0.01, 0.999), # an early NORMAL exit could be PNEUMONIA
+    (0.1, PNEUMONIA_THRESHOLD),          # an early PNEUMONIA exit could be NORMAL
+])
+def test_validate_thresholds_rejects(low, high):
+    with pytest.raises(ValueError):
+        validate_thresholds(low, high)
+
+
+@pytest.mark.parametrize("low, high", [(0.0, 1.0), (0.02, 0.995), (PNEUMONIA_THRESHOLD, PNEUMONIA_THRESHOLD + 0.01)])
+def test_validate_thresholds_accepts(low, high):
+    validate_thresholds(low, high)
+
+
+def test_invalid_thresholds_are_rejected_by_the_model():
+    model = CascadeModel("test", TableModel([0.5]), TableModel([0.5]))
+    with pytest.raises(ValueError):
+        model.set_thresholds(high=0.5)
+    assert (model.low, model.high) == (cascade.CASCADE_LOW, cascade.CASCADE_HIGH)
+    with pytest.raises(ValueError):
+        CascadeModel("test", TableModel([0.5]), TableModel([0.5]), low=0.99, high=0.999)
+
+
+def test_early_exit_mask_bounds_are_inclusive():
+    prediction = np.array([[0.02, 0.98], [0.021, 0.979], [0.995, 0.005], [0.9949, 0.0051]])
+    assert early_exit_mask(prediction, 0.02, 0.995).tolist() == [True, False, True, False]
+
+
+def test_only_uncertain_rows_reach_the_full_model():
+    stage1 = TableModel([0.01, 0.5, 0.999, 0.9, 0.03])
+    stage2 = TableModel([0.0, 0.97, 1.0, 0.2, 0.0])
+    model = CascadeModel("test", stage1, stage2, low=0.02, high=0.995)
+
+    data = np.arange(5, dtype=np.float32).reshape(5, 1)
+    output = model.predict(data)
+    assert stage2.seen == [1, 3, 4]
+    np.testing.assert_allclose(output[:, 0], [0.01, 0.97, 0.999, 0.2, 0.0])
+    assert pneumonia_indices(output).tolist() == [1, 0, 0, 1, 1]
+    assert model.stats()["early_exits"] == 2 and model.stats()["rows"] == 5
+
+
+def test_all_confident_batch_skips_the_full_model():
+    stage2 = TableModel([0.5])
+    model = CascadeModel("test", TableModel([0.0, 1.0]), stage2)
+    model.predict(np.arange(2, dtype=np.float32).reshape(2, 1))
+    assert stage2.seen == []
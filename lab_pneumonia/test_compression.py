@@ -0,0 +1,93 @@
+"""
+Tests for compression.py: Accept-Encoding negotiation and the Vary header.
+
+Run with: python -m pytest test_compression.py
+"""
+
+import gzip
+import os
+import sys
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import compression
+from compression import CompressionMiddleware, negotiate
+
+ENCODINGS = ["zstd", "br", "gzip"]
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("", None),
+    ("gzip", "gzip"),
+    ("gzip, br", "br"),                     # equal q: server preference order
+    ("gzip;q=1.0, br;q=0.5", "gzip"),
+    ("br;q=0, gzip;q=0.1", "gzip"),         # q=0 means "not acceptable"
+    ("*", "zstd"),
+    ("*;q=0.5, zstd;q=0", "br"),            # explicit q beats the wildcard
+    ("GZIP;q=0.8", "gzip"),
+    ("gzip;q=abc", None),                   # invalid q is treated as 0
+    ("identity", None),
+    ("deflate, compress", None),
+])
+def test_negotiate(header, expected):
+    assert negotiate(header, ENCODINGS) == expected
+
+
+def test_negotiate_only_offers_installed_codecs():
+    assert negotiate("zstd, br, gzip") == compression.AVAILABLE_ENCODINGS[0]
+    assert "gzip" in compression.AVAILABLE_ENCODINGS
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, min_size=100, route_levels={"/chat": {}})
+
+    @app.get("/large")
+    def large():
+        return PlainTextResponse("x" * 5000)
+
+    @app.get("/small")
+    def small():
+        return PlainTextResponse("ok", headers={"Vary": "Origin"})
+
+    @app.get("/chat")
+    def chat():
+        return PlainTextResponse("x" * 5000)
+
+    return TestClient(app)
+
+
+def test_compressed_response(client):
+    response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.text == "x" * 5000
+
+
+def test_vary_on_uncompressed_responses_of_negotiated_routes(client):
+    # Without Accept-Encoding: a shared cache must not serve this copy to gzip clients
+    response = client.get("/large", headers={"Accept-Encoding": ""})
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+
+    # Too small to compress: still Vary, merged with the route's own value
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Origin, Accept-Encoding"
+
+
+def test_disabled_route_is_left_alone(client):
+    response = client.get("/chat", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert "vary" not in response.headers
+
+
+def test_compress_gzip_is_deterministic():
+    data = b"abc" * 1000
+    assert compression.compress(data, "gzip") == compression.compress(data, "gzip")
+    assert gzip.decompress(compression.compress(data, "gzip")) == data
@@ -0,0 +1,55 @@
+"""
+Tests for fast_json.py: NumPy values must reach the client when an endpoint
+returns FastJSONResponse explicitly.
+
+Run with: python -m pytest test_fast_json.py
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import fast_json
+from fast_json import FastJSONResponse
+
+PAYLOAD = {
+    "confidence": np.float32(0.75),
+    "count": np.int64(3),
+    "probabilities": np.array([[0.25, 0.75]], dtype=np.float32),
+}
+EXPECTED = {"confidence": 0.75, "count": 3, "probabilities": [[0.25, 0.75]]}
+
+
+@pytest.fixture
+def client():
+    app = FastAPI(default_response_class=FastJSONResponse)
+
+    @app.get("/explicit")
+    def explicit():
+        return FastJSONResponse(PAYLOAD)
+
+    @app.get("/default")
+    def default():
+        return PAYLOAD
+
+    return TestClient(app, raise_server_exceptions=False)
+
+
+def test_dumps_encodes_numpy_values():
+    assert fast_json.loads(fast_json.dumps(PAYLOAD)) == EXPECTED
+
+
+def test_explicit_response_encodes_numpy_values(client):
+    response = client.get("/explicit")
+    assert response.status_code == 200
+    assert response.json() == EXPECTED
+
+
+def test_default_response_class_goes_through_jsonable_encoder(client):
+    # Only the default class: FastAPI's jsonable_encoder runs first and rejects NumPy values
+    assert client.get("/default").status_code == 500
@@ -0,0 +1,167 @@
+"""
+Tests for inference_server.py: shared-memory IPC between workers and the
+inference process, and workers that keep working across a restart of it.
+
+Run with: python -m pytest test_inference_server.py
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing import AuthenticationError
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import inference_server
+
+AUTHKEY = "test-secret"
+
+# Inference process with a fake fruits model: output = mean of each sample, twice
+SERVER = """
+import sys
+sys.path.insert(0, {lab_dir!r})
+import inference_server
+inference_server.MODEL_LOADERS["fruits"] = lambda: (lambda batch: batch.reshape(len(batch), -1).mean(axis=1)[:, None].repeat(2, axis=1))
+inference_server.InferenceServer(("127.0.0.1", {port}), authkey=b{authkey!r}, models=["fruits"], slots=4).serve_forever()
+"""
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port):
+    code = SERVER.format(lab_dir=os.path.dirname(os.path.abspath(__file__)), port=port, authkey=AUTHKEY)
+    process = subprocess.Popen([sys.executable, "-c", code], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    for line in process.stdout:
+        if "listening" in line:
+            return process
+    raise RuntimeError("inference server did not start")
+
+
+def stop_server(process):
+    process.kill()
+    process.wait()
+
+
+def predict_eventually(model, data, seconds=10):
+    deadline = time.monotonic() + seconds
+    while True:
+        try:
+            return model.predict(data)
+        except ConnectionError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+@pytest.fixture
+def server_port(monkeypatch):
+    port = free_port()
+    monkeypatch.setattr(inference_server, "INFERENCE_SERVER_ADDRESS", f"127.0.0.1:{port}")
+    monkeypatch.setattr(inference_server, "INFERENCE_SERVER_AUTHKEY", AUTHKEY.encode())
+    monkeypatch.setattr(inference_server, "INFERENCE_SERVER_RECONNECT_SECONDS", 0.05)
+    monkeypatch.setattr(inference_server, "_client", None)
+    monkeypatch.setattr(inference_server, "_connect_failures", 0)
+    monkeypatch.setattr(inference_server, "_next_connect", 0.0)
+    return port
+
+
+def test_client_reconnects_after_server_restart(server_port):
+    data = np.stack([np.full((32, 32, 3), value, dtype=np.float32) for value in (0.25, 0.5)])
+    expected = np.array([[0.25, 0.25], [0.5, 0.5]], dtype=np.float32)
+
+    server = start_server(server_port)
+    try:
+        model = inference_server.remote_model("fruits")
+        np.testing.assert_allclose(model.predict(data), expected)
+        first_client = inference_server.get_client()
+
+        stop_server(server)
+        # Down: requests fail fast with ConnectionError (503), not a stale client forever
+        with pytest.raises(ConnectionError):
+            for _ in range(100):
+                model.predict(data)
+                time.sleep(0.01)
+
+        server = start_server(server_port)
+        np.testing.assert_allclose(predict_eventually(model, data), expected)
+        assert inference_server.get_client() is not first_client
+    finally:
+        stop_server(server)
+
+
+def test_reconnection_backs_off(server_port):
+    with pytest.raises(ConnectionError, match="unavailable"):
+        inference_server.get_client()
+    # The next attempt is not due yet: no new connection is tried
+    with pytest.raises(ConnectionError, match="next connection attempt"):
+        inference_server.get_client()
+
+
+@pytest.fixture
+def running_server(server_port):
+    server = start_server(server_port)
+    yield ("127.0.0.1", server_port)
+    stop_server(server)
+
+
+def samples(values):
+    return np.stack([np.full((32, 32, 3), value, dtype=np.float32) for value in values])
+
+
+def test_batch_larger_than_the_slot_ring(running_server):
+    client = inference_server.InferenceClient(running_server, AUTHKEY.encode())
+    try:
+        # 10 rows through 4 slots: slots are reused and rows come back in order
+        values = np.linspace(0, 1, 10, dtype=np.float32)
+        outputs = client.predict("fruits", samples(values))
+        np.testing.assert_allclose(outputs, np.stack([values, values], axis=1), rtol=1e-6)
+        assert client.predict("fruits", np.empty((0, 32, 32, 3), dtype=np.float32)).shape == (0, 2)
+    finally:
+        client.close()
+
+
+def test_concurrent_requests_get_their_own_outputs(running_server):
+    client = inference_server.InferenceClient(running_server, AUTHKEY.encode())
+    results, errors = {}, []
+
+    def worker(index):
+        try:
+            values = [index / 10, index / 10 + 0.01, index / 10 + 0.02]
+            for _ in range(10):
+                output = client.predict("fruits", samples(values))
+                np.testing.assert_allclose(output[:, 0], values, rtol=1e-6)
+            results[index] = True
+        except Exception as e:  # surfaced by the assertion below
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(8)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+    finally:
+        client.close()
+    assert not errors and len(results) == 8
+
+
+def test_unknown_model_and_wrong_authkey(running_server):
+    with pytest.raises(AuthenticationError):
+        inference_server.InferenceClient(running_server, b"wrong-secret")
+    # The server keeps accepting good clients after a rejected handshake
+    client = inference_server.InferenceClient(running_server, AUTHKEY.encode())
+    try:
+        assert client.models == ["fruits"]
+        with pytest.raises(KeyError):
+            client.predict("pneumonia", np.zeros((1, 224, 224, 3), dtype=np.float32))
+    finally:
+        client.close()
@@ -0,0 +1,156 @@
+"""
+Tests for model_manager.py: hot swap under concurrent predicts, shadow
+evaluation and failed loads.
+
+Run with: python -m pytest test_model_manager.py
+"""
+
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import model_manager
+from model_manager import ModelManager
+
+INPUT_SHAPE = (2,)
+
+
+class VersionModel:
+    """Fake model: every row of the output is [version, 0] (or [0, version] when flipped)."""
+
+    def __init__(self, version, delay=0.0, flipped=False):
+        self.version = version
+        self.delay = delay
+        self.flipped = flipped
+        self.calls = 0
+        self.gate = None  # threading.Event blocking predict() when set by a test
+
+    def predict(self, data, verbose=0):
+        self.calls += 1
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.delay:
+            time.sleep(self.delay)
+        row = [0.0, self.version] if self.flipped else [self.version, 0.0]
+        return np.tile(np.asarray(row, dtype=np.float32), (len(data), 1))
+
+
+def loader_for(models):
+    def loader(source):
+        if isinstance(models[source], Exception):
+            raise models[source]
+        return models[source]
+    return loader
+
+
+@pytest.fixture
+def batch():
+    return np.zeros((3, *INPUT_SHAPE), dtype=np.float32)
+
+
+@pytest.fixture(autouse=True)
+def clean_registry():
+    yield
+    model_manager.MODEL_MANAGERS.pop("test", None)
+
+
+def test_swap_under_concurrent_predicts(batch):
+    manager = ModelManager("test", loader_for({"v2": VersionModel(2, delay=0.001)}), INPUT_SHAPE)
+    manager.set(VersionModel(1, delay=0.001), "v1")
+    stop = threading.Event()
+    seen, errors = [[] for _ in range(4)], []
+
+    def client(index):
+        while not stop.is_set():
+            try:
+                seen[index].append(float(manager.predict(batch)[0, 0]))
+            except Exception as e:  # surfaced by the assertion below
+                errors.append(e)
+
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(4)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    manager.load("v2").join(5)
+    time.sleep(0.05)
+    stop.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert not errors
+    for values in seen:
+        # Every call is served by one whole version, and never goes back to v1 after v2
+        assert set(values) <= {1.0, 2.0}
+        assert values == sorted(values)
+        assert values[-1] == 2.0
+    assert manager.stats()["current"]["version"] == 2
+    assert manager.stats()["current"]["source"] == "v2"
+
+
+def test_in_flight_call_finishes_on_its_version(batch):
+    old = VersionModel(1)
+    manager = ModelManager("test", loader_for({"v2": VersionModel(2)}), INPUT_SHAPE)
+    manager.set(old, "v1")
+    old.gate = threading.Event()
+    result = {}
+    caller = threading.Thread(target=lambda: result.setdefault("output", manager.predict(batch)))
+    caller.start()
+    while old.calls == 0:
+        time.sleep(0.001)
+
+    manager.load("v2").join(5)
+    assert manager.predict(batch)[0, 0] == 2.0
+    old.gate.set()
+    caller.join(5)
+    assert result["output"][0, 0] == 1.0
+
+
+def test_failed_load_keeps_serving(batch):
+    manager = ModelManager("test", loader_for({"broken": OSError("no such file")}), INPUT_SHAPE)
+    manager.set(VersionModel(1), "v1")
+    manager.load("broken").join(5)
+    assert manager.predict(batch)[0, 0] == 1.0
+    stats = manager.stats()
+    assert stats["state"] == "ready"
+    assert stats["last_error"] == "OSError: no such file"
+    assert stats["current"]["version"] == 1
+
+
+def test_second_load_while_loading_is_refused():
+    slow = VersionModel(2)
+    slow.gate = threading.Event()
+    manager = ModelManager("test", loader_for({"v2": slow}), INPUT_SHAPE)
+    thread = manager.load("v2")
+    with pytest.raises(RuntimeError):
+        manager.load("v2")
+    slow.gate.set()
+    thread.join(5)
+    assert manager.stats()["state"] == "ready"
+
+
+def test_shadow_candidate_never_changes_responses(batch):
+    candidate = VersionModel(2, flipped=True)
+    manager = ModelManager("test", loader_for({"v2": candidate}), INPUT_SHAPE)
+    manager.set(VersionModel(1), "v1")
+    manager.load("v2", mode="shadow", shadow_rate=1.0).join(5)
+    warmup_calls = candidate.calls
+
+    outputs = [manager.predict(batch) for _ in range(5)]
+    assert all(output[0, 0] == 1.0 for output in outputs)
+    deadline = time.monotonic() + 5
+    while manager.shadow_stats.sampled < 5 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    stats = manager.stats()
+    assert candidate.calls - warmup_calls == 5
+    assert stats["shadow"]["rows"] == 15
+    assert stats["shadow"]["agreement"] == 0.0  # flipped argmax on every row
+
+    manager.promote()
+    assert manager.predict(batch)[0, 1] == 2.0
+    assert manager.stats()["candidate"] is None
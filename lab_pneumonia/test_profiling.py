@@ -0,0 +1,115 @@
+"""
+Tests for profiling.py: per-request stage timings for authorized requests
+only, and the worker stack sampler.
+
+Run with: python -m pytest test_profiling.py
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import profiling
+from profiling import ProfilingMiddleware, StackSampler, StageTimer, stage
+
+ADMIN_TOKEN = "secret"
+
+
+def infer():
+    with stage("inference"):
+        time.sleep(0.01)
+    return {"ok": True}
+
+
+@pytest.fixture
+def client(tmp_path):
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware, authorize=lambda token: token == ADMIN_TOKEN,
+                       profile_dir=str(tmp_path))
+
+    @app.get("/predict")
+    async def predict():
+        with stage("decode"):
+            time.sleep(0.005)
+        # stage() must also work in the threadpool (the context is copied)
+        return await run_in_threadpool(infer)
+
+    return TestClient(app)
+
+
+def timings(response):
+    return dict(item.strip().split(";dur=") for item in response.headers["server-timing"].split(","))
+
+
+def test_profiled_request_reports_its_stages(client, tmp_path):
+    response = client.get("/predict", headers={"X-Profile": "1", "X-Admin-Token": ADMIN_TOKEN})
+    assert response.json() == {"ok": True}
+    stages = timings(response)
+    assert set(stages) == {"decode", "inference", "other", "total"}
+    assert float(stages["inference"]) >= 10 and float(stages["decode"]) >= 5
+    assert float(stages["total"]) >= float(stages["inference"]) + float(stages["decode"])
+
+    path = response.headers["x-profile-file"]
+    assert os.path.dirname(path) == str(tmp_path)
+    with open(path) as f:
+        folded = dict(line.rsplit(" ", 1) for line in f.read().splitlines())
+    assert set(folded) == {"predict", "predict;decode", "predict;inference"}
+
+
+@pytest.mark.parametrize("headers", [
+    {},
+    {"X-Profile": "1"},
+    {"X-Profile": "1", "X-Admin-Token": "wrong"},
+])
+def test_unauthorized_or_unrequested_requests_are_not_profiled(client, tmp_path, headers):
+    response = client.get("/predict", headers=headers)
+    assert response.status_code == 200
+    assert "server-timing" not in response.headers
+    assert not os.listdir(tmp_path)
+
+
+def test_query_parameter_requests_a_profile(client):
+    response = client.get("/predict?profile=1", headers={"X-Admin-Token": ADMIN_TOKEN})
+    assert "inference" in timings(response)
+
+
+def test_stage_outside_a_profiled_request_is_a_no_op():
+    with stage("decode"):
+        pass
+    assert profiling._current_timer.get() is None
+
+
+def test_nested_stages_fold_to_self_time():
+    timer = StageTimer(root="req")
+    with timer.stage("inference"):
+        with timer.stage("invoke"):
+            time.sleep(0.01)
+    timer.stop()
+    folded = {path: int(us) for path, us in (line.rsplit(" ", 1) for line in timer.folded().splitlines())}
+    assert folded["req;inference;invoke"] >= 10000
+    assert folded["req;inference"] < folded["req;inference;invoke"]
+    assert set(timer.breakdown()) == {"inference", "other", "total"}
+
+
+def test_stack_sampler_sees_other_threads():
+    stop = threading.Event()
+
+    def busy_worker():
+        while not stop.is_set():
+            time.sleep(0.001)
+
+    thread = threading.Thread(target=busy_worker, name="busy")
+    thread.start()
+    try:
+        folded = StackSampler(interval=0.001).run(0.05)
+    finally:
+        stop.set()
+        thread.join()
+    assert any(line.startswith("busy;") and "busy_worker" in line for line in folded.splitlines())
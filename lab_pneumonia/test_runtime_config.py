@@ -0,0 +1,57 @@
+"""
+Tests for runtime_config.py: the BLAS thread cap must reach the library
+numpy actually loaded, in the processes the servers run.
+
+Run with: python -m pytest test_runtime_config.py
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+LAB_DIR = os.path.dirname(os.path.abspath(__file__))
+MCP_DIR = os.path.join(os.path.dirname(LAB_DIR), "appcontrole", "mcp_server")
+
+PROBE = """
+import json, sys
+import {module}
+import runtime_config
+config = runtime_config.apply()
+print(json.dumps({{"blas_threads": runtime_config.blas_threads(), "threads": config["threads"]}}))
+"""
+
+
+def effective_threads(module, cwd, tmp_path, threads=1):
+    env = {key: value for key, value in os.environ.items()
+           if key not in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")}
+    env.update(INFERENCE_THREADS=str(threads), INFERENCE_WORKERS="1", CPU_PINNING="0",
+               MCP_STUDENT_DB=str(tmp_path / "students.sqlite3"))
+    completed = subprocess.run([sys.executable, "-c", PROBE.format(module=module)], cwd=cwd, env=env,
+                               capture_output=True, text=True, timeout=300)
+    assert completed.returncode == 0, completed.stderr
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    if result["blas_threads"] is None:
+        pytest.skip("numpy is not linked against OpenBLAS")
+    return result
+
+
+@pytest.mark.parametrize("module, cwd", [
+    ("main", os.path.join(LAB_DIR, "fastapi_deployment")),
+    ("main", MCP_DIR),
+    ("inference_server", LAB_DIR),
+    ("tensor_cache", LAB_DIR),
+])
+def test_app_caps_blas_threads(module, cwd, tmp_path):
+    result = effective_threads(module, cwd, tmp_path)
+    assert result["threads"] == 1
+    assert result["blas_threads"] == 1
+
+
+def test_cap_applied_when_numpy_was_imported_first(tmp_path):
+    # Set through the OpenBLAS C API, which (unlike the environment) is not
+    # bounded by the CPU count: 2 threads shows the call reached the library
+    result = effective_threads("numpy", LAB_DIR, tmp_path, threads=2)
+    assert result["blas_threads"] == 2
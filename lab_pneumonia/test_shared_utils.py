@@ -0,0 +1,97 @@
+"""
+Tests for the pooled preprocessing of shared_utils.py: results written into
+reused buffers must match freshly allocated ones.
+
+Run with: python -m pytest test_shared_utils.py
+"""
+
+import os
+import sys
+import threading
+
+import numpy as np
+from PIL import Image
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from shared_utils import (
+    InputBufferPool, classify_image, get_buffer_pool, normalize_image_array,
+    normalize_into, preprocess_image
+)
+
+CLASS_NAMES = ["PNEUMONIA", "NORMAL"]
+
+
+class MeanModel:
+    """Fake pneumonia model: the PNEUMONIA probability is the scaled input mean."""
+
+    def predict(self, data, verbose=0):
+        pneumonia = (np.asarray(data).reshape(len(data), -1).mean(axis=1) + 1) / 2
+        return np.stack([pneumonia, 1 - pneumonia], axis=1)
+
+
+def test_normalize_into_matches_reference():
+    pixels = np.arange(256, dtype=np.uint8).reshape(16, 16, 1).repeat(3, axis=2)
+    out = np.full((16, 16, 3), np.nan, dtype=np.float32)
+    assert normalize_into(pixels, out) is out
+    np.testing.assert_allclose(out, pixels.astype(np.float32) / 127.5 - 1, rtol=0, atol=1e-6)
+    assert out.min() == -1.0 and out.max() == 1.0
+
+
+def test_preprocess_into_a_pooled_buffer_matches_allocation():
+    image = Image.fromarray(np.random.default_rng(0).integers(0, 256, (300, 200, 3), dtype=np.uint8))
+    expected = preprocess_image(image)
+    buffer = np.full((1, 224, 224, 3), 7.0, dtype=np.float32)  # stale contents of a reused buffer
+    assert preprocess_image(image, out=buffer) is buffer
+    np.testing.assert_array_equal(buffer, expected)
+    assert expected.shape == (1, 224, 224, 3) and expected.dtype == np.float32
+
+
+def test_pool_reuses_and_caps_buffers():
+    pool = InputBufferPool((4, 4, 3), batch_size=2, max_buffers=1)
+    first, second = pool.acquire(), pool.acquire()
+    assert first is not second
+    assert first.shape == (2, 4, 4, 3) and first.dtype == np.float32
+    pool.release(first)
+    pool.release(second)  # over max_buffers: dropped
+    assert pool.acquire() is first
+    assert pool.acquire() is not second
+
+    with pool.buffer() as borrowed:
+        pass
+    assert pool.acquire() is borrowed
+
+
+def test_get_buffer_pool_is_shared_per_shape_and_batch():
+    assert get_buffer_pool((8, 8, 3)) is get_buffer_pool([8, 8, 3])
+    assert get_buffer_pool((8, 8, 3)) is not get_buffer_pool((8, 8, 3), batch_size=4)
+
+
+def test_classify_image_with_reused_buffers_from_threads():
+    # Every thread reuses pooled buffers: no result may depend on a previous request
+    images = [Image.new("RGB", (64, 64), (value, value, value)) for value in (0, 60, 120, 250)]
+    model = MeanModel()
+    expected = [classify_image(image, model, CLASS_NAMES) for image in images]
+    results, errors = {}, []
+
+    def worker(index):
+        try:
+            for _ in range(20):
+                assert classify_image(images[index % 4], model, CLASS_NAMES) == expected[index % 4]
+            results[index] = True
+        except Exception as e:  # surfaced by the assertion below
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors and len(results) == 8
+    assert expected[-1][0] == "PNEUMONIA" and expected[0][0] == "NORMAL"
+
+
+def test_normalize_image_array_allocates_when_no_buffer_is_given():
+    pixels = np.zeros((8, 8, 3), dtype=np.uint8)
+    out = normalize_image_array(pixels)
+    assert out.shape == (1, 8, 8, 3)
+    assert (out == -1.0).all()
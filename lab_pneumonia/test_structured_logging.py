@@ -0,0 +1,95 @@
+"""
+Tests for structured_logging.py: route sampling, JSON records and the
+runtime configuration.
+
+Run with: python -m pytest test_structured_logging.py
+"""
+
+import io
+import json
+import logging
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import structured_logging
+from structured_logging import JSONFormatter, SamplingFilter, parse_sample_rates
+
+
+def record(level=logging.INFO, route=None, **extra):
+    entry = logging.LogRecord("lab_pneumonia.test", level, __file__, 1, "message %s", ("arg",), None)
+    if route is not None:
+        entry.route = route
+    for key, value in extra.items():
+        setattr(entry, key, value)
+    return entry
+
+
+def test_parse_sample_rates():
+    assert parse_sample_rates("/predict=0.1, /fruits/predict=2,/bad=x,=") == {"/predict": 0.1, "/fruits/predict": 1.0}
+    assert parse_sample_rates(None) == {}
+
+
+def test_sampling_drops_info_records_of_sampled_routes():
+    sampler = SamplingFilter({"/predict": 0.0, "/half": 0.5})
+    assert not sampler.filter(record(route="/predict"))
+    assert not sampler.filter(record(logging.DEBUG, route="/predict"))
+    # Other routes and records without a route are not sampled
+    assert sampler.filter(record(route="/health"))
+    assert sampler.filter(record())
+    kept = sum(sampler.filter(record(route="/half")) for _ in range(2000))
+    assert 800 < kept < 1200
+
+
+@pytest.mark.parametrize("level", [logging.WARNING, logging.ERROR, logging.CRITICAL])
+def test_sampling_keeps_warning_and_above(level):
+    sampler = SamplingFilter({"/predict": 0.0})
+    assert sampler.filter(record(level, route="/predict"))
+
+
+def test_json_formatter_flattens_fields():
+    line = JSONFormatter().format(record(route="/predict", fields={"class": "apple", "confidence": 0.9}))
+    entry = json.loads(line)
+    assert entry["message"] == "message arg"
+    assert entry["level"] == "INFO"
+    assert entry["route"] == "/predict"
+    assert entry["class"] == "apple" and entry["confidence"] == 0.9
+    assert "fields" not in entry
+
+
+@pytest.fixture
+def logging_setup():
+    stream = io.StringIO()
+    logger = structured_logging.setup_logging("INFO", sample_rates={"/predict": 0.0}, stream=stream)
+    yield logger, stream
+    structured_logging.shutdown_logging()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+
+
+def test_queued_records_reach_the_stream(logging_setup):
+    logger, stream = logging_setup
+    logger.info("sampled out", extra={"route": "/predict"})
+    logger.warning("kept", extra={"route": "/predict"})
+    try:
+        raise RuntimeError("boom")
+    except RuntimeError:
+        logger.exception("failed", extra={"route": "/predict"})
+    structured_logging.shutdown_logging()
+
+    entries = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [entry["message"] for entry in entries] == ["kept", "failed"]
+    assert "RuntimeError: boom" in entries[1]["exc_info"]
+
+
+def test_set_log_config(logging_setup):
+    config = structured_logging.set_log_config(level="warning", sample_rates={"/predict": 0.5})
+    assert config["level"] == "WARNING"
+    assert config["sample_rates"] == {"/predict": 0.5}
+    with pytest.raises(ValueError):
+        structured_logging.set_log_config(level="LOUD")
+    with pytest.raises(ValueError):
+        structured_logging.set_log_config(sample_rates={"/predict": 1.5})
+    assert structured_logging.get_log_config()["sample_rates"] == {"/predict": 0.5}
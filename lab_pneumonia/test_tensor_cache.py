@@ -0,0 +1,125 @@
+"""
+Tests for tensor_cache.py: incremental rebuilds of the tensor store, and
+cached batches identical to the servers' preprocessing.
+
+Run with: python -m pytest test_tensor_cache.py
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import tensor_cache
+from shared_utils import preprocess_image
+
+CLASS_NAMES = ["NORMAL", "PNEUMONIA"]
+INPUT_SHAPE = (8, 8, 3)
+
+
+def save_image(root, relative, value):
+    path = root / relative
+    path.parent.mkdir(parents=True, exist_ok=True)
+    Image.new("RGB", (24, 16), (value, 255 - value, value // 2)).save(path)
+
+
+def build(root, store):
+    return tensor_cache.build_cache(str(root), str(store), class_names=CLASS_NAMES,
+                                    input_shape=INPUT_SHAPE, workers=2, verbose=False)
+
+
+def cached_pixels(cache):
+    return {entry["path"]: np.array(cache.tensors[entry["row"]]) for entry in cache.entries}
+
+
+def expected_pixels(root, cache):
+    return {entry["path"]: tensor_cache._decode(os.path.join(root, entry["path"]), INPUT_SHAPE)
+            for entry in cache.entries}
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    root = tmp_path / "images"
+    for index in range(3):
+        save_image(root, f"NORMAL/{index}.png", 10 + index * 20)
+        save_image(root, f"PNEUMONIA/{index}.png", 150 + index * 20)
+    return root
+
+
+def test_incremental_rebuild_keeps_open_readers_consistent(dataset, tmp_path):
+    store = tmp_path / "store"
+    assert build(dataset, store)["added"] == 6
+    reader = tensor_cache.TensorCache(str(store))
+    before = cached_pixels(reader)
+
+    save_image(dataset, "NORMAL/0.png", 200)      # changed
+    os.remove(dataset / "PNEUMONIA/1.png")        # deleted
+    save_image(dataset, "PNEUMONIA/3.png", 90)    # added
+    counts = build(dataset, store)
+    assert counts == {"images": 6, "kept": 4, "reprocessed": 1, "added": 1, "removed": 1}
+
+    # The reader still sees the pixels of the index it opened
+    assert cached_pixels(reader).keys() == before.keys()
+    for path, pixels in cached_pixels(reader).items():
+        np.testing.assert_array_equal(pixels, before[path])
+
+    cache = tensor_cache.TensorCache(str(store))
+    expected = expected_pixels(dataset, cache)
+    for path, pixels in cached_pixels(cache).items():
+        np.testing.assert_array_equal(pixels, expected[path])
+
+
+def test_freed_rows_are_reused_by_the_next_build(dataset, tmp_path):
+    store = tmp_path / "store"
+    build(dataset, store)
+    save_image(dataset, "NORMAL/1.png", 220)
+    build(dataset, store)
+    index = tensor_cache._read_index(str(store))
+    assert index["rows"] == 7  # the changed image went to a new row
+
+    save_image(dataset, "NORMAL/2.png", 230)
+    build(dataset, store)
+    index = tensor_cache._read_index(str(store))
+    assert index["rows"] == 7  # ... and its old row was reused
+    rows = [entry["row"] for entry in index["entries"]]
+    assert len(set(rows)) == len(rows)
+
+    cache = tensor_cache.TensorCache(str(store))
+    expected = expected_pixels(dataset, cache)
+    for path, pixels in cached_pixels(cache).items():
+        np.testing.assert_array_equal(pixels, expected[path])
+
+
+def test_touched_but_identical_file_is_not_reprocessed(dataset, tmp_path):
+    store = tmp_path / "store"
+    build(dataset, store)
+    path = dataset / "NORMAL/0.png"
+    os.utime(path, ns=(path.stat().st_atime_ns, path.stat().st_mtime_ns + 10**9))
+    counts = build(dataset, store)
+    assert counts["kept"] == 6 and counts["reprocessed"] == 0
+
+
+def test_normalized_batches_match_server_preprocessing(dataset, tmp_path):
+    build(dataset, tmp_path / "store")
+    cache = tensor_cache.TensorCache(str(tmp_path / "store"))
+    assert len(cache) == 6
+    assert sorted(cache.labels.tolist()) == [0, 0, 0, 1, 1, 1]
+
+    seen = []
+    for entries, batch in cache.iter_batches(batch_size=4):  # 4 + 2: partial last batch
+        assert batch.dtype == np.float32 and len(batch) == len(entries)
+        for entry, row in zip(entries, batch):
+            with Image.open(dataset / entry["path"]) as image:
+                expected = preprocess_image(image, target_size=INPUT_SHAPE[:2])[0]
+            np.testing.assert_array_equal(row, expected)
+            assert CLASS_NAMES[entry["label"]] == entry["path"].split("/")[0]
+            seen.append(entry["path"])
+    assert sorted(seen) == sorted(entry["path"] for entry in cache.entries)
+
+
+def test_missing_store_is_reported(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        tensor_cache.TensorCache(str(tmp_path / "nothing"))
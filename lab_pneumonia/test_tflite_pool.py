@@ -0,0 +1,87 @@
+"""
+Tests for tflite_pool.py: batched and padded invocations must give the same
+outputs as one image at a time, and interpreters are never shared.
+
+Run with: python -m pytest test_tflite_pool.py
+"""
+
+import os
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import tflite_pool
+from tflite_pool import InterpreterPool
+
+FRUITS_TFLITE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "appcontrole", "assets", "model", "fruits_classifier.tflite",
+)
+
+
+@pytest.fixture(scope="module")
+def pool():
+    try:
+        return InterpreterPool(FRUITS_TFLITE, size=2, num_threads=1, max_batch=4)
+    except (ImportError, ValueError, OSError) as e:
+        pytest.skip(f"fruits TFLite model not available: {e}")
+
+
+def images(pool, count, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, (count, *pool.sample_shape)).astype(pool.input_dtype)
+
+
+def one_by_one(pool, data):
+    return np.concatenate([pool.predict(data[index:index + 1]) for index in range(len(data))])
+
+
+@pytest.mark.parametrize("count", [1, 2, 3, 4, 9])
+def test_batch_matches_single_image(pool, count):
+    # 3 is padded to a bucket of 4; 9 runs as chunks of 4, 4 and 1 (padded)
+    data = images(pool, count)
+    batched = pool.predict(data)
+    assert batched.shape == (count, *pool.output_shape)
+    np.testing.assert_allclose(batched, one_by_one(pool, data), rtol=1e-5, atol=1e-6)
+
+
+def test_empty_batch(pool):
+    assert pool.predict(images(pool, 0)).shape == (0, *pool.output_shape)
+
+
+def test_concurrent_predicts_match_sequential(pool):
+    data = images(pool, 8, seed=1)
+    expected = pool.predict(data)
+    results, errors = [None] * 16, []
+
+    def worker(index):
+        try:
+            rows = slice(index % 4 * 2, index % 4 * 2 + 2)
+            results[index] = (rows, pool.predict(data[rows]))
+        except Exception as e:  # surfaced by the assertion below
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    for rows, output in results:
+        np.testing.assert_allclose(output, expected[rows], rtol=1e-5, atol=1e-6)
+    assert pool.stats()["available"] == pool.size
+
+
+def test_checkout_times_out_when_every_interpreter_is_busy(pool):
+    with pool.checkout(), pool.checkout():
+        with pytest.raises(TimeoutError):
+            with pool.checkout(timeout=0.05):
+                pass
+    assert pool.stats()["available"] == pool.size
+
+
+def test_batch_bucket():
+    assert [tflite_pool._batch_bucket(size, 64) for size in (1, 2, 3, 5, 64, 100)] == [1, 2, 4, 8, 64, 64]
@@ -0,0 +1,191 @@
+"""
+Thread-safe pool of TFLite interpreters.
+
+A tf.lite.Interpreter must not run set_tensor/invoke from several threads
+at once, so each request checks out its own interpreter from the pool.
+Tensor details are read once at load time. When the model allows it, the
+batch dimension is resized (in power-of-two buckets) so a whole batch runs
+in one invoke.
+
+Usage:
+    pool = InterpreterPool("model.tflite")
+    outputs = pool.predict(batch)          # Keras-like
+
+    with pool.checkout() as interpreter:   # explicit checkout/return
+        outputs = interpreter.run(batch)
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+
+import runtime_config
+
+# Thread counts must be set before numpy and TensorFlow are imported
+_runtime = runtime_config.apply()
+
+import numpy as np
+
+_interpreter_class = None
+
+
+def get_interpreter_class():
+    """
+    tf.lite.Interpreter, or tflite_runtime's when TensorFlow is not installed.
+    Imported on first use so that importing this module stays cheap.
+    """
+    global _interpreter_class
+    if _interpreter_class is None:
+        try:
+            import tensorflow as tf
+            runtime_config.configure_tensorflow(tf)
+            _interpreter_class = tf.lite.Interpreter
+        except (ImportError, AttributeError):
+            try:
+                from tflite_runtime.interpreter import Interpreter
+            except ImportError:
+                raise ImportError("TensorFlow or tflite_runtime is required for TFLite models")
+            _interpreter_class = Interpreter
+    return _interpreter_class
+
+
+# Split this process's thread budget (INFERENCE_THREADS, see runtime_config)
+# between up to 4 concurrent interpreters
+TFLITE_POOL_SIZE = int(os.environ.get("TFLITE_POOL_SIZE", str(min(4, _runtime["threads"]))))
+TFLITE_NUM_THREADS = int(os.environ.get("TFLITE_NUM_THREADS") or max(_runtime["threads"] // TFLITE_POOL_SIZE, 1))
+TFLITE_MAX_BATCH = int(os.environ.get("TFLITE_MAX_BATCH", "64"))
+
+
+def _batch_bucket(size, max_batch):
+    """Next power of two >= size, capped at max_batch."""
+    bucket = 1
+    while bucket < size:
+        bucket *= 2
+    return min(bucket, max_batch)
+
+
+class PooledInterpreter:
+    """One interpreter with its tensor details cached at load time."""
+
+    def __init__(self, model_path, num_threads=TFLITE_NUM_THREADS):
+        self.interpreter = get_interpreter_class()(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        input_details = self.interpreter.get_input_details()[0]
+        output_details = self.interpreter.get_output_details()[0]
+        self.input_index = input_details["index"]
+        self.input_dtype = input_details["dtype"]
+        self.sample_shape = tuple(int(dim) for dim in input_details["shape"][1:])
+        self.output_index = output_details["index"]
+        self.output_shape = tuple(int(dim) for dim in output_details["shape"][1:])
+        self.batch_size = int(input_details["shape"][0])
+
+    def resize(self, batch_size):
+        if batch_size != self.batch_size:
+            self.interpreter.resize_tensor_input(self.input_index, [batch_size, *self.sample_shape])
+            self.interpreter.allocate_tensors()
+            self.batch_size = batch_size
+
+    def run(self, batch):
+        """Invoke on exactly self.batch_size samples and return the outputs."""
+        self.interpreter.set_tensor(self.input_index, batch)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self.output_index)
+
+
+class InterpreterPool:
+    """
+    Pool of interpreters for one TFLite model.
+
+    Parameters:
+        model_path (str): Path to the .tflite file
+        size (int): Number of interpreters (concurrent inferences)
+        num_threads (int): Threads used by each interpreter
+        max_batch (int): Largest batch run in one invoke
+    """
+
+    def __init__(self, model_path, size=TFLITE_POOL_SIZE, num_threads=TFLITE_NUM_THREADS,
+                 max_batch=TFLITE_MAX_BATCH):
+        get_interpreter_class()
+        self.model_path = model_path
+        self.size = size
+        self._free = []
+        self._available = threading.Condition()
+        interpreters = [PooledInterpreter(model_path, num_threads) for _ in range(size)]
+        first = interpreters[0]
+        self.sample_shape = first.sample_shape
+        self.input_dtype = first.input_dtype
+        self.output_shape = first.output_shape
+        self.max_batch = max_batch if self._supports_batching(first) else 1
+        self._free.extend(interpreters)
+
+    @staticmethod
+    def _supports_batching(interpreter):
+        # Some models have a fixed batch dimension that cannot be resized
+        try:
+            interpreter.resize(2)
+            output = interpreter.run(np.zeros((2, *interpreter.sample_shape), dtype=interpreter.input_dtype))
+            return output.shape[0] == 2
+        except (ValueError, RuntimeError):
+            return False
+        finally:
+            try:
+                interpreter.resize(1)
+            except (ValueError, RuntimeError):
+                pass
+
+    @contextmanager
+    def checkout(self, batch_size=None, timeout=None):
+        """
+        Borrow an interpreter; it is returned to the pool when the block exits.
+        An interpreter already resized to batch_size is preferred, so that
+        interpreters do not keep reallocating their tensors.
+        """
+        with self._available:
+            if not self._available.wait_for(lambda: self._free, timeout=timeout):
+                raise TimeoutError("No TFLite interpreter available")
+            interpreter = next(
+                (candidate for candidate in self._free if candidate.batch_size == batch_size),
+                self._free[-1],
+            )
+            self._free.remove(interpreter)
+        try:
+            yield interpreter
+        finally:
+            with self._available:
+                self._free.append(interpreter)
+                self._available.notify()
+
+    def predict(self, data, verbose=0):
+        """
+        Run the model on a batch (Keras-like).
+
+        Parameters:
+            data (numpy.ndarray): Inputs of shape (n, *sample_shape)
+
+        Returns:
+            numpy.ndarray: Outputs of shape (n, ...)
+        """
+        data = np.asarray(data, dtype=self.input_dtype)
+        if len(data) == 0:
+            return np.empty((0, *self.output_shape), dtype=np.float32)
+        outputs = []
+        with self.checkout(_batch_bucket(len(data), self.max_batch)) as interpreter:
+            for start in range(0, len(data), self.max_batch):
+                chunk = data[start:start + self.max_batch]
+                bucket = _batch_bucket(len(chunk), self.max_batch)
+                interpreter.resize(bucket)
+                if bucket != len(chunk):
+                    # Pad to the bucket size instead of resizing for every batch size
+                    padded = np.zeros((bucket, *self.sample_shape), dtype=self.input_dtype)
+                    padded[:len(chunk)] = chunk
+                    chunk = padded
+                outputs.append(interpreter.run(chunk)[:min(self.max_batch, len(data) - start)])
+        return outputs[0] if len(outputs) == 1 else np.concatenate(outputs)
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "available": len(self._free),
+            "max_batch": self.max_batch,
+            "input_shape": list(self.sample_shape),
+        }